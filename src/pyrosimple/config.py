@@ -66,8 +66,14 @@ _PREDEFINED = tuple(_ for _ in globals() if not _.startswith("_"))
 debug = False
 config_dir = None
 scgi_url = ""
+scgi_pool_size = 1
+scgi_pool_idle = 5.0
 engine = Bunch(open=lambda: None)
 fast_query = 0
+action_batch_size = 500
+metafile_cache = ""
+hash_workers = 0
+hash_mmap = 0
 formats = {}
 sort_fields = ""
 announce = {}
@@ -22,9 +22,17 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 import os
 import time
+import shlex
 import pipes
+import errno
+import atexit
+import asyncio
+import select
 import socket
+import tempfile
+import threading
 import subprocess
+from collections import deque
 
 from urllib.error import URLError
 
@@ -45,13 +53,118 @@ ERRORS = (SCGIException, URLError, xmlrpclib.Fault, socket.error)
 #
 
 
+class SocketPool(object):
+    """Pre-connected sockets for a transport.
+
+    rTorrent closes the connection after each SCGI response, so sockets can
+    usually not be reused; instead, replacements are connected in the background
+    while a request is being processed, which takes connection setup off the
+    critical path of the next call. Servers that answer with a
+    ``Connection: keep-alive`` header get their sockets handed back into the pool.
+    """
+
+    def __init__(self, connect, size=1, idle_timeout=5.0):
+        self.connect = connect
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.keep_alive = False
+        self._idle = deque()
+
+        # Statistics
+        self.connects = 0
+        self.hits = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def __str__(self):
+        """Return statistics."""
+        return "pool %d/%d warm, %d connects, %d hits, %d reused, %d evicted" % (
+            len(self._idle),
+            self.size,
+            self.connects,
+            self.hits,
+            self.reused,
+            self.evicted,
+        )
+
+    def _open(self, wait=True):
+        """Create a new connection."""
+        self.connects += 1
+        return self.connect(wait)
+
+    def acquire(self):
+        """Get a connected socket, and a flag whether it came from the pool."""
+        now = time.time()
+        while self._idle:
+            sock, since = self._idle.popleft()
+            if now - since > self.idle_timeout:
+                self.evicted += 1
+                sock.close()
+                continue
+
+            # Wait for any connect still in progress
+            try:
+                _, writable, _ = select.select([], [sock], [], self.idle_timeout)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            except (socket.error, ValueError):
+                writable, err = None, errno.EBADF
+            if not writable or err:
+                self.evicted += 1
+                sock.close()
+                continue
+
+            sock.setblocking(True)
+            self.hits += 1
+            return sock, True
+
+        return self._open(), False
+
+    def replace(self, sock):
+        """Close a pooled socket found to be unusable, and return a new connection."""
+        self.evicted += 1
+        sock.close()
+        return self._open()
+
+    def release(self, sock):
+        """Return a still usable socket to the pool, in front of any fresh ones."""
+        self.keep_alive = True
+        if self.size:
+            self.reused += 1
+            self._idle.appendleft((sock, time.time()))
+            while len(self._idle) > self.size:
+                self._idle.pop()[0].close()
+        else:
+            sock.close()
+
+    def prime(self):
+        """Start connecting sockets until the pool is full."""
+        if self.keep_alive:
+            return  # the current connection will come back
+
+        while len(self._idle) < self.size:
+            try:
+                sock = self._open(wait=False)
+            except socket.error:
+                break  # the next acquire() will report the problem
+            self._idle.append((sock, time.time()))
+
+    def close(self):
+        """Close all pooled sockets."""
+        while self._idle:
+            self._idle.popleft()[0].close()
+
+
 class LocalTransport(object):
     """Transport via TCP or a UNIX domain socket."""
 
     # Amount of bytes to read at once
     CHUNK_SIZE = 32768
 
-    def __init__(self, url):
+    # Number of pre-connected sockets to keep, and how long they may stay unused
+    POOL_SIZE = 1
+    IDLE_TIMEOUT = 5.0
+
+    def __init__(self, url, pool_size=None, idle_timeout=None):
         self.url = url
 
         if url.netloc:
@@ -77,34 +190,81 @@ class LocalTransport(object):
             self.sock_args = (socket.AF_UNIX, socket.SOCK_STREAM)
             self.sock_addr = os.path.abspath(path)
 
-    def send(self, data):
-        """Open transport, send data, and yield response chunks."""
+        self.pool = SocketPool(
+            self._connect,
+            self.POOL_SIZE if pool_size is None else int(pool_size),
+            self.IDLE_TIMEOUT if idle_timeout is None else float(idle_timeout),
+        )
+
+    def _connect(self, wait=True):
+        """Open a socket to the server; with "wait" unset, don't block on the connect."""
         sock = socket.socket(*self.sock_args)
         try:
-            sock.connect(self.sock_addr)
+            if wait:
+                sock.connect(self.sock_addr)
+            else:
+                sock.setblocking(False)
+                err = sock.connect_ex(self.sock_addr)
+                if err not in (0, errno.EINPROGRESS, errno.EAGAIN):
+                    raise socket.error(err, os.strerror(err))
         except socket.error as exc:
+            sock.close()
             raise socket.error("Can't connect to %r (%s)" % (self.url.geturl(), exc))
 
+        return sock
+
+    def close(self):
+        """Close any pooled connections."""
+        self.pool.close()
+
+    def send(self, data):
+        """Open transport, send data, and yield response chunks."""
+        sock, warm = self.pool.acquire()
         try:
             # Send request
-            sock.send(data)
+            try:
+                sock.sendall(data)
+                chunk = sock.recv(self.CHUNK_SIZE)
+            except socket.error:
+                if not warm:
+                    raise
+                chunk = b""
+
+            if not chunk and warm:
+                # The server dropped the idle connection, try again with a new one
+                sock = self.pool.replace(sock)
+                sock.sendall(data)
+                chunk = sock.recv(self.CHUNK_SIZE)
+
+            # Get the next connection going while the server does its work
+            self.pool.prime()
 
             # Read response
-            while True:
-                chunk = sock.recv(self.CHUNK_SIZE)
-                if chunk:
-                    yield chunk
-                else:
+            head, expected, received = b"", None, 0
+            while chunk:
+                yield chunk
+                received += len(chunk)
+
+                if expected is None and head is not None:
+                    head += chunk
+                    expected, head = _keep_alive_length(head)
+                if expected is not None and received >= expected:
+                    # Server keeps the connection, and we have the full response
+                    self.pool.release(sock)
+                    sock = None
                     break
+
+                chunk = sock.recv(self.CHUNK_SIZE)
         finally:
             # Clean up
-            sock.close()
+            if sock is not None:
+                sock.close()
 
 
 class SSHTransport(object):
     """Transport via SSH to a UNIX domain socket."""
 
-    def __init__(self, url):
+    def __init__(self, url, **_):
         self.url = url
         self.cmd = ["ssh", "-T"]  # no pseudo-tty
 
@@ -162,17 +322,253 @@ class SSHTransport(object):
             yield stdout
 
 
+class SSHSessionTransport(SSHTransport):
+    """Transport via one long-lived SSH session to a UNIX domain socket.
+
+    A remote shell loop handles all requests: each one is sent as a line
+    with its length, followed by the SCGI payload, and is answered by a line
+    with the return code of ``socat`` and the response length, followed by
+    the response. The remote side needs ``socat`` and GNU ``dd``.
+
+    A session that went away is restarted on the next request.
+    """
+
+    # Amount of bytes to read at once
+    CHUNK_SIZE = 32768
+
+    # Seconds to wait for the remote loop to exit on close
+    CLOSE_TIMEOUT = 5.0
+
+    # Max. amount of bytes of the session's stderr shown on failures
+    STDERR_TAIL = 4096
+
+    REMOTE_LOOP = (
+        't=$(mktemp) || exit 1; trap \'rm -f "$t"\' EXIT; '
+        'while read -r n; do '
+        'dd bs="$n" count=1 iflag=fullblock 2>/dev/null'
+        ' | socat STDIO {address} >"$t" 2>&1; '
+        'rc=$?; echo "$rc $(wc -c <"$t")"; cat "$t"; '
+        "done"
+    )
+
+    def __init__(self, url, **_):
+        super(SSHSessionTransport, self).__init__(url)
+        if url.path.startswith("/~/"):
+            address = 'UNIX-CONNECT:"$HOME"/' + shlex.quote(url.path[3:])
+        else:
+            address = shlex.quote("UNIX-CONNECT:" + url.path)
+        self.cmd[-3:] = [self.REMOTE_LOOP.format(address=address)]
+        self.proc = None
+        self.stderr = None
+        self.sessions = 0
+        self._lock = threading.Lock()
+
+    def _session(self):
+        """Return the running SSH process, starting it when necessary."""
+        if self.proc is None or self.proc.poll() is not None:
+            self.close()
+            # Collect stderr in a file, a pipe nobody reads could fill up
+            self.stderr = tempfile.TemporaryFile(prefix="pyrosimple-ssh-")
+            try:
+                self.proc = subprocess.Popen(
+                    self.cmd,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=self.stderr,
+                    bufsize=0,
+                )
+            except OSError as exc:
+                self.stderr.close()
+                self.stderr = None
+                raise URLError("Calling %r failed (%s)!" % (" ".join(self.cmd), exc))
+            self.sessions += 1
+            atexit.register(self.close)
+
+        return self.proc
+
+    def _failed(self, reason):
+        """Close a broken session and return an error describing it."""
+        stderr = b""
+        handle, self.stderr = self.stderr, None
+        self.close()
+        if handle is not None:
+            try:
+                handle.seek(max(0, handle.seek(0, os.SEEK_END) - self.STDERR_TAIL))
+                stderr = handle.read()
+            except (OSError, ValueError):
+                pass
+            handle.close()
+        return URLError(
+            "SSH session %r failed (%s)!\n%s"
+            % (" ".join(self.cmd[:-1]), reason, stderr.decode("utf-8", "replace"))
+        )
+
+    def close(self):
+        """Shut down the SSH session."""
+        proc, self.proc = self.proc, None
+        if self.stderr is not None:
+            self.stderr.close()
+            self.stderr = None
+        if proc is None:
+            return
+        atexit.unregister(self.close)
+
+        try:
+            proc.stdin.close()  # ends the remote loop
+        except OSError:
+            pass
+        try:
+            proc.wait(self.CLOSE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+    def send(self, data):
+        """Send data over the session, and yield response chunks.
+
+        The response is read completely before the first chunk is yielded,
+        so that further calls can be made while consuming it.
+        """
+        yield from self._exchange(data)
+
+    def _exchange(self, data):
+        """Send data over the session, and return the response chunks."""
+        with self._lock:
+            for retry in (True, False):
+                retry = retry and self.proc is not None and self.proc.poll() is None
+                proc = self._session()
+                try:
+                    proc.stdin.write(b"%d\n" % len(data) + data)
+                    proc.stdin.flush()
+                    status = proc.stdout.readline()
+                except OSError as exc:
+                    status, reason = b"", exc
+                else:
+                    reason = "unexpected EOF"
+                if status:
+                    break
+                if not retry:
+                    raise self._failed(reason)
+                self.close()  # session went away while idle, start a new one
+
+            try:
+                returncode, remaining = (int(i) for i in status.split())
+            except ValueError:
+                raise self._failed("bad response header %r" % status)
+
+            if returncode:
+                message = b""
+                while len(message) < remaining:
+                    chunk = proc.stdout.read(remaining - len(message))
+                    if not chunk:
+                        raise self._failed("response truncated")
+                    message += chunk
+                message = message.decode("utf-8", "replace")
+                raise URLError(
+                    "Calling socat via %r failed with RC=%d!\n%s"
+                    % (" ".join(self.cmd[:-1]), returncode, message)
+                )
+
+            chunks = []
+            while remaining:
+                chunk = proc.stdout.read(min(remaining, self.CHUNK_SIZE))
+                if not chunk:
+                    raise self._failed("response truncated")
+                remaining -= len(chunk)
+                chunks.append(chunk)
+
+            return chunks
+
+
+class AsyncLocalTransport(LocalTransport):
+    """Transport via TCP or a UNIX domain socket, using asyncio streams."""
+
+    def __init__(self, url, **_):
+        super(AsyncLocalTransport, self).__init__(url, pool_size=0)
+
+    async def send(self, data):
+        """Open transport, send data, and yield response chunks."""
+        try:
+            if self.sock_args[0] == socket.AF_UNIX:
+                reader, writer = await asyncio.open_unix_connection(self.sock_addr)
+            else:
+                reader, writer = await asyncio.open_connection(*self.sock_addr[:2])
+        except OSError as exc:
+            raise socket.error("Can't connect to %r (%s)" % (self.url.geturl(), exc))
+
+        try:
+            writer.write(data)
+            await writer.drain()
+
+            head, expected, received = b"", None, 0
+            while True:
+                chunk = await reader.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+                received += len(chunk)
+
+                if expected is None and head is not None:
+                    head += chunk
+                    expected, head = _keep_alive_length(head)
+                if expected is not None and received >= expected:
+                    break  # connections are not reused, so don't wait for the server
+        finally:
+            writer.close()
+
+
+class AsyncSSHTransport(SSHTransport):
+    """Transport via SSH to a UNIX domain socket, using an asyncio subprocess."""
+
+    async def send(self, data):
+        """Open transport, send data, and yield response chunks."""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *self.cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        except OSError as exc:
+            raise URLError("Calling %r failed (%s)!" % (" ".join(self.cmd), exc))
+
+        stdout, stderr = await proc.communicate(data)
+        if proc.returncode:
+            raise URLError(
+                "Calling %r failed with RC=%d!\n%s"
+                % (
+                    " ".join(self.cmd),
+                    proc.returncode,
+                    stderr,
+                )
+            )
+        yield stdout
+
+
 TRANSPORTS = {
     "scgi": LocalTransport,
-    "scgi+ssh": SSHTransport,
+    "scgi+ssh": SSHSessionTransport,
+}
+
+# Transports for use with asyncio
+ASYNC_TRANSPORTS = {
+    "scgi": AsyncLocalTransport,
+    "scgi+ssh": AsyncSSHTransport,
 }
 
 # Register our schemes to be parsed as having a netloc
 urlparse.uses_netloc.extend(TRANSPORTS.keys())
 
 
-def transport_from_url(url):
-    """Create a transport for the given URL."""
+def transport_from_url(url, transports=None, **kwargs):
+    """Create a transport for the given URL.
+
+    Keyword arguments are passed on to the transport, e.g. C{pool_size}
+    and C{idle_timeout} for socket connections. Pass
+    C{transports=ASYNC_TRANSPORTS} to get one for asyncio.
+    """
+    transports = transports or TRANSPORTS
     if "/" not in url and ":" in url and url.rsplit(":")[-1].isdigit():
         url = "scgi://" + url
     url = urlparse.urlsplit(
@@ -180,15 +576,17 @@ def transport_from_url(url):
     )  # pylint: disable=redundant-keyword-arg
 
     try:
-        transport = TRANSPORTS[url.scheme.lower()]
+        transport = transports[url.scheme.lower()]
     except KeyError:
         if not any((url.netloc, url.query)) and url.path.isdigit():
             # Support simplified "domain:port" URLs
-            return transport_from_url("scgi://%s:%s" % (url.scheme, url.path))
+            return transport_from_url(
+                "scgi://%s:%s" % (url.scheme, url.path), transports, **kwargs
+            )
         else:
             raise URLError("Unsupported scheme in URL %r" % url.geturl())
     else:
-        return transport(url)
+        return transport(url, **kwargs)
 
 
 #
@@ -273,6 +671,27 @@ def _parse_response(resp):
     return payload, headers
 
 
+def _keep_alive_length(head):
+    """
+    Check the start of a response for a persistent connection.
+
+    :param head: Response bytes received so far
+    :type head: bytes
+    :return: A tuple of the full response length (or None when the server will
+        close the connection, or that is not known yet), and the bytes to keep
+        for the next check (None when no further checks are needed)
+    """
+    if b"\r\n\r\n" not in head:
+        return None, head
+
+    headers = _parse_headers(head.split(b"\r\n\r\n", 1)[0])
+    keep_alive = headers.get("Connection", "").lower() == "keep-alive"
+    if keep_alive and "Content-Length" in headers:
+        return head.index(b"\r\n\r\n") + 4 + int(headers["Content-Length"]), None
+
+    return None, None
+
+
 #
 # SCGI request handling
 #
@@ -312,6 +731,85 @@ class SCGIRequest(object):
         resp, self.resp_headers = _parse_response(scgi_resp)
         return resp
 
+    def stream(self, data):
+        """Send data over scgi to URL and yield the response payload
+        in chunks, as they arrive.
+
+        :param data: The bytestring to send
+        :type data: bytes
+        :return: Iterator over response bytestrings
+        """
+        start = time.time()
+        reader = _PayloadReader()
+        chunks = self.transport.send(_encode_payload(data))
+        try:
+            for chunk in chunks:
+                chunk = reader.feed(chunk)
+                if chunk:
+                    yield chunk
+        finally:
+            chunks.close()
+            self.latency = time.time() - start
+
+        self.resp_headers = reader.close()
+
+    async def stream_async(self, data):
+        """Like L{stream}, for a transport using asyncio.
+
+        :param data: The bytestring to send
+        :type data: bytes
+        :return: Async iterator over response bytestrings
+        """
+        start = time.time()
+        reader = _PayloadReader()
+        chunks = self.transport.send(_encode_payload(data))
+        try:
+            async for chunk in chunks:
+                chunk = reader.feed(chunk)
+                if chunk:
+                    yield chunk
+        finally:
+            await chunks.aclose()
+            self.latency = time.time() - start
+
+        self.resp_headers = reader.close()
+
+
+class _PayloadReader(object):
+    """Separate the payload of a SCGI response from its headers."""
+
+    def __init__(self):
+        self.head = b""
+        self.headers = {}
+        self.received = 0
+
+    def feed(self, chunk):
+        """Return the payload part of the next response chunk."""
+        if self.head is not None:
+            # Still looking for the end of the headers
+            self.head += chunk
+            if b"\r\n\r\n" not in self.head:
+                return b""
+            headers, chunk = self.head.split(b"\r\n\r\n", 1)
+            self.headers = _parse_headers(headers)
+            self.head = None
+
+        self.received += len(chunk)
+        return chunk
+
+    def close(self):
+        """Check the response is complete, and return its headers."""
+        if self.head is not None:
+            raise SCGIException(
+                "No header delimiter in SCGI response of length %d" % len(self.head)
+            )
+        clen = self.headers.get("Content-Length")
+        if clen is not None and self.received != int(clen):
+            raise SCGIException(
+                "SCGI response has %d bytes, but announced %s" % (self.received, clen)
+            )
+        return self.headers
+
 
 def scgi_request(url, methodname, *params, **kw):
     """Send a XMLRPC request over SCGI to the given URL.
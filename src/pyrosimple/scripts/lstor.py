@@ -18,11 +18,14 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import os
 import hashlib
 import json
+import concurrent.futures
 
 import bencode
 
+from pyrosimple import error
 from pyrosimple.scripts.base import ScriptBase
 from pyrosimple.util import metafile
 
@@ -55,9 +58,116 @@ class MetafileLister(ScriptBase):
             " __hash__ is the info hash,"
             " and __size__ is the data size in bytes",
         )
-        # TODO: implement this
-        # self.add_value_option("-c", "--check-data", "PATH",
-        #    help="check the hash against the data in the given path")
+        self.add_value_option(
+            "-c",
+            "--check-data",
+            "DIR",
+            help="check the piece hashes against the data in the given directory"
+            " (the report is also available as __check__)",
+        )
+        self.add_value_option(
+            "--max-bad",
+            "N",
+            default=0,
+            help="stop checking data after N bad pieces",
+        )
+        self.add_value_option(
+            "--checkpoint-dir",
+            "DIR",
+            help="save the state of data checks in the given directory,"
+            " so interrupted checks resume where they stopped",
+        )
+        self.add_value_option(
+            "--sample",
+            "COUNT|PERCENT",
+            help="only check the given number or percentage of randomly chosen pieces",
+        )
+        self.add_value_option(
+            "-j",
+            "--jobs",
+            "N",
+            default=1,
+            help="check the data of N metafiles concurrently",
+        )
+
+    def parse_sample(self):
+        """Return the arguments for sampling data checks, or None."""
+        sample = self.options.sample
+        if not sample:
+            return None
+        try:
+            if sample.endswith("%"):
+                key, value = "fraction", float(sample[:-1]) / 100.0
+            else:
+                key, value = "count", int(sample, 10)
+        except ValueError:
+            self.parser.error("Bad --sample value %r" % (sample,))
+        if not value > 0:
+            self.parser.error("The --sample value must be positive, not %r" % (sample,))
+        return {key: value}
+
+    def check_data(self, torrent, data):
+        """Check the data of a metafile, and return the report."""
+        datapath = os.path.join(self.options.check_data, data["info"]["name"])
+        if self.sample:
+            report = torrent.sample(data, datapath, **self.sample)
+        else:
+            checkpoint = None
+            if self.options.checkpoint_dir:
+                checkpoint = os.path.join(
+                    self.options.checkpoint_dir, metafile.info_hash(data) + ".json"
+                )
+
+            report = torrent.verify(
+                data,
+                datapath,
+                max_bad=int(self.options.max_bad),
+                checkpoint=checkpoint,
+            )
+
+        if not report.ok:
+            self.return_code = error.EX_DATAERR
+        return report
+
+    def check_metafile(self, filename):
+        """Read a metafile and check its data, when running concurrent jobs."""
+        torrent = metafile.Metafile(filename)
+        torrent.hash_workers = 1
+        return self.check_data(torrent, metafile.checked_open(filename, quiet=True))
+
+    @staticmethod
+    def format_report(report):
+        """Return a one-line summary of a data check."""
+        sampled = "sampled" in report
+        if report.ok and sampled:
+            return (
+                "Data check: OK, %d of %d pieces sampled"
+                " (%.1f%% chance to find %g%% bad pieces)"
+                % (
+                    report.checked,
+                    report.pieces,
+                    100.0 * report.confidence,
+                    100.0 * report.damage,
+                )
+            )
+        if report.ok:
+            return "Data check: OK, %d pieces" % report.pieces
+
+        result = [
+            "Data check: %d of %d %s BAD"
+            % (
+                len(report.bad),
+                report.checked if sampled else report.pieces,
+                "sampled pieces" if sampled else "pieces",
+            )
+        ]
+        if report.bad:
+            result.append("in %d file(s)" % len(report.files))
+        if report.bad_size:
+            result.append("%d file(s) with wrong size" % len(report.bad_size))
+        if not report.complete and not sampled:
+            result.append("stopped after %d pieces" % report.checked)
+        return ", ".join(result)
 
     def mainloop(self):
         """The main loop."""
@@ -65,6 +175,25 @@ class MetafileLister(ScriptBase):
             self.parser.print_help()
             self.parser.exit()
 
+        self.sample = self.parse_sample()
+
+        # Check data of several metafiles concurrently, in the background
+        checks = []
+        if self.options.check_data and int(self.options.jobs) > 1:
+            executor = concurrent.futures.ThreadPoolExecutor(int(self.options.jobs))
+            checks = [
+                executor.submit(self.check_metafile, filename) for filename in self.args
+            ]
+        try:
+            self.list_metafiles(checks)
+        finally:
+            if checks:
+                for check in checks:
+                    check.cancel()
+                executor.shutdown()
+
+    def list_metafiles(self, checks):
+        """List all metafiles, optionally with the results of background checks."""
         for idx, filename in enumerate(self.args):
             torrent = metafile.Metafile(filename)
             if idx and not self.options.output and not self.options.raw:
@@ -93,6 +222,11 @@ class MetafileLister(ScriptBase):
                     raise
 
                 listing = None
+                if self.options.check_data and "info" in data:
+                    if checks:
+                        data["__check__"] = checks[idx].result()
+                    else:
+                        data["__check__"] = self.check_data(torrent, data)
 
                 if self.options.raw:
                     if not self.options.reveal and "info" in data:
@@ -140,6 +274,8 @@ class MetafileLister(ScriptBase):
                         listing = "\t".join(values)
                 else:
                     listing = "\n".join(torrent.listing(masked=not self.options.reveal))
+                    if "__check__" in data:
+                        listing += "\n" + self.format_report(data["__check__"])
             except (ValueError, KeyError, bencode.BencodeDecodeError) as exc:
                 if self.options.debug:
                     raise
@@ -184,9 +184,8 @@ class MetafileCreator(ScriptBaseWithConfig):
             # Set specific keys?
             metafile.assign_fields(meta, self.options.set)
 
-        # Create and write the metafile(s)
-        # TODO: make it work better with multiple trackers (hash only once), also create fast-resume file for each tracker
-        meta = torrent.create(
+        # Create and write the metafile(s), hashing the data only once
+        written = torrent.create_all(
             datapath,
             self.args[1:],
             progress=None if self.options.quiet else metafile.console_progress(),
@@ -198,27 +197,32 @@ class MetafileCreator(ScriptBaseWithConfig):
             callback=callback,
         )
 
-        # Create second metafile with fast-resume?
+        # Create second metafile with fast-resume, for each tracker?
         if self.options.hashed:
-            try:
-                metafile.add_fast_resume(meta, datapath)
-            except EnvironmentError as exc:
-                self.fatal("Error making fast-resume data (%s)" % (exc,))
-                raise
-
-            hashed_path = re.sub(r"\.torrent$", "", metapath) + "-resume.torrent"
-            self.LOG.info("Writing fast-resume metafile %r..." % (hashed_path,))
-            try:
-                bencode.bwrite(hashed_path, meta)
-            except EnvironmentError as exc:
-                self.fatal(
-                    "Error writing fast-resume metafile %r (%s)"
-                    % (
-                        hashed_path,
-                        exc,
-                    )
+            for output_name, meta in written:
+                self.write_fast_resume(output_name, meta, datapath)
+
+    def write_fast_resume(self, output_name, meta, datapath):
+        """Write metafile with added fast-resume data, next to the given one."""
+        try:
+            metafile.add_fast_resume(meta, datapath)
+        except EnvironmentError as exc:
+            self.fatal("Error making fast-resume data (%s)" % (exc,))
+            raise
+
+        hashed_path = re.sub(r"\.torrent$", "", output_name) + "-resume.torrent"
+        self.LOG.info("Writing fast-resume metafile %r..." % (hashed_path,))
+        try:
+            bencode.bwrite(meta, hashed_path)
+        except EnvironmentError as exc:
+            self.fatal(
+                "Error writing fast-resume metafile %r (%s)"
+                % (
+                    hashed_path,
+                    exc,
                 )
-                raise
+            )
+            raise
 
 
 def run():  # pragma: no cover
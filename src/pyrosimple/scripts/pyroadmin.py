@@ -34,6 +34,7 @@ import six
 from pyrosimple.scripts.base import ScriptBase, ScriptBaseWithConfig
 from pyrosimple import config, error
 from pyrosimple.util import os, load_config, metafile, matching, fmt
+from pyrosimple.torrent import metacache
 
 
 class AdminTool(ScriptBaseWithConfig):
@@ -85,6 +86,10 @@ class AdminTool(ScriptBaseWithConfig):
             help="show config internals and full announce URL including keys",
         )
         self.add_bool_option("--screenlet", help="create screenlet stub")
+        self.add_bool_option(
+            "--metafile-cache",
+            help="show metafile cache statistics (list entries with --verbose)",
+        )
 
     def download_resource(self, download_url, target, guard):
         """Helper to download and install external resources."""
@@ -385,6 +390,33 @@ class AdminTool(ScriptBaseWithConfig):
                     if const:
                         print("method.const.enable = {}".format(name))
 
+        elif self.options.metafile_cache:
+            # Inspect the metafile data cache
+            config.engine.load_config()
+            path = os.path.expanduser(config.metafile_cache or "")
+            if not path or not os.path.exists(path):
+                self.fatal("No metafile cache found at %r" % (path,))
+            cache = metacache.MetafileCache(path)
+            stats = cache.stats()
+            print("Path:    %s" % stats.path)
+            print("Version: %d" % stats.version)
+            print("Size:    %s" % fmt.human_size(stats.size).strip())
+            print("Entries: %d (%d to be purged)" % (stats.entries, stats.purging))
+            if stats.oldest:
+                print("Oldest:  %s" % fmt.iso_datetime(stats.oldest))
+            if self.options.verbose:
+                for entry in cache.entries():
+                    print(
+                        "%s %s %s %s"
+                        % (
+                            entry.hash,
+                            fmt.iso_datetime(entry.ctime),
+                            fmt.iso_datetime(entry.purge) if entry.purge else "-",
+                            ",".join(sorted(entry.data)),
+                        )
+                    )
+            cache.close()
+
         elif self.options.screenlet:
             # Create screenlet stub
             stub_dir = os.path.expanduser("~/.screenlets/PyroScope")
@@ -21,6 +21,7 @@ import re
 import sys
 import json
 import time
+import heapq
 import shlex
 import logging
 import subprocess
@@ -29,7 +30,7 @@ from pyrosimple.util.parts import Bunch, DefaultBunch
 from pyrosimple import config, error
 from pyrosimple.util import os, fmt, osmagic, pymagic, matching, xmlrpc
 from pyrosimple.scripts.base import ScriptBase, ScriptBaseWithConfig, PromptDecorator
-from pyrosimple.torrent import engine, formatting
+from pyrosimple.torrent import columns, engine, formatting
 
 
 def print_help_fields():
@@ -110,6 +111,19 @@ class FieldStatistics(object):
         except (ValueError, TypeError):
             self.errors[field] += 1
 
+    def add_column(self, field, values, nulls):
+        "Add all samples of a field at once, given as an array and its null mask"
+        if engine.FieldDefinition.FIELDS[field]._matcher is matching.TimeFilter:
+            values = self._basetime - values
+
+        self.errors[field] += int(nulls.sum())
+        values = values[~nulls]
+        if len(values):
+            self.total[field] += values.sum().item()
+            low, high = values.min().item(), values.max().item()
+            self.min[field] = min(self.min[field], low) if field in self.min else low
+            self.max[field] = max(self.max[field], high)
+
     @property
     def average(self):
         "Calculate average"
@@ -279,6 +293,9 @@ class RtorrentControl(ScriptBaseWithConfig):
 
         self.prompt = PromptDecorator(self)
         self.plain_output_format = False
+        self.sort_fields = None
+        self.field_cost = None
+        self.phases = []
 
     def add_options(self):
         """Add program options."""
@@ -335,7 +352,7 @@ class RtorrentControl(ScriptBaseWithConfig):
             "[-]FIELD[,...] [-s...]",
             action="append",
             default=[],
-            help="fields used for sorting, descending if prefixed with a '-'; '-s*' uses output field list",
+            help="fields used for sorting, descending if prefixed with a '-'; '-s*' uses output field list, an empty value keeps the client's order",
         )
         self.add_bool_option("-r", "--reverse-sort", help="reverse the sort order")
         self.add_value_option(
@@ -403,6 +420,10 @@ class RtorrentControl(ScriptBaseWithConfig):
             choices=("=", "0", "1", "2"),
             help="enable query optimization (=: use config; 0: off; 1: safe; 2: danger seeker)",
         )
+        self.add_bool_option(
+            "--explain",
+            help="print the query plan, and XMLRPC statistics per processing phase",
+        )
         self.add_value_option(
             "--call", "CMD", help="call an OS command pattern in the shell"
         )
@@ -590,13 +611,12 @@ class RtorrentControl(ScriptBaseWithConfig):
         # Re-engineer list from output format
         # XXX TODO: Would be better to use a FieldRecorder class to catch the full field names
         emit_fields = list(
-            i.lower() for i in re.sub(b"[^_A-Z]+", b" ", self.format_item(None)).split()
+            i.lower() for i in re.sub("[^_A-Z]+", " ", self.format_item(None)).split()
         )
 
         # Validate result
         result = []
         for name in emit_fields[:]:
-            name = name.decode()
             if name not in engine.FieldDefinition.FIELDS:
                 self.LOG.warn(
                     "Omitted unknown name '%s' from statistics and output format sorting"
@@ -608,12 +628,208 @@ class RtorrentControl(ScriptBaseWithConfig):
         return result
 
     def validate_sort_fields(self):
-        """Take care of sorting."""
+        """Take care of sorting.
+
+        Returns the sort key, or C{None} when items are to be kept in the
+        order they come from the client, i.e. for an empty '-s' value.
+        """
         sort_fields = ",".join(self.options.sort_fields)
         if sort_fields == "*":
             sort_fields = self.get_output_fields()
 
-        return formatting.validate_sort_fields(sort_fields or config.sort_fields)
+        if self.options.sort_fields:
+            self.sort_fields = sort_fields
+        else:
+            self.sort_fields = config.sort_fields
+        if not formatting.sort_field_names(self.sort_fields):
+            return None
+        return formatting.validate_sort_fields(self.sort_fields)
+
+    def get_prefetch_fields(self, matcher):
+        """Get the names of the fields used by filters, sorting and output."""
+        result = matcher.field_names()
+        result.update(formatting.sort_field_names(self.sort_fields))
+        result.update(formatting.format_fields(self.options.output_format))
+        self.LOG.debug("Prefetching %s" % ", ".join(sorted(result)))
+        return result
+
+    def reorder_matcher(self, matcher, prefetch):
+        """Reorder filter terms by their estimated cost, cheapest first."""
+        costs = {}
+
+        def field_cost(name):
+            "Get the (cached) cost of a field."
+            if name not in costs:
+                costs[name] = engine.FieldDefinition.cost(name, prefetch)
+            return costs[name]
+
+        self.field_cost = field_cost
+        matcher.reorder(field_cost)
+        if self.options.debug:
+            terms = (
+                matcher
+                if isinstance(matcher, matching.CompoundFilterBase)
+                else [matcher]
+            )
+            self.LOG.debug(
+                "Filter evaluation order: %s"
+                % " ".join("%s {cost %d}" % (i, i.cost(field_cost)) for i in terms)
+            )
+
+    def explain_tree(self, matcher, indent=2):
+        """Return the lines of a printable filter tree, with the costs of its terms."""
+        prefix = " " * indent
+        if isinstance(matcher, matching.CompiledFilter):
+            matcher = matcher.tree
+        if isinstance(matcher, matching.CompoundFilterBase) and len(matcher) == 1:
+            return self.explain_tree(matcher[0], indent)
+        if isinstance(matcher, matching.CompoundFilterBase):
+            lines = [
+                "%s%s {cost %d}"
+                % (
+                    prefix,
+                    "AND" if isinstance(matcher, matching.CompoundFilterAll) else "OR",
+                    matcher.cost(self.field_cost),
+                )
+            ]
+            for term in matcher:
+                lines.extend(self.explain_tree(term, indent + 4))
+            return lines
+        if isinstance(matcher, matching.NegateFilter) and not isinstance(
+            matcher._inner, matching.FieldFilter
+        ):
+            return ["%sNOT" % prefix] + self.explain_tree(matcher._inner, indent + 4)
+        return [
+            "%s%s {%s, cost %d}"
+            % (
+                prefix,
+                matcher,
+                type(getattr(matcher, "_inner", matcher)).__name__,
+                matcher.cost(self.field_cost),
+            )
+        ]
+
+    def explain_plan(self, view, prefetch):
+        """Print the query plan for a view."""
+        plan = config.engine.explain(view, prefetch)
+        lines = ["QUERY PLAN", "  Filter tree:"]
+        lines.extend(self.explain_tree(view.matcher, 4) if view.matcher else ["    -"])
+        lines.extend(
+            [
+                "  Pre-filter:    %s (fast_query=%d)"
+                % (plan.pre_filter or "N/A", int(config.fast_query)),
+                "  Query:         %s on view %r, %d commands per item"
+                % (plan.method, plan.viewname, len(plan.commands)),
+                "  Prefetched:    %s" % ", ".join(plan.commands),
+                "  Fetched later: %s" % (", ".join(plan.separate) or "-"),
+                "  Estimate:      %d item(s) at most, %d request(s), in %s"
+                % (plan.rows, plan.requests, fmt.human_size(plan.inbound).strip()),
+            ]
+        )
+        sys.stderr.write("\n".join(lines) + "\n")
+
+    def explain_phase(self, name):
+        """Remember XMLRPC statistics at the end of a processing phase."""
+        if self.options.explain:
+            self.phases.append((name, config.engine.open().stats()))
+
+    def explain_stats(self):
+        """Print the XMLRPC statistics of each processing phase."""
+        lines = ["EXECUTION"]
+        phases = [("", Bunch(requests=0, outbound=0, inbound=0, latency=0.0))]
+        phases.extend(self.phases)
+        for (_, start), (name, end) in zip(phases, phases[1:]):
+            lines.append(
+                "  %-10s %4d req, out %9s, in %9s, %8.3fms latency"
+                % (
+                    name,
+                    end.requests - start.requests,
+                    fmt.human_size(end.outbound - start.outbound).strip(),
+                    fmt.human_size(end.inbound - start.inbound).strip(),
+                    (end.latency - start.latency) * 1000.0,
+                )
+            )
+        sys.stderr.write("\n".join(lines) + "\n")
+
+    def report_stats(self):
+        """Finish the last processing phase, and report XMLRPC statistics."""
+        self.explain_phase("output")
+        if self.options.explain:
+            self.explain_stats()
+        self.LOG.debug("XMLRPC stats: %s" % config.engine._rpc)
+
+    def is_streamable(self, sort_key, selection, actions):
+        """Check whether items can be printed as they come in.
+
+        That's the case for console output, when nothing needs the
+        complete result: sorting, selection, annealing, statistics,
+        actions, views, commands, JSON, or templates.
+        """
+        opts = self.options
+        return not (
+            sort_key
+            or selection
+            or actions
+            or opts.anneal
+            or opts.stats
+            or opts.summary
+            or opts.to_view
+            or opts.view_only
+            or opts.call
+            or opts.spawn
+            or opts.json
+            or opts.output_template
+            or not opts.output_format
+            or str(opts.output_format) == "-"
+        )
+
+    def emit_items(self, items, stencil=None, flush=False):
+        """Print the given items, returning how many there were.
+
+        A header line is emitted every C{output_header_frequency} lines,
+        justified according to C{stencil}, or else the first item.
+
+        @param flush: Flush stdout after each item?
+        """
+        output = getattr(sys.stdout, "buffer", sys.stdout)
+        count = line_count = 0
+        for item in items:
+            if (
+                not count
+                and stencil is None
+                and self.options.column_headers
+                and self.plain_output_format
+            ):
+                stencil = fmt.to_console(
+                    formatting.format_item(
+                        self.options.output_format, item, self.FORMATTER_DEFAULTS
+                    )
+                ).split("\t")
+
+            # Emit a header line every 'output_header_frequency' lines
+            if (
+                self.options.column_headers
+                and line_count % config.output_header_frequency == 0
+            ):
+                self.emit(None, stencil=stencil)
+
+            # Print matching item
+            line_count += self.emit(item, self.FORMATTER_DEFAULTS)
+            count += 1
+            if flush:
+                output.flush()
+
+        return count
+
+    def stream_items(self, view, stream):
+        """Print the matching items of C{view} as they come in.
+
+        @param stream: Don't wait for the complete item list from the client?
+        """
+        count = self.emit_items(view.items(stream), flush=sys.stdout.isatty())
+        if not count:
+            self.return_code = 44
+        self.LOG.info("Dumped %d out of %d torrents." % (count, view.size()))
 
     def show_in_view(self, sourceview, matches, targetname=None):
         """Show search result in ncurses view."""
@@ -627,6 +843,7 @@ class RtorrentControl(ScriptBaseWithConfig):
             targetname or self.options.to_view or "rtcontrol",
             append=append,
             disjoin=remove,
+            source=sourceview,
         )
         msg = "Filtered %d out of %d torrents using [ %s ]" % (
             len(matches),
@@ -826,10 +1043,36 @@ class RtorrentControl(ScriptBaseWithConfig):
             self.options.from_view = self.options.to_view = self.options.modify_view
 
         # Find matching torrents
-        view = config.engine.view(self.options.from_view, matcher)
-        matches = list(view.items())
+        prefetch = self.get_prefetch_fields(matcher)
+        self.reorder_matcher(matcher, prefetch)
+        view = config.engine.view(self.options.from_view, matcher, prefetch)
+        self.explain_phase("connect")
+        if self.options.explain:
+            self.explain_plan(view, prefetch)
+            self.explain_phase("plan")
+        if self.is_streamable(sort_key, selection, actions):
+            # Print items as they come in
+            self.stream_items(view, not config.engine.separate_fields(prefetch))
+            self.report_stats()
+            return
+
+        columnar = None
+        if (self.options.stats or self.options.summary) and columns.numpy:
+            # Filter and summarize numeric fields as whole arrays
+            columnar = view.columns()
+            matches = columnar.items
+        else:
+            matches = view.items()
+        if sort_key and selection and selection[1] > 0 and not self.options.anneal:
+            # Only the first items are needed, so don't sort all of them
+            select = heapq.nlargest if self.options.reverse_sort else heapq.nsmallest
+            matches = select(selection[1], matches, key=sort_key)
+        else:
+            matches = list(matches)
+            if sort_key:
+                matches.sort(key=sort_key, reverse=self.options.reverse_sort)
+        self.explain_phase("query")
         orig_matches = matches[:]
-        matches.sort(key=sort_key, reverse=self.options.reverse_sort)
 
         if self.options.anneal:
             if not self.options.quiet and set(self.options.anneal).difference(
@@ -844,7 +1087,7 @@ class RtorrentControl(ScriptBaseWithConfig):
                         "Using --anneal together with the query optimizer might yield unexpected results!"
                     )
             for mode in self.options.anneal:
-                if self.anneal(mode, matches, orig_matches):
+                if self.anneal(mode, matches, orig_matches) and sort_key:
                     matches.sort(key=sort_key, reverse=self.options.reverse_sort)
 
         if selection:
@@ -870,14 +1113,25 @@ class RtorrentControl(ScriptBaseWithConfig):
         # Generate summary?
         summary = FieldStatistics(len(matches))
         if self.options.stats or self.options.summary:
+            if columnar is not None and set(map(id, matches)) != set(
+                map(id, columnar.items)
+            ):
+                # Annealing or selection changed the result
+                columnar = columns.ColumnarItems(matches)
             for field in self.get_output_fields():
                 try:
                     0 + getattr(matches[0], field)
                 except (TypeError, ValueError, IndexError):
                     summary.total[field] = ""
                 else:
-                    for item in matches:
-                        summary.add(field, getattr(item, field))
+                    values = columnar.column(field) if columnar else None
+                    if values is not None:
+                        summary.add_column(field, values, columnar.nulls(field))
+                    else:
+                        for item in matches:
+                            summary.add(field, getattr(item, field))
+
+        self.explain_phase("process")
 
         def output_formatter(templ, namespace=None):
             "Output formatting helper"
@@ -916,37 +1170,45 @@ class RtorrentControl(ScriptBaseWithConfig):
                 formatting.preparse("{{#tempita}}" + i if "{{" in i else i)
                 for i in action.args
             ]
-            for item in matches:
-                if not self.prompt.ask_bool(u"%s item %s" % (action.label, item.name)):
-                    continue
-                if (
-                    self.options.output_format
-                    and not self.options.view_only
-                    and str(self.options.output_format) != "-"
-                ):
-                    self.emit(item, defaults, to_log=self.options.cron)
-
-                args = tuple(
-                    [
-                        output_formatter(i, namespace=dict(item=item))
-                        for i in template_args
-                    ]
-                )
 
-                if self.options.dry_run:
-                    if self.options.debug:
-                        self.LOG.debug(
-                            "Would call action %s(*%r)" % (action.method, args)
-                        )
-                else:
-                    getattr(item, action.method)(*args)
-                    if self.options.flush:
-                        item.flush()
-                    if self.options.view_only:
-                        show_in_client = lambda x: config.engine.open().log(
-                            xmlrpc.NOHASH, x
-                        )
-                        self.emit(item, defaults, to_log=show_in_client)
+            # Send item commands in batches, unless each one gets confirmed
+            call_queue = config.engine.queued_calls(
+                0 if self.options.interactive else None
+            )
+            with call_queue:
+                for item in matches:
+                    if not self.prompt.ask_bool(
+                        u"%s item %s" % (action.label, item.name)
+                    ):
+                        continue
+                    if (
+                        self.options.output_format
+                        and not self.options.view_only
+                        and str(self.options.output_format) != "-"
+                    ):
+                        self.emit(item, defaults, to_log=self.options.cron)
+
+                    args = tuple(
+                        [
+                            output_formatter(i, namespace=dict(item=item))
+                            for i in template_args
+                        ]
+                    )
+
+                    if self.options.dry_run:
+                        if self.options.debug:
+                            self.LOG.debug(
+                                "Would call action %s(*%r)" % (action.method, args)
+                            )
+                    else:
+                        getattr(item, action.method)(*args)
+                        if self.options.flush:
+                            item.flush()
+                        if self.options.view_only:
+                            show_in_client = lambda x: config.engine.open().log(
+                                xmlrpc.NOHASH, x
+                            )
+                            self.emit(item, defaults, to_log=show_in_client)
 
         # Show in ncurses UI?
         elif not self.options.tee_view and (
@@ -1041,17 +1303,7 @@ class RtorrentControl(ScriptBaseWithConfig):
         # Show on console?
         elif self.options.output_format and str(self.options.output_format) != "-":
             if not self.options.summary:
-                line_count = 0
-                for item in matches:
-                    # Emit a header line every 'output_header_frequency' lines
-                    if (
-                        self.options.column_headers
-                        and line_count % config.output_header_frequency == 0
-                    ):
-                        self.emit(None, stencil=stencil)
-
-                    # Print matching item
-                    line_count += self.emit(item, self.FORMATTER_DEFAULTS)
+                self.emit_items(matches, stencil)
 
             # Print summary?
             if matches and summary:
@@ -1059,22 +1311,22 @@ class RtorrentControl(ScriptBaseWithConfig):
                 self.emit(
                     summary.total,
                     item_formatter=lambda i: i.rstrip()
-                    + b" [SUM of %d item(s)]" % len(matches),
+                    + " [SUM of %d item(s)]" % len(matches),
                 )
                 self.emit(
                     summary.min,
                     item_formatter=lambda i: i.rstrip()
-                    + b" [MIN of %d item(s)]" % len(matches),
+                    + " [MIN of %d item(s)]" % len(matches),
                 )
                 self.emit(
                     summary.average,
                     item_formatter=lambda i: i.rstrip()
-                    + b" [AVG of %d item(s)]" % len(matches),
+                    + " [AVG of %d item(s)]" % len(matches),
                 )
                 self.emit(
                     summary.max,
                     item_formatter=lambda i: i.rstrip()
-                    + b" [MAX of %d item(s)]" % len(matches),
+                    + " [MAX of %d item(s)]" % len(matches),
                 )
 
             self.LOG.info(
@@ -1097,8 +1349,7 @@ class RtorrentControl(ScriptBaseWithConfig):
             print("\n" + repr(matches[0]))
             print("\n" + repr(matches[0].files))
 
-        # XMLRPC stats
-        self.LOG.debug("XMLRPC stats: %s" % config.engine._rpc)
+        self.report_stats()
 
 
 def run():  # pragma: no cover
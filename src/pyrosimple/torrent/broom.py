@@ -33,8 +33,12 @@ SweepRule = namedtuple("SweepRule", "ruleset name prio order filter")
 
 
 def parse_cond(text):
-    """Parse a filter condition."""
-    return matching.ConditionParser(engine.FieldDefinition.lookup, "name").parse(text)
+    """Parse a filter condition, and compile it."""
+    return (
+        matching.ConditionParser(engine.FieldDefinition.lookup, "name")
+        .parse(text)
+        .compile()
+    )
 
 
 class DiskSpaceManager(object):
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=I0011
+""" Columnar Result Sets.
+
+    The numeric fields of a search result (sizes, rates, ratios,
+    timestamps) are held as typed NumPy arrays, so filters on them
+    become vectorized masks, and statistics become array reductions.
+    NumPy is optional, see L{numpy}.
+
+    Copyright (c) 2011 The PyroScope Project <pyroscope.project@gmail.com>
+"""
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from pyrosimple import error
+from pyrosimple.util.parts import Bunch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ColumnarItems(object):
+    """Download items, with their numeric field values as arrays.
+
+    Columns are built on first use, from the (prefetched) field values
+    of all items. Fields with values that are not numbers have no column,
+    and filters on them are evaluated item by item.
+    """
+
+    # Array kinds that are numbers (bool, int, unsigned, float)
+    NUMERIC_KINDS = "biuf"
+
+    def __init__(self, items, engine=None, viewname=None):
+        """Initialize result set.
+
+        @param engine: Optional engine, used to group items evaluated
+            item by item, so their on-demand fields are fetched together.
+        """
+        if numpy is None:
+            raise error.UserError("Columnar result sets need NumPy installed")
+
+        self.items = list(items)
+        self.engine = engine
+        self.viewname = viewname
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def _values(self, name):
+        """Return the values of field C{name} of all items."""
+        field = getattr(type(self.items[0]), name, None) if self.items else None
+        if getattr(field, "_accessor", True) is None:
+            # Convert prefetched values directly, without the descriptor
+            try:
+                return list(map(field.valtype, (i._fields[name] for i in self.items)))
+            except (AttributeError, KeyError):
+                pass
+        return [getattr(item, name) for item in self.items]
+
+    def _build(self, name):
+        """Build the column for field C{name}, and return it with its null mask."""
+        values = self._values(name)
+        nulls = numpy.fromiter(
+            (val is None for val in values), dtype=bool, count=len(values)
+        )
+        if nulls.any():
+            values = [0 if val is None else val for val in values]
+
+        try:
+            array = numpy.asarray(values)
+        except (TypeError, ValueError, OverflowError):
+            return None, None
+        if array.dtype.kind not in self.NUMERIC_KINDS or array.ndim != 1:
+            return None, None
+        if array.dtype.kind == "b":
+            array = array.astype(numpy.int64)
+        return array, nulls
+
+    def column(self, name):
+        """Return the values of field C{name} as an array, or C{None} if not numeric.
+
+        Unset values (C{None}) are zero in the array, see L{nulls}.
+        """
+        if name not in self._columns:
+            self._columns[name] = self._build(name)
+        return self._columns[name][0]
+
+    def nulls(self, name):
+        """Return a boolean array of the unset values of field C{name}."""
+        self.column(name)
+        return self._columns[name][1]
+
+    def all(self, where=None):
+        """Return a boolean array selecting the items selected by C{where}, or all."""
+        if where is None:
+            return numpy.ones(len(self.items), dtype=bool)
+        return where.copy()
+
+    def apply(self, match, where=None):
+        """Return a boolean array of the results of C{match} for the items.
+
+        Only the items selected by C{where} are evaluated, all others
+        are C{False}.
+        """
+        result = numpy.zeros(len(self.items), dtype=bool)
+        indices = numpy.flatnonzero(self.all(where))
+        selected = [self.items[idx] for idx in indices]
+        if self.engine is not None and where is not None:
+            self.engine.batch(selected, self.viewname)
+        result[indices] = [bool(match(item)) for item in selected]
+        return result
+
+    def select(self, mask):
+        """Return a new result set of the items selected by the boolean C{mask}."""
+        result = ColumnarItems(
+            (self.items[idx] for idx in numpy.flatnonzero(mask)),
+            self.engine,
+            self.viewname,
+        )
+        for name, (array, nulls) in self._columns.items():
+            result._columns[name] = (
+                (None, None) if array is None else (array[mask], nulls[mask])
+            )
+        return result
+
+    def filter(self, matcher):
+        """Return a new result set of the items matching a filter tree."""
+        return self.select(matcher.mask(self))
+
+    def stats(self, name):
+        """Return SUM, MIN, AVG, and MAX of field C{name}, as a bunch.
+
+        Unset values are not included, their number is given as C{nulls}.
+        Returns C{None} for fields that are not numeric.
+        """
+        array = self.column(name)
+        if array is None:
+            return None
+
+        nulls = self.nulls(name)
+        values = array[~nulls]
+        if not len(values):
+            return Bunch(count=0, nulls=int(nulls.sum()), sum=0, min=0, avg=0, max=0)
+        return Bunch(
+            count=len(values),
+            nulls=int(nulls.sum()),
+            sum=values.sum().item(),
+            min=values.min().item(),
+            avg=values.mean().item(),
+            max=values.max().item(),
+        )
@@ -23,9 +23,11 @@ import time
 import operator
 from typing import Dict, Any, Set
 from collections import defaultdict
+from collections.abc import Mapping
 
 from pyrosimple import config, error
 from pyrosimple.util import os, pymagic, fmt, traits, matching, metafile, xmlrpc
+from pyrosimple.torrent import columns
 
 
 #
@@ -238,6 +240,55 @@ class FieldDefinition(object):
 
         return {"matcher": field._matcher} if field else None
 
+    @classmethod
+    def requirements(cls, names):
+        """Return the names of the item values needed to get the given fields.
+
+        Computed fields declare the fields they use in C{requires}, these
+        are resolved recursively; a computed field can require its own
+        name for the underlying raw value. Other fields just need their
+        own value.
+        """
+        result, seen, todo = set(), set(), list(names)
+        while todo:
+            name = todo.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+
+            field = cls.FIELDS.get(name) or TorrentProxy.add_manifold_attribute(name)
+            if field is None or not (field._accessor or field.requires):
+                result.add(name)
+            else:
+                result.update(i for i in field.requires if i == name)
+                todo.extend(i for i in field.requires if i != name)
+
+        return result
+
+    # Fields that look at the local filesystem
+    FILESYSTEM_FIELDS = ("is_ghost", "realpath")
+
+    @classmethod
+    def cost(cls, name, prefetch=()):
+        """Return the estimated cost of getting field C{name} of an item.
+
+        @param prefetch: Names of the fields fetched with the item list.
+        """
+        prefetched = cls.requirements(prefetch)
+        result = 0
+        for raw in cls.requirements([name]):
+            if raw == "files":
+                result += matching.COST_FILES
+            elif raw == "metainfo":
+                result += matching.COST_FILESYSTEM
+            elif raw in prefetched:
+                result += matching.COST_PREFETCHED
+            else:
+                result += matching.COST_ONDEMAND
+        if name in cls.FILESYSTEM_FIELDS:
+            result += matching.COST_FILESYSTEM
+        return result
+
     def __init__(
         self,
         valtype,
@@ -247,10 +298,12 @@ class FieldDefinition(object):
         matcher=None,
         formatter=None,
         engine_name=None,
+        requires=None,
     ):
         self.valtype = valtype
         self.name = name
         self.__doc__ = doc
+        self.requires = tuple(requires or ())
         self._engine_name = engine_name
         self._accessor = accessor
         self._matcher = matcher
@@ -290,7 +343,18 @@ class ImmutableField(FieldDefinition):
 class ConstantField(ImmutableField):
     """Read-only download item field with constant value."""
 
-    # This can be cached
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        if self._accessor:
+            # Computed values never change either, so keep them
+            key = "const_" + self.name
+            try:
+                val = obj._fields[key]
+            except KeyError:
+                val = obj._fields[key] = self._accessor(obj)
+            return self.valtype(val)
+        return self.valtype(obj._fields[self.name])
 
 
 class DynamicField(ImmutableField):
@@ -315,12 +379,80 @@ class MutableField(FieldDefinition):
         raise NotImplementedError()
 
 
+class FieldRecord(Mapping):
+    """Field values of a download item, stored compactly.
+
+    The values an item list came with stay in their row (a list), and
+    the map from field names to positions is shared by all items of that
+    list. Values added later go into a dict, created on first use.
+    """
+
+    __slots__ = ("_index", "_values", "_extra")
+
+    def __init__(self, index, values):
+        """Initialize record.
+
+        @param index: Dict mapping field names to positions in C{values},
+            see L{make_index}.
+        @param values: List of field values.
+        """
+        self._index = index
+        self._values = values
+        self._extra = None
+
+    @staticmethod
+    def make_index(names):
+        """Return the field index for rows holding the values of C{names}."""
+        return dict((name, idx) for idx, name in enumerate(names))
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._index[key]]
+        except KeyError:
+            if self._extra is None:
+                raise
+            return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._index:
+            self._values[self._index[key]] = value
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key):
+        return key in self._index or (self._extra is not None and key in self._extra)
+
+    def __iter__(self):
+        yield from self._index
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return len(self._index) + len(self._extra or ())
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, dict(self))
+
+    def update(self, values):
+        """Set the values of a dict or iterable of (name, value) pairs."""
+        for key, value in dict(values).items():
+            self[key] = value
+
+    def copy(self):
+        """Return the values as a dict."""
+        return dict(self)
+
+
 #
 # [Somewhat] Generic Engine Interface (abstract base classes)
 #
 class TorrentProxy(object):
     """A single download item."""
 
+    __slots__ = ("_fields",)
+
     @classmethod
     def add_manifold_attribute(cls, name):
         """Register a manifold engine attribute.
@@ -355,6 +487,8 @@ class TorrentProxy(object):
                     matcher=matching.TaggedAsFilter,
                     formatter=_fmt_tags,
                     engine_name="kind_%d" % limit,
+                    # without a cached "custom_kind", the file list is read
+                    requires=("custom_kind", "files"),
                 )
                 setattr(cls, name, field)
 
@@ -480,6 +614,7 @@ class TorrentProxy(object):
         "first in the list of announce URLs",
         matcher=matching.PatternFilter,
         accessor=lambda o: (o.announce_urls(default=[None]) or [None])[0],
+        requires=("trackers",),
     )
     alias = ConstantField(
         config.map_announce2alias,
@@ -487,6 +622,7 @@ class TorrentProxy(object):
         "tracker alias or domain",
         matcher=matching.PatternFilter,
         accessor=lambda o: o._memoize("alias", getattr, o, "tracker"),
+        requires=("custom_m_alias",),
     )
     # matcher=matching.PatternFilter, accessor=operator.attrgetter("tracker"))
     message = OnDemandField(
@@ -543,6 +679,7 @@ class TorrentProxy(object):
         matcher=matching.BoolFilter,
         accessor=lambda o: not os.path.exists(o.datapath()) if o.datapath() else None,
         formatter=lambda val: "GHST" if val else "DATA",
+        requires=("path",),
     )
 
     # Paths
@@ -586,6 +723,7 @@ class TorrentProxy(object):
         "path to download data",
         matcher=matching.PatternFilter,
         accessor=lambda o: o.datapath(),
+        requires=("path", "directory", "is_multi_file", "name"),
     )
     realpath = DynamicField(
         str,
@@ -593,6 +731,7 @@ class TorrentProxy(object):
         "real path to download data",
         matcher=matching.PatternFilter,
         accessor=lambda o: os.path.realpath(o.datapath()),
+        requires=("path",),
     )
     metafile = ConstantField(
         str,
@@ -600,6 +739,7 @@ class TorrentProxy(object):
         "path to torrent file",
         matcher=matching.PatternFilter,
         accessor=lambda o: os.path.expanduser(str(o._fields["metafile"])),
+        requires=("metafile",),
     )
     sessionfile = ConstantField(
         str,
@@ -607,6 +747,7 @@ class TorrentProxy(object):
         "path to session file",
         matcher=matching.PatternFilter,
         accessor=lambda o: os.path.expanduser(str(o.fetch("session_file"))),
+        requires=("session_file",),
     )
     files = OnDemandField(
         list,
@@ -625,7 +766,11 @@ class TorrentProxy(object):
 
     # Bandwidth & Data Transfer
     done = OnDemandField(
-        percent, "done", "completion in percent", matcher=matching.FloatFilter
+        percent,
+        "done",
+        "completion in percent",
+        matcher=matching.FloatFilter,
+        requires=("completed_chunks", "size_chunks"),
     )
     ratio = DynamicField(
         ratio_float,
@@ -646,6 +791,7 @@ class TorrentProxy(object):
         "transfer rate",
         matcher=matching.ByteSizeFilter,
         accessor=lambda o: o.fetch("up") + o.fetch("down"),
+        requires=("up", "down"),
     )
     # last_xfer = DynamicField(int, "last_xfer", "last time data was transferred", matcher=matching.TimeFilter,
     #     accessor=lambda o: int(o.fetch("timestamp.last_xfer") or 0), formatter=fmt.iso_datetime_optional)
@@ -657,6 +803,7 @@ class TorrentProxy(object):
         "throttle group name (NULL=unlimited, NONE=global)",
         matcher=matching.PatternFilter,
         accessor=lambda o: o._fields["throttle"] or "NONE",
+        requires=("throttle",),
     )
 
     # Lifecyle
@@ -667,6 +814,24 @@ class TorrentProxy(object):
         matcher=matching.TimeFilterNotNull,
         accessor=lambda o: int(o.fetch("custom_tm_loaded") or "0", 10),
         formatter=fmt.iso_datetime_optional,
+        requires=("custom_tm_loaded",),
+    )
+    created = ConstantField(
+        int,
+        "created",
+        "time metafile was created (or loaded, if unknown)",
+        matcher=matching.TimeFilterNotNull,
+        accessor=lambda o: int(o.fetch("metainfo").get("created") or o.loaded),
+        formatter=fmt.iso_datetime_optional,
+        requires=("metainfo", "custom_tm_loaded"),
+    )
+    piece_length = ConstantField(
+        int,
+        "piece_length",
+        "size of a piece in the metafile",
+        matcher=matching.ByteSizeFilter,
+        accessor=lambda o: o.fetch("metainfo").get("piece_length", 0),
+        requires=("metainfo",),
     )
     started = DynamicField(
         int,
@@ -675,6 +840,7 @@ class TorrentProxy(object):
         matcher=matching.TimeFilterNotNull,
         accessor=lambda o: int(o.fetch("custom_tm_started") or "0", 10),
         formatter=fmt.iso_datetime_optional,
+        requires=("custom_tm_started",),
     )
     leechtime = DynamicField(
         untyped,
@@ -684,6 +850,7 @@ class TorrentProxy(object):
         accessor=lambda o: _interval_sum(o, end=o.completed, context=o.name)
         or _duration(o.started, o.completed),
         formatter=_fmt_duration,
+        requires=("completed", "started", "custom_activations"),
     )
     completed = DynamicField(
         int,
@@ -692,6 +859,7 @@ class TorrentProxy(object):
         matcher=matching.TimeFilterNotNull,
         accessor=lambda o: int(o.fetch("custom_tm_completed") or "0", 10),
         formatter=fmt.iso_datetime_optional,
+        requires=("custom_tm_completed",),
     )
     seedtime = DynamicField(
         untyped,
@@ -702,6 +870,7 @@ class TorrentProxy(object):
         if o.is_complete
         else None,
         formatter=_fmt_duration,
+        requires=("completed", "is_complete", "custom_activations"),
     )
     # active = DynamicField(int, "active", "last time a peer was connected", matcher=matching.TimeFilter,
     #    accessor=lambda o: int(o.fetch("timestamp.last_active") or 0), formatter=fmt.iso_datetime_optional)
@@ -714,6 +883,7 @@ class TorrentProxy(object):
             1
         ],
         formatter=fmt.iso_datetime_optional,
+        requires=("custom_activations",),
     )
 
     # Classification
@@ -724,6 +894,7 @@ class TorrentProxy(object):
         matcher=matching.TaggedAsFilter,
         accessor=lambda o: set(o.fetch("custom_tags").lower().split()),
         formatter=_fmt_tags,
+        requires=("custom_tags",),
     )
     views = OnDemandField(
         set,
@@ -740,6 +911,7 @@ class TorrentProxy(object):
         matcher=matching.TaggedAsFilter,
         formatter=_fmt_tags,
         accessor=lambda o: o.fetch("kind_0"),
+        requires=("kind_0",),
     )
     traits = DynamicField(
         list,
@@ -748,31 +920,28 @@ class TorrentProxy(object):
         matcher=matching.TaggedAsFilter,
         formatter=lambda v: "/".join(v or ["misc", "other"]),
         accessor=detect_traits,
+        requires=("name", "alias", "kind_51"),
     )
     # = DynamicField(, "", "")
 
-    # TODO: metafile data cache (sqlite, shelve or maybe .ini)
-    # cache data indexed by hash
-    # store ctime per cache entry
-    # scan metafiles of new hashes not yet in cache
-    # on cache read, for unknown hashes setdefault() a purge date, then remove entries after a while
-    # clear purge date for known hashes (unloaded and then reloaded torrents)
-    # store a version marker and other global metadata in cache under key = None, so it can be upgraded
-    # add option to pyroadmin to inspect the cache, mainly for debugging
-
-    # TODO: created (metafile creation date, i.e. the bencoded field; same as downloaded if missing; cached by hash)
-    # add .age formatter (age = " 1y 6m", " 2w 6d", "12h30m", etc.)
+    # TODO: add .age formatter (age = " 1y 6m", " 2w 6d", "12h30m", etc.)
 
 
 class TorrentView(object):
     """A view on a subset of torrent items."""
 
-    def __init__(self, engine, viewname, matcher=None):
-        """Initialize view on torrent items."""
+    def __init__(self, engine, viewname, matcher=None, prefetch=None):
+        """Initialize view on torrent items.
+
+        @param prefetch: Optional list of field names to fetch initially.
+        """
         self.engine = engine
         self.viewname = viewname or "default"
         self.matcher = matcher
+        self.prefetch = prefetch
         self._items = None
+        self._query = None  # set by the engine, for repeating the query
+        self._query_time = None  # when the query's items were all received
 
     def __iter__(self):
         return self.items()
@@ -780,10 +949,24 @@ class TorrentView(object):
     def _fetch_items(self):
         """Fetch to attribute."""
         if self._items is None:
-            self._items = list(self.engine.items(self))
+            self._items = list(self.engine.items(self, self.prefetch))
 
         return self._items
 
+    def _iter_items(self, stream=False):
+        """Yield the items, fetched on first use.
+
+        With C{stream} set, items are yielded while they still come in.
+        """
+        if self._items is None and stream:
+            items = []
+            for item in self.engine.items(self, self.prefetch):
+                items.append(item)
+                yield item
+            self._items = items
+        else:
+            yield from self._fetch_items()
+
     def _check_hash_view(self):
         """Return infohash if view name refers to a single item, else None."""
         infohash = None
@@ -806,16 +989,42 @@ class TorrentView(object):
         else:
             return self.engine.open().view.size(xmlrpc.NOHASH, self.viewname)
 
-    def items(self):
-        """Get list of download items."""
+    def items(self, stream=False):
+        """Get list of download items.
+
+        @param stream: Yield items while they still come in from the client?
+            Fields not prefetched are then fetched for each item on its own,
+            see L{TorrentEngine.separate_fields}.
+        """
         if self.matcher:
-            for item in self._fetch_items():
-                if self.matcher.match(item):
+            match = self.matcher.compile().match
+            matches = []
+            for item in self._iter_items(stream):
+                if match(item):
+                    matches.append(item)
                     yield item
+                else:
+                    # Don't fetch more fields for it along with other items
+                    self.engine.release(item)
+
+            # Fields fetched on demand from now on are only needed for the matches
+            self.engine.batch(matches, self.viewname)
         else:
-            for item in self._fetch_items():
+            for item in self._iter_items(stream):
                 yield item
 
+    def columns(self):
+        """Get download items as L{ColumnarItems<columns.ColumnarItems>}.
+
+        Filtering is done on whole columns via vectorized masks, which
+        needs NumPy.
+        """
+        result = columns.ColumnarItems(self._fetch_items(), self.engine, self.viewname)
+        if self.matcher:
+            result = result.filter(self.matcher)
+            self.engine.batch(result.items, self.viewname)
+        return result
+
 
 class TorrentEngine(object):
     """A torrent backend."""
@@ -838,15 +1047,38 @@ class TorrentEngine(object):
         """Log a message in the torrent client."""
         raise NotImplementedError()
 
-    def view(self, viewname="default", matcher=None):
+    def view(self, viewname="default", matcher=None, prefetch=None):
         """Get list of download items."""
-        return TorrentView(self, viewname, matcher)
+        return TorrentView(self, viewname, matcher, prefetch)
 
     def items(self, view=None, prefetch=None, cache=True):
         """Get list of download items."""
         raise NotImplementedError()
 
-    def show(self, items, view=None):
+    def explain(self, view, prefetch=None):
+        """Return how the items of a view get queried."""
+        raise NotImplementedError()
+
+    def batch(self, items, viewname=None):
+        """Group items, so fields fetched on demand are fetched for all of them.
+
+        The default is to not group them.
+        """
+
+    def release(self, item):
+        """Exclude an item from grouped fetching, see L{batch}.
+
+        The default does nothing.
+        """
+
+    def separate_fields(self, prefetch):  # pylint: disable=no-self-use,unused-argument
+        """Return the names of the given fields not fetched with the item list.
+
+        The default is that all fields come with it.
+        """
+        return []
+
+    def show(self, items, view=None, append=False, disjoin=False, source=None):
         """Visualize a set of items (search result), and return the view name."""
         raise NotImplementedError()
 
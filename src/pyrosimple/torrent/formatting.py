@@ -371,6 +371,43 @@ def validate_field_list(fields, allow_fmt_specs=False, name_filter=None):
     return fields
 
 
+def sort_field_names(sort_fields):
+    """Make sure the fields in the given sort order exist, and return their names.
+
+    @param sort_fields: List of fields (comma-/space-separated if a string),
+        possibly prefixed with '-'.
+    @return: validated field names.
+    @rtype: list
+    """
+    return validate_field_list(sort_fields, name_filter=lambda name: name.lstrip("-"))
+
+
+def format_fields(format_spec):
+    """Return the names of the item fields used in an output format.
+
+    This works for interpolation strings (C{%(name)s}) and Tempita templates
+    (C{{{d.name}}}), either preparsed or as a string; unknown names are ignored.
+
+    @param format_spec: The output format.
+    @return: field names, in order of appearance.
+    @rtype: list
+    """
+    text = getattr(format_spec, "__text__", format_spec) or ""
+    if getattr(format_spec, "__engine__", None) == "tempita" or text.startswith("{{"):
+        names = re.findall(r"\bd\.([_a-zA-Z][_a-zA-Z0-9]*)", text)
+    else:
+        names = re.findall(r"[%$]\(([_a-zA-Z][_a-zA-Z0-9]*)", text)
+
+    result = []
+    for name in names:
+        if name not in result and (
+            name in engine.FieldDefinition.FIELDS
+            or engine.TorrentProxy.add_manifold_attribute(name)
+        ):
+            result.append(name)
+    return result
+
+
 def validate_sort_fields(sort_fields):
     """Make sure the fields in the given list exist, and return sorting key.
 
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=I0011
+""" Metafile Data Cache.
+
+    Constant data of download items (names, sizes, file lists, metafile
+    data, tracker aliases, and the like) is kept in a local SQLite
+    database indexed by info hash, so repeated queries need not get it
+    from rTorrent or the metafiles again.
+
+    Copyright (c) 2011 The PyroScope Project <pyroscope.project@gmail.com>
+"""
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import json
+import time
+import base64
+import sqlite3
+
+from pyrosimple import error
+from pyrosimple.util import os, pymagic
+from pyrosimple.util.parts import Bunch
+
+
+def _encode(obj):
+    """Return a JSON representation of values C{json} can't handle itself.
+
+    Byte strings become a C{{"__bytes__": <base64>}} dict, so they come
+    back unchanged from L{_decode}, other iterables (sets) become lists.
+    """
+    if isinstance(obj, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(obj).decode("ascii")}
+    try:
+        return list(obj)
+    except TypeError:
+        raise TypeError("Cannot store %r in the metafile cache" % (obj,))
+
+
+def _decode(obj):
+    """Restore byte strings encoded by L{_encode}."""
+    if list(obj) == ["__bytes__"]:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+class MetafileCache(object):
+    """Persistent cache of constant item data, indexed by info hash.
+
+    Each entry holds a dict of field values, and its creation time.
+    Entries of hashes not loaded in the client anymore get a purge date
+    on L{sync}, and are removed after L{PURGE_DELAY} seconds, unless the
+    item reappears before that.
+
+    Database errors when reading or writing entries (e.g. another process
+    holding a lock) are logged, and the caller carries on as if the entries
+    were not cached.
+    """
+
+    # Version of the data layout, a cache with another version is rebuilt
+    VERSION = 2
+
+    # Seconds an entry is kept after its item vanished from the client
+    PURGE_DELAY = 14 * 86400
+
+    # Number of hashes per SQL query
+    CHUNK_SIZE = 500
+
+    def __init__(self, path):
+        """Initialize cache stored in the file C{path}."""
+        self.LOG = pymagic.get_class_logger(self)
+        self.path = os.path.expanduser(path)
+        self.db = None
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.path)
+
+    def open(self):
+        """Open the database, creating or upgrading it when needed."""
+        if self.db is not None:
+            return self.db
+
+        try:
+            self.db = sqlite3.connect(self.path)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            version = self.db.execute(
+                "SELECT value FROM meta WHERE key = 'version'"
+            ).fetchone()
+            if version is None or int(version[0]) != self.VERSION:
+                if version is not None:
+                    self.LOG.info(
+                        "Rebuilding metafile cache %r (version %s => %d)"
+                        % (self.path, version[0], self.VERSION)
+                    )
+                self.db.execute("DROP TABLE IF EXISTS items")
+                self.db.execute(
+                    "CREATE TABLE items (hash TEXT PRIMARY KEY,"
+                    " ctime REAL NOT NULL, purge REAL, data TEXT NOT NULL)"
+                )
+                self.db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                    (str(self.VERSION),),
+                )
+                self.db.commit()
+        except sqlite3.Error as exc:
+            self.db = None
+            raise error.LoggableError(
+                "Cannot open metafile cache %r: %s" % (self.path, exc)
+            )
+
+        return self.db
+
+    def close(self):
+        """Close the database."""
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def _select(self, columns, hashes):
+        """Yield the given columns of the entries for C{hashes}, in chunks."""
+        hashes = list(hashes)
+        for idx in range(0, len(hashes), self.CHUNK_SIZE):
+            chunk = hashes[idx : idx + self.CHUNK_SIZE]
+            for row in self.open().execute(
+                "SELECT %s FROM items WHERE hash IN (%s)"
+                % (columns, ",".join("?" * len(chunk))),
+                chunk,
+            ):
+                yield row
+
+    def _failed(self, doing, exc):
+        """Log a database error, and roll back the current transaction."""
+        self.LOG.warning(
+            "Metafile cache %r unusable while %s, going on without it: %s"
+            % (self.path, doing, exc)
+        )
+        try:
+            self.db.rollback()
+        except (AttributeError, sqlite3.Error):
+            pass
+
+    def count(self):
+        """Return the number of cached entries (0 if the database is unusable)."""
+        try:
+            return self.open().execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        except sqlite3.Error as exc:
+            self._failed("counting entries", exc)
+            return 0
+
+    def get(self, hashes):
+        """Return a dict mapping the cached ones of the given hashes to their data."""
+        try:
+            return dict(
+                (infohash, json.loads(data, object_hook=_decode))
+                for infohash, data in self._select("hash, data", hashes)
+            )
+        except sqlite3.Error as exc:
+            self._failed("reading entries", exc)
+            return {}
+
+    def update(self, values):
+        """Merge the data given as a dict of dicts by hash into the cache."""
+        if not values:
+            return
+
+        cached = self.get(values)
+        now = time.time()
+        try:
+            db = self.open()
+            for infohash, data in values.items():
+                if infohash in cached:
+                    cached[infohash].update(data)
+                    db.execute(
+                        "UPDATE items SET data = ?, purge = NULL WHERE hash = ?",
+                        (json.dumps(cached[infohash], default=_encode), infohash),
+                    )
+                else:
+                    db.execute(
+                        "INSERT INTO items VALUES (?, ?, NULL, ?)",
+                        (infohash, now, json.dumps(data, default=_encode)),
+                    )
+            db.commit()
+        except sqlite3.Error as exc:
+            self._failed("storing %d entries" % len(values), exc)
+
+    def sync(self, hashes):
+        """Update purge dates, given the complete set of hashes loaded in the client.
+
+        Returns the set of those hashes that are not cached yet, which are
+        all of them if the database is unusable.
+        """
+        hashes = set(hashes)
+        now = time.time()
+
+        known = set()
+        vanished, reappeared = [], []
+        try:
+            db = self.open()
+            for infohash, purge in db.execute("SELECT hash, purge FROM items"):
+                if infohash in hashes:
+                    known.add(infohash)
+                    if purge is not None:
+                        reappeared.append((infohash,))
+                elif purge is None:
+                    vanished.append((now + self.PURGE_DELAY, infohash))
+
+            db.executemany("UPDATE items SET purge = NULL WHERE hash = ?", reappeared)
+            db.executemany("UPDATE items SET purge = ? WHERE hash = ?", vanished)
+            purged = db.execute("DELETE FROM items WHERE purge < ?", (now,)).rowcount
+            db.commit()
+        except sqlite3.Error as exc:
+            self._failed("updating purge dates", exc)
+            return hashes
+
+        if vanished or purged:
+            self.LOG.debug(
+                "Metafile cache: %d entries marked for purging, %d purged"
+                % (len(vanished), purged)
+            )
+        return hashes - known
+
+    def entries(self):
+        """Yield all entries, as bunches with hash, ctime, purge, and data."""
+        for infohash, ctime, purge, data in self.open().execute(
+            "SELECT hash, ctime, purge, data FROM items ORDER BY ctime"
+        ):
+            yield Bunch(
+                hash=infohash,
+                ctime=ctime,
+                purge=purge,
+                data=json.loads(data, object_hook=_decode),
+            )
+
+    def stats(self):
+        """Return statistics about the cache, as a bunch."""
+        db = self.open()
+        entries, purging, oldest = db.execute(
+            "SELECT COUNT(*), COUNT(purge), MIN(ctime) FROM items"
+        ).fetchone()
+        return Bunch(
+            path=self.path,
+            version=self.VERSION,
+            entries=entries,
+            purging=purging,
+            oldest=oldest,
+            size=os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        )
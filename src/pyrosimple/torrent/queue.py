@@ -51,7 +51,7 @@ class QueueManager(object):
         ).parse(
             "[ %s ] [ %s ]"
             % (config_ini.torque["queue_startable_base"], self.config.startable)
-        )
+        ).compile()
         self.LOG.info(
             "Startable matcher for '%s' is: [ %s ]"
             % (self.config.job_name, self.config.startable)
@@ -65,7 +65,7 @@ class QueueManager(object):
                 if "downloading" in self.config
                 else ""
             )
-        )
+        ).compile()
         self.LOG.info(
             "Downloading matcher for '%s' is: [ %s ]"
             % (self.config.job_name, self.config.downloading)
@@ -76,6 +76,15 @@ class QueueManager(object):
             else None
         )
 
+        # Fields to get in the view's multicall, so nothing is fetched per item
+        self.prefetch = (
+            set(["name", "alias"])
+            | self.config.startable.field_names()
+            | self.config.downloading.field_names()
+        )
+        if self.sort_key:
+            self.prefetch.update(formatting.sort_field_names(self.config.sort_fields))
+
     def _start(self, items):
         """Start some items if conditions are met."""
         # TODO: Filter by a custom date field, for scheduled downloads starting at a certain time, or after a given delay
@@ -185,7 +194,9 @@ class QueueManager(object):
             self.proxy = config_ini.engine.open()
 
             # Get items from 'pyrotorque' view
-            items = list(config_ini.engine.items(self.VIEWNAME, cache=False))
+            items = list(
+                config_ini.engine.items(self.VIEWNAME, self.prefetch, cache=False)
+            )
 
             if self.sort_key:
                 items.sort(key=self.sort_key)
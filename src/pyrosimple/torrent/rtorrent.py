@@ -19,18 +19,22 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 import sys
+import math
 import time
 import errno
+import atexit
 import shlex
 import fnmatch
 import logging
 import operator
 from collections import namedtuple
 
+import bencode
+
 from pyrosimple.util.parts import Bunch
 from pyrosimple import config, error
 from pyrosimple.util import os, xmlrpc, load_config, traits, fmt, matching
-from pyrosimple.torrent import engine
+from pyrosimple.torrent import engine, metacache
 
 
 class CommaLexer(shlex.shlex):
@@ -46,16 +50,37 @@ class CommaLexer(shlex.shlex):
 class RtorrentItem(engine.TorrentProxy):
     """A single download item."""
 
+    __slots__ = ("_engine", "_batch")
+
     def __init__(self, engine_, fields):
-        """Initialize download item."""
+        """Initialize download item.
+
+        @param fields: L{FieldRecord<engine.FieldRecord>}, or anything
+            C{dict} accepts.
+        """
         super(RtorrentItem, self).__init__()
         self._engine = engine_
-        self._fields = dict(fields)
+        self._fields = (
+            fields if isinstance(fields, engine.FieldRecord) else dict(fields)
+        )
+        self._batch = None
 
     def _make_it_so(self, command, calls, *args, **kwargs):
-        """Perform some error-checked XMLRPC calls."""
+        """Perform some error-checked XMLRPC calls.
+
+        While the engine has an active L{CallQueue}, the calls are queued
+        there instead.
+        """
         observer = kwargs.pop("observer", False)
         args = (self._fields["hash"],) + args
+        if self._engine._call_queue is not None:
+            for call in calls:
+                if not (call.startswith(":") or call[:2].endswith(".")):
+                    call = "d." + call
+                self._engine._call_queue.add(
+                    self, command, call.lstrip(":"), args, observer
+                )
+            return
         try:
             for call in calls:
                 self._engine.LOG.debug(
@@ -74,6 +99,44 @@ class RtorrentItem(engine.TorrentProxy):
                 "While %s torrent #%s: %s" % (command, self._fields["hash"], exc)
             )
 
+    # Commands for the file attributes returned by _get_files()
+    FILE_COMMANDS = (
+        "f.path=",
+        "f.size_bytes=",
+        "f.last_touched=",
+        "f.priority=",
+        "f.is_created=",
+        "f.is_open=",
+    )
+
+    # Commands for the tracker rows in the "trackers" field
+    TRACKER_COMMANDS = ("t.url=", "t.is_enabled=")
+
+    @classmethod
+    def _files_from_rows(cls, rpc_result, attrs=None):
+        """Convert C{f.multicall} results to the list returned by L{_get_files}."""
+        result = [
+            Bunch(
+                path=i[0],
+                size=i[1],
+                mtime=i[2] / 1000000.0,
+                prio=i[3],
+                created=i[4],
+                opened=i[5],
+            )
+            for i in rpc_result
+        ]
+
+        if attrs:
+            offset = len(cls.FILE_COMMANDS)
+            for idx, attr in enumerate(attrs):
+                if attr.startswith("get_"):
+                    attr = attr[4:]
+                for item, rpc_item in zip(result, rpc_result):
+                    item[attr] = rpc_item[offset + idx]
+
+        return result
+
     def _get_files(self, attrs=None):
         """Get a list of all files in this download; each entry has the
         attributes C{path} (relative to root), C{size} (in bytes),
@@ -87,16 +150,7 @@ class RtorrentItem(engine.TorrentProxy):
         try:
             # Get info for all files
             f_multicall = self._engine._rpc.f.multicall
-            f_params = [
-                self._fields["hash"],
-                0,
-                "f.path=",
-                "f.size_bytes=",
-                "f.last_touched=",
-                "f.priority=",
-                "f.is_created=",
-                "f.is_open=",
-            ]
+            f_params = [self._fields["hash"], 0] + list(self.FILE_COMMANDS)
             for attr in attrs or []:
                 f_params.append("f.%s=" % attr)
             rpc_result = f_multicall(*tuple(f_params))
@@ -107,28 +161,7 @@ class RtorrentItem(engine.TorrentProxy):
             )
         else:
             # self._engine.LOG.debug("files result: %r" % rpc_result)
-
-            # Return results
-            result = [
-                Bunch(
-                    path=i[0],
-                    size=i[1],
-                    mtime=i[2] / 1000000.0,
-                    prio=i[3],
-                    created=i[4],
-                    opened=i[5],
-                )
-                for i in rpc_result
-            ]
-
-            if attrs:
-                for idx, attr in enumerate(attrs):
-                    if attr.startswith("get_"):
-                        attr = attr[4:]
-                    for item, rpc_item in zip(result, rpc_result):
-                        item[attr] = rpc_item[6 + idx]
-
-            return result
+            return self._files_from_rows(rpc_result, attrs)
 
     def _memoize(self, name, getter, *args, **kwargs):
         """Cache a stable expensive-to-get item value for later (optimized) retrieval."""
@@ -183,25 +216,83 @@ class RtorrentItem(engine.TorrentProxy):
         # Return all non-empty extensions that make up at least <limit>% of total size
         return set(ext for val, ext in histo if ext and val >= limit)
 
+    def _get_metainfo(self):
+        """Get the constant metafile data of this item, read from its session file.
+
+        Returns a dict with the creation date, piece length, announce URLs,
+        and file list (paths and sizes), which is empty if the metafile
+        cannot be read.
+        """
+        filename = self.fetch("session_file") or self.fetch("metafile")
+        try:
+            meta = bencode.bread(os.path.expanduser(filename))
+            info = meta["info"]
+        except (
+            EnvironmentError,
+            KeyError,
+            TypeError,
+            bencode.BencodeDecodeError,
+        ) as exc:
+            self._engine.LOG.debug(
+                "Cannot read metafile %r of #%s: %s"
+                % (filename, self._fields["hash"], exc)
+            )
+            return {}
+
+        if "files" in info:
+            files = [["/".join(i["path"]), i["length"]] for i in info["files"]]
+        else:
+            files = [[info["name"], info["length"]]]
+        announce = [url for tier in meta.get("announce-list", []) for url in tier]
+        if "announce" in meta and meta["announce"] not in announce:
+            announce.insert(0, meta["announce"])
+
+        return dict(
+            created=meta.get("creation date", 0),
+            piece_length=info.get("piece length", 0),
+            announce=announce,
+            files=files,
+        )
+
     def as_dict(self):
         """Return known fields."""
         return self._fields.copy()
 
     def fetch(self, name, engine_name=None):
-        """Get a field on demand."""
-        # TODO: Get each on-demand field in a multicall for all other items, since
-        # we likely need it anyway; another (more easy) way would be to pre-fetch dynamically
-        # with the list of fields from filters and output formats
+        """Get a field on demand.
+
+        When the item is part of a L{ItemBatch}, the field is fetched for
+        all other items of the batch too, since we likely need it anyway.
+        """
         try:
             return self._fields[name]
         except KeyError:
             if isinstance(name, int):
                 name = "custom_%d" % name
 
+            if (
+                self._batch
+                and self._batch.fetch(name, engine_name)
+                and name in self._fields
+            ):
+                return self._fields[name]
+
             if name == "done":
                 val = float(self.fetch("completed_chunks")) / self.fetch("size_chunks")
             elif name == "files":
                 val = self._get_files()
+            elif name == "metainfo":
+                val = self._get_metainfo()
+            elif name == "trackers":
+                try:
+                    val = self._engine._rpc.t.multicall(
+                        self._fields["hash"], 0, *self.TRACKER_COMMANDS
+                    )
+                except xmlrpc.ERRORS as exc:
+                    raise error.EngineError(
+                        "While getting announce URLs for #%s: %s"
+                        % (self._fields["hash"], exc)
+                    )
             elif name.startswith("kind_") and name[5:].isdigit():
                 val = self._get_kind(int(name[5:], 10))
             elif name.startswith("custom_"):
@@ -259,14 +350,7 @@ class RtorrentItem(engine.TorrentProxy):
         """Get a list of all announce URLs.
         Returns `default` if no trackers are found at all.
         """
-        try:
-            response = self._engine._rpc.t.multicall(
-                self._fields["hash"], 0, "t.url=", "t.is_enabled="
-            )
-        except xmlrpc.ERRORS as exc:
-            raise error.EngineError(
-                "While getting announce URLs for #%s: %s" % (self._fields["hash"], exc)
-            )
+        response = self.fetch("trackers")
 
         if response:
             return [i[0] for i in response if i[1]]
@@ -490,7 +574,9 @@ class RtorrentItem(engine.TorrentProxy):
         # Assemble doomed files and directories
         files, dirs = set(), set()
         base_path = os.path.expanduser(self.directory)
-        item_files = list(self._get_files(attrs=attrs))
+        item_files = list(
+            self._get_files(attrs=attrs) if attrs else self.fetch("files")
+        )
 
         if not self.directory:
             raise error.EngineError(
@@ -522,6 +608,8 @@ class RtorrentItem(engine.TorrentProxy):
         # Delete selected files
         if not dry_run:
             self.stop()
+            if self._engine._call_queue is not None:
+                self._engine._call_queue.flush()  # really stop before deleting
         for path in sorted(files):
             ##self._engine.LOG.debug("Deleting file '%s'" % (path,))
             remove_with_links(path)
@@ -572,6 +660,216 @@ class RtorrentItem(engine.TorrentProxy):
         self._make_it_so("saving session data of", ["save_resume"])
 
 
+class ItemBatch(object):
+    """Download items of one result set, that get their on-demand fields together.
+
+    When a field is missing in one item, it is fetched for all items of
+    the batch still lacking it, using a single multicall.
+    """
+
+    # Minimal share of a view's items in a batch to get values via d.multicall
+    VIEW_SHARE = 0.25
+
+    # Number of items whose file or tracker lists are requested together
+    CHUNK_SIZE = 100
+
+    def __init__(self, engine_, viewname, items=None):
+        """Initialize batch of items, taken from the given view."""
+        self.engine = engine_
+        self.viewname = viewname
+        self.items = list(items or [])
+        self.requests = 0
+        self._view_size = None
+
+    def append(self, item):
+        """Add an item to the batch."""
+        item._batch = self
+        self.items.append(item)
+
+    def fetch(self, name, engine_name=None):
+        """Get field C{name} for all items lacking it, and return whether it was tried.
+
+        Items that went away meanwhile are skipped, getting the field from
+        them fails later on like for single items. An C{engine_name} is
+        used like in L{RtorrentItem.fetch}.
+        """
+        field = self.engine._rt_field(name)
+        missing = [i for i in self.items if name not in i._fields and i._batch is self]
+        if len(missing) < 2:
+            return False
+        if name == "files":
+            return self.fetch_sub(
+                missing,
+                name,
+                "f",
+                RtorrentItem.FILE_COMMANDS,
+                RtorrentItem._files_from_rows,
+            )
+        if name == "trackers":
+            return self.fetch_sub(missing, name, "t", RtorrentItem.TRACKER_COMMANDS)
+        if not field:
+            return False
+        if engine_name and not name.startswith("custom_"):
+            field = engine_name
+
+        command = self.engine._rt_command(field)
+        proxy = self.engine.open()
+        try:
+            if self._use_view(missing):
+                # Get the value for all items of the view, the smaller request
+                rows = proxy.d.multicall(
+                    self.viewname,
+                    "d.hash=",
+                    command if "=" in command else command + "=",
+                )
+                values = dict((infohash, val) for infohash, val in rows)
+            else:
+                calls = []
+                for item in missing:
+                    infohash = item._fields["hash"]
+                    calls.extend(self.engine._hash_calls(infohash, [command]))
+                values = dict(
+                    (item._fields["hash"], result[0])
+                    for item, result in zip(missing, proxy.system.multicall(calls))
+                    if not isinstance(result, dict)
+                )
+        except xmlrpc.ERRORS as exc:
+            raise error.EngineError(
+                "While getting field %r for %d items: %s" % (name, len(missing), exc)
+            )
+        self.requests += 1
+
+        for item in missing:
+            if item._fields["hash"] in values:
+                item._fields[name] = values[item._fields["hash"]]
+
+        self.engine.LOG.debug(
+            "Got field %r for %d of %d items in batch #%d"
+            % (name, len(missing), len(self.items), self.requests)
+        )
+        return True
+
+    def _use_view(self, missing):
+        """Check whether to get values for C{missing} items via their view.
+
+        The view's size is asked for once, since the items seen so far
+        can be just a part of it (when streamed or pre-filtered).
+        """
+        if not self.viewname:
+            return False
+        if self._view_size is None:
+            try:
+                self._view_size = self.engine.open().view.size(
+                    xmlrpc.NOHASH, self.viewname
+                )
+            except xmlrpc.ERRORS as exc:
+                self.engine.LOG.debug(
+                    "Cannot get size of view %r: %s" % (self.viewname, exc)
+                )
+                self._view_size = 0
+        return 0 < self._view_size <= len(missing) / self.VIEW_SHARE
+
+    def fetch_sub(self, missing, name, prefix, commands, convert=None):
+        """Get rows of a sub-multicall for the C{missing} items.
+
+        The rows are stored as field C{name}, optionally after passing
+        them to C{convert}. See L{RtorrentEngine.sub_multicall}.
+        Returns whether getting them was tried.
+        """
+        values = self.engine.sub_multicall(
+            prefix,
+            commands,
+            missing,
+            viewname=self.viewname if self._use_view(missing) else None,
+            chunk_size=self.CHUNK_SIZE,
+        )
+        self.requests += 1
+
+        for item in missing:
+            if item._fields["hash"] in values:
+                rows = values[item._fields["hash"]]
+                item._fields[name] = convert(rows) if convert else rows
+
+        self.engine.LOG.debug(
+            "Got %r for %d of %d items in batch, %d requests so far"
+            % (name, len(missing), len(self.items), self.requests)
+        )
+        return True
+
+
+class CallQueue(object):
+    """Item commands that are sent in chunked C{system.multicall} requests.
+
+    Use it as a context manager, L{RtorrentItem} commands are queued while
+    it is active. Failed calls are logged together with their item, and
+    reported as an L{error.EngineError} at the end. Note that later calls
+    for an item are still made when an earlier one failed.
+    """
+
+    def __init__(self, engine_, size=None):
+        """Initialize queue sending C{size} calls per request (0 disables queueing)."""
+        self.engine = engine_
+        self.size = int(config.action_batch_size if size is None else size)
+        self.calls = []
+        self.failed = []
+        self.requests = 0
+
+    def __enter__(self):
+        if self.size > 0:
+            self.engine._call_queue = self
+        return self
+
+    def __exit__(self, exc_type, *_):
+        # Send what's queued even on errors, those commands were confirmed
+        self.engine._call_queue = None
+        self.flush()
+        if self.failed and exc_type is None:
+            items = set(item._fields["hash"] for item, _, _ in self.failed)
+            raise error.EngineError(
+                "%d command(s) failed, for %d item(s)" % (len(self.failed), len(items))
+            )
+
+    def add(self, item, command, method, args, observer=None):
+        """Queue a call of C{method}, for C{command} on C{item}."""
+        self.engine.LOG.debug(
+            "%s%s torrent #%s (%s, queued)"
+            % (command[0].upper(), command[1:], item._fields["hash"], method)
+        )
+        call = dict(methodName=method, params=list(args))
+        self.calls.append((item, command, call, observer))
+        if len(self.calls) >= self.size:
+            self.flush()
+
+    def flush(self):
+        """Send all queued calls."""
+        calls, self.calls = self.calls, []
+        if not calls:
+            return
+
+        try:
+            results = self.engine.open().system.multicall([i[2] for i in calls])
+        except xmlrpc.ERRORS as exc:
+            raise error.EngineError(
+                "While sending %d queued command(s): %s" % (len(calls), exc)
+            )
+        self.requests += 1
+
+        for (item, command, _, observer), result in zip(calls, results):
+            if isinstance(result, dict):
+                self.failed.append((item, command, result))
+                self.engine.LOG.error(
+                    "While %s torrent #%s (%s): %s"
+                    % (
+                        command,
+                        item._fields["hash"],
+                        item._fields.get("name", "?"),
+                        result.get("faultString", result),
+                    )
+                )
+            elif observer:
+                observer(result[0])
+
+
 class RtorrentEngine(engine.TorrentEngine):
     """The rTorrent backend proxy."""
 
@@ -623,6 +921,9 @@ class RtorrentEngine(engine.TorrentEngine):
         )
     )
 
+    # Max. seconds since a view's query to repeat it server-side in L{show}
+    SHOW_QUERY_AGE = 2.0
+
     # mapping of our names to rTorrent names (only those that differ)
     PYRO2RT_MAPPING = dict(
         is_complete="complete",
@@ -643,6 +944,9 @@ class RtorrentEngine(engine.TorrentEngine):
     # inverse mapping of rTorrent names to ours
     RT2PYRO_MAPPING = dict((v, k) for k, v in PYRO2RT_MAPPING.items())
 
+    # our names of fields that never change
+    CONSTANT_NAMES = set(map(RT2PYRO_MAPPING.get, CONSTANT_FIELDS, CONSTANT_FIELDS))
+
     def __init__(self):
         """Initialize proxy."""
         super(RtorrentEngine, self).__init__()
@@ -650,9 +954,15 @@ class RtorrentEngine(engine.TorrentEngine):
         self.version_info = (0,)
         self.startup = time.time()
         self._rpc = None
+        self._async_rpc = None
         self._session_dir = None
         self._download_dir = None
         self._item_cache = {}
+        self._hash_cache = {}
+        self._call_queue = None
+        self._metacache = None
+        self._metacache_keys = {}
+        self._view_hashes = {}
         self.known_throttle_names = {"", "NULL"}
 
     def load_config(self, namespace=None, rcfile=None):
@@ -808,108 +1118,521 @@ class RtorrentEngine(engine.TorrentEngine):
         """Fetch a single item by its info hash."""
         return next(self.items(infohash, prefetch, cache))
 
-    def items(self, view=None, prefetch=None, cache=True):
-        """Get list of download items.
-
-        @param view: Name of the view.
-        @param prefetch: OPtional list of field names to fetch initially.
-        @param cache: Cache items for the given view?
-        """
-        # TODO: Cache should be by hash.
-        # Then get the initial data when cache is empty,
-        # else get a list of hashes from the view, make a diff
-        # to what's in the cache, fetch the rest. Getting the
-        # fields for one hash might be done by a special view
-        # (filter: $d.hash == hashvalue)
-
+    def _items_view(self, view):
+        """Return a L{engine.TorrentView} for the given view name or object."""
         if view is None:
             view = engine.TorrentView(self, "default")
         elif isinstance(view, str):
             view = engine.TorrentView(self, self._resolve_viewname(view))
         else:
             view.viewname = self._resolve_viewname(view.viewname)
+        return view
 
-        if not cache or view.viewname not in self._item_cache:
-            # Map pyroscope names to rTorrent ones
-            if prefetch:
-                prefetch = self.CORE_FIELDS | set(
-                    (self.PYRO2RT_MAPPING.get(i, i) for i in prefetch)
+    def _hash_calls(self, infohash, commands):
+        """Return C{system.multicall} calls for the given C{d.multicall} commands on one item."""
+        calls = []
+        for command in commands:
+            if ".multicall=" in command:
+                # Nested sub-multicall, the commands follow an empty pattern
+                method, args = command.split("=", 1)
+                params = [infohash, 0] + args.split(",")[1:]
+            else:
+                method, _, args = command.rstrip("=").partition("=")
+                params = [infohash] + (args.split(",") if args else [])
+            calls.append(dict(methodName=method, params=params))
+        return calls
+
+    def _rt_field(self, name):
+        """Return the rTorrent name of item field C{name} (a pyroscope name).
+
+        Names starting with C{=} are commands without a C{get_} prefix,
+        nested sub-multicalls are returned as-is; C{None} is returned for
+        fields that can't be multi-called.
+        """
+        if name == "trackers":
+            return "t.multicall=," + ",".join(RtorrentItem.TRACKER_COMMANDS)
+        if name in ("files", "metainfo", "done") or (
+            name.startswith("kind_") and name[5:].isdigit()
+        ):
+            return None
+        if name.startswith("custom_") and name not in self.PYRO2RT_MAPPING:
+            key = name[7:]
+            if len(key) == 1 and key in "12345":
+                return "custom" + key
+            return "custom=" + key
+
+        field = engine.FieldDefinition.FIELDS.get(name)
+        return (field and field._engine_name) or self.PYRO2RT_MAPPING.get(name, name)
+
+    def _rt_command(self, field):
+        """Return the C{d.*} command getting an rTorrent field (see L{_rt_field})."""
+        if ".multicall=" in field:
+            return field
+        return "d.%s%s" % (
+            "" if field.startswith(("is_", "=")) else "get_",
+            field.lstrip("="),
+        )
+
+    def _items_query(self, view, prefetch):
+        """Return the fields to get for the items in a view, and the multicall doing that.
+
+        The fields are returned as pyroscope names, the multicall as a method
+        name and its arguments, with the field commands always being the
+        trailing arguments.
+
+        Given C{prefetch} names get resolved to the values they're computed
+        from (see L{engine.FieldDefinition.requirements}).
+        """
+        fields = dict((self.RT2PYRO_MAPPING.get(i, i), i) for i in self.CORE_FIELDS)
+        if prefetch:
+            for name in engine.FieldDefinition.requirements(prefetch):
+                field = self._rt_field(name)
+                if field:
+                    fields[name] = field
+        else:
+            fields.update(
+                (self.RT2PYRO_MAPPING.get(i, i), i) for i in self.PREFETCH_FIELDS
+            )
+        names = list(fields)
+
+        # Prepare multi-call arguments
+        args = [self._rt_command(fields[i]) for i in names]
+
+        infohash = view._check_hash_view()
+        if infohash:
+            method = "system.multicall"
+            args = [self._hash_calls(infohash, args)]
+        else:
+            method = "d.multicall"
+            args = [view.viewname] + [
+                field if "=" in field else field + "=" for field in args
+            ]
+            if view.matcher and int(config.fast_query):
+                pre_filter = matching.unquote_pre_filter(view.matcher.pre_filter())
+                self.LOG.info("!!! pre-filter: {}".format(pre_filter or "N/A"))
+                if pre_filter:
+                    method = "d.multicall.filtered"
+                    args.insert(1, pre_filter)
+
+        return names, method, args
+
+    # Rough size of a multicall response row, and each value in it
+    EXPLAIN_ROW_BYTES = 50
+    EXPLAIN_VALUE_BYTES = 60
+
+    def explain(self, view, prefetch=None):
+        """Return how the items of a view get queried, as a bunch.
+
+        It has the XMLRPC method and pre-filter of the query, the commands
+        it calls per item, the fields fetched separately (for all items
+        at once where possible), and estimates of the number of items,
+        requests, and bytes received.
+        """
+        view = self._items_view(view)
+        names, method, args = self._items_query(view, prefetch)
+        commands = args[len(args) - len(names) :]
+        leading = args[: len(args) - len(names)]
+        separate = self.separate_fields(prefetch)
+        rows = view.size()
+        return Bunch(
+            method=method,
+            viewname=view.viewname,
+            pre_filter=leading[1] if method == "d.multicall.filtered" else "",
+            commands=commands,
+            separate=separate,
+            rows=rows,
+            requests=1 + self._separate_requests(view, names, separate, rows),
+            inbound=rows
+            * (self.EXPLAIN_ROW_BYTES + len(names) * self.EXPLAIN_VALUE_BYTES),
+        )
+
+    def _separate_requests(self, view, names, separate, rows):
+        """Estimate the requests getting the C{separate} fields of C{rows} items.
+
+        For a batch of items, the view's size is asked for once (see
+        L{ItemBatch}). File lists then need a sub-multicall over the whole
+        view, or chunked ones when few items are left after filtering,
+        whatever is more. Metafile data is read locally, but needs the
+        session file names if they weren't fetched already (as part of
+        C{names}).
+        """
+        batched = not view._check_hash_view() and rows > 1
+        requests = 1 if batched and separate else 0
+        for name in separate:
+            if name == "files" and batched:
+                requests += max(
+                    1,
+                    int(math.ceil(rows * ItemBatch.VIEW_SHARE / ItemBatch.CHUNK_SIZE)),
+                )
+            elif name != "metainfo" or "session_file" not in names:
+                requests += 1
+        return requests
+
+    def separate_fields(self, prefetch):
+        """Return the names of the given fields not fetched with the item list."""
+        return sorted(
+            name
+            for name in engine.FieldDefinition.requirements(prefetch or ())
+            if self._rt_field(name) is None
+        )
+
+    def _is_constant(self, name):
+        """Check whether the item field C{name} (a pyroscope name) never changes."""
+        return (
+            name in self.CONSTANT_NAMES
+            or name.startswith(("custom_m_", "const_"))  # memoized values
+            or isinstance(engine.FieldDefinition.FIELDS.get(name), engine.ConstantField)
+        )
+
+    def _cache_items(self, viewname, items, method="d.multicall"):
+        """Remember the items seen in a view, forgetting those not in any view anymore.
+
+        @param method: The XMLRPC method that got the items, only a
+            C{d.multicall} returns all items of the view. Pre-filtered
+            results are just added, since the items not matching are
+            likely still there.
+        """
+        hashes = set(item._fields["hash"] for item in items)
+        if method == "d.multicall":
+            gone = self._view_hashes.get(viewname, set()) - hashes
+            self._view_hashes[viewname] = hashes
+            for infohash in gone:
+                if not any(infohash in i for i in self._view_hashes.values()):
+                    self._hash_cache.pop(infohash, None)
+        else:
+            self._view_hashes.setdefault(viewname, set()).update(hashes)
+        self._hash_cache.update((item._fields["hash"], item) for item in items)
+
+        if self.metacache:
+            if method == "d.multicall" and viewname in ("default", "main"):
+                # These have all items, unless pre-filtered
+                self.metacache.sync(hashes)
+            self._store_metacache(items)
+
+    @property
+    def metacache(self):
+        """The L{metacache.MetafileCache}, or C{None} if it's not enabled."""
+        if self._metacache is None:
+            self._metacache = False
+            path = os.path.expanduser(config.metafile_cache or "")
+            if path and os.path.isdir(os.path.dirname(path)):
+                self._metacache = metacache.MetafileCache(path)
+                atexit.register(
+                    lambda: self._store_metacache(self._hash_cache.values())
+                )
+        return self._metacache
+
+    def _is_cacheable(self, name):
+        """Check whether the item field C{name} belongs into the metafile cache.
+
+        The C{files} field is deliberately left out: besides paths and
+        sizes, its entries hold each file's priority, open state, and
+        modification time, which change while the item is loaded. The
+        constant part of the file list is cached as part of C{metainfo}.
+        """
+        return name in ("custom_kind", "metainfo") or self._is_constant(name)
+
+    def _store_metacache(self, items):
+        """Add new constant values of the given items to the metafile cache."""
+        updates = {}
+        for item in items:
+            infohash = item._fields["hash"]
+            stored = self._metacache_keys.setdefault(infohash, set())
+            values = dict(
+                (key, val)
+                for key, val in item._fields.items()
+                if key not in stored and self._is_cacheable(key)
+            )
+            if values:
+                updates[infohash] = values
+                stored.update(values)
+        self.metacache.update(updates)
+
+    def _refresh_items(self, names, method, args):
+        """Return the items of a view, getting only dynamic fields of already known ones."""
+        commands = args[len(args) - len(names) :]
+        dynamic = [
+            idx
+            for idx, name in enumerate(names)
+            if name == "hash" or not self._is_constant(name)
+        ]
+        constant = [idx for idx in range(len(names)) if idx not in dynamic]
+        constant_names = [names[i] for i in constant]
+        index = engine.FieldRecord.make_index([names[i] for i in dynamic])
+        index.update(engine.FieldRecord.make_index(constant_names))
+        for name in constant_names:
+            index[name] += len(dynamic)
+        hash_idx = index["hash"]
+
+        # Get dynamic values, and the hash list
+        proxy = self.open()
+        rows = getattr(proxy, method)(
+            *(args[: len(args) - len(names)] + [commands[i] for i in dynamic])
+        )
+
+        # Fetch constant values of new items, from the metafile cache or rTorrent
+        new = [
+            row[hash_idx]
+            for row in rows
+            if row[hash_idx] not in self._hash_cache
+            or any(
+                name not in self._hash_cache[row[hash_idx]]._fields
+                for name in constant_names
+            )
+        ]
+        cached = self.metacache.get(new) if self.metacache and new else {}
+        missing = [
+            infohash
+            for infohash in new
+            if any(names[i] not in cached.get(infohash, ()) for i in constant)
+        ]
+        calls = []
+        for infohash in missing:
+            calls.extend(self._hash_calls(infohash, [commands[i] for i in constant]))
+        results = iter(proxy.system.multicall(calls) if calls else [])
+        constants = dict((i, cached[i]) for i in new if i in cached)
+        for infohash in missing:
+            values = [next(results) for _ in constant]
+            if any(isinstance(i, dict) for i in values):  # removed meanwhile
+                constants.pop(infohash, None)
+            else:
+                constants.setdefault(infohash, {}).update(
+                    zip([names[i] for i in constant], (i[0] for i in values))
+                )
+
+        items = []
+        for row in rows:
+            infohash = row[hash_idx]
+            item = None
+            if infohash in constants:
+                known = constants[infohash]
+            elif infohash not in new:
+                item = self._hash_cache[infohash]
+                known = dict(
+                    (key, val)
+                    for key, val in item._fields.items()
+                    if self._is_constant(key)
                 )
             else:
-                prefetch = self.PREFETCH_FIELDS
+                continue
+
+            fields = engine.FieldRecord(index, row + [known[i] for i in constant_names])
+            fields.update((key, val) for key, val in known.items() if key not in index)
+            if item is None:
+                item = RtorrentItem(self, fields)
+            else:
+                item._fields = fields
+            items.append(item)
+
+        self.LOG.debug(
+            "Got %d items with %d dynamic attributes, %d new ones (%d cached) from %r"
+            % (
+                len(items),
+                len(dynamic) - 1,
+                len(constants),
+                len(constants) - len(missing),
+                self.engine_id,
+            )
+        )
+        return items
+
+    def items(self, view=None, prefetch=None, cache=True):
+        """Get list of download items.
+
+        Items are cached by their hash. When fetched again, only new items
+        are loaded completely, for known ones just the dynamic fields
+        are refreshed. The items form an L{ItemBatch}, i.e. on-demand
+        fields are fetched for all of them at once.
 
+        Note that known items are returned as the same objects, with
+        their fields replaced by the refreshed ones. So item objects
+        kept from an earlier call change too, and lose the on-demand
+        values they already fetched (only constant fields are kept).
+
+        @param view: Name of the view.
+        @param prefetch: Optional list of field names to fetch initially.
+        @param cache: Cache items for the given view?
+        """
+        view = self._items_view(view)
+        if not cache or view.viewname not in self._item_cache:
             # Fetch items
-            items = []
+            names, method, args = self._items_query(view, prefetch)
+            if method != "system.multicall":
+                view._query = (method, args[: len(args) - len(names)])
+            batch = ItemBatch(self, view.viewname)
+            items = batch.items
             try:
-                # Prepare multi-call arguments
-                args = [
-                    "d.%s%s" % ("" if field.startswith("is_") else "get_", field)
-                    for field in prefetch
-                ]
-
-                infohash = view._check_hash_view()
-                if infohash:
-                    multi_call = self.open().system.multicall
-                    args = [
-                        dict(
-                            methodName=field.rsplit("=", 1)[0],
-                            params=[infohash]
-                            + (
-                                field.rsplit("=", 1)[1].split(",")
-                                if "=" in field
-                                else []
-                            ),
-                        )
-                        for field in args
-                    ]
-                    raw_items = [[i[0] for i in multi_call(args)]]
+                if method != "system.multicall" and (
+                    self._hash_cache or (self.metacache and self.metacache.count())
+                ):
+                    for item in self._refresh_items(names, method, args):
+                        batch.append(item)
+                        yield item
                 else:
-                    multi_call = self.open().d.multicall
-                    args = [view.viewname] + [
-                        field if "=" in field else field + "=" for field in args
-                    ]
-                    if view.matcher and int(config.fast_query):
-                        pre_filter = matching.unquote_pre_filter(
-                            view.matcher.pre_filter()
-                        )
-                        self.LOG.info("!!! pre-filter: {}".format(pre_filter or "N/A"))
-                        if pre_filter:
-                            multi_call = self.open().d.multicall.filtered
-                            args.insert(1, pre_filter)
-                    raw_items = multi_call(*tuple(args))
-
-                ##self.LOG.debug("multicall %r" % (args,))
-                ##import pprint; self.LOG.debug(pprint.pformat(raw_items))
-                self.LOG.debug(
-                    "Got %d items with %d attributes from %r [%s]"
-                    % (len(raw_items), len(prefetch), self.engine_id, multi_call)
+                    multi_call = getattr(self.open(), method)
+                    if method == "system.multicall":
+                        raw_items = [[i[0] for i in multi_call(*args)]]
+                    else:
+                        # Build items while the response is still coming in
+                        raw_items = multi_call(*tuple(args), stream=True)
+
+                    ##self.LOG.debug("multicall %r" % (args,))
+                    index = engine.FieldRecord.make_index(names)
+                    for row in raw_items:
+                        fields = engine.FieldRecord(index, row)
+                        batch.append(RtorrentItem(self, fields))
+                        yield items[-1]
+
+                    self.LOG.debug(
+                        "Got %d items with %d attributes from %r [%s]"
+                        % (len(items), len(names), self.engine_id, multi_call)
+                    )
+            except xmlrpc.ERRORS as exc:
+                raise error.EngineError(
+                    "While getting download items from %r: %s" % (self, exc)
                 )
 
-                for item in raw_items:
-                    items.append(
-                        RtorrentItem(
-                            self,
-                            zip(
-                                [self.RT2PYRO_MAPPING.get(i, i) for i in prefetch], item
-                            ),
+            # Everything yielded, store for next iteration
+            if method != "system.multicall":
+                view._query_time = time.time()
+                self._cache_items(view.viewname, items, method)
+            if cache:
+                self._item_cache[view.viewname] = items
+        else:
+            # Yield prefetched results
+            for item in self._item_cache[view.viewname]:
+                yield item
+
+    def sub_multicall(self, prefix, commands, items, viewname=None, chunk_size=100):
+        """Get rows of a C{f.}, C{p.} or C{t.multicall} for many items at once.
+
+        With a C{viewname}, a single C{d.multicall} over that view with a
+        nested C{‹prefix›.multicall=} command is used, which is fastest
+        when most items of the view are needed. Otherwise, the C{items}
+        get their sub-multicalls in C{system.multicall} requests for
+        C{chunk_size} items each. Items that went away meanwhile are
+        missing in the result.
+
+        @param prefix: The kind of sub-object (C{f}, C{p}, or C{t}).
+        @param commands: The sub-object commands (like C{t.url=}).
+        @param items: The L{RtorrentItem}s to get the rows for.
+        @return: A dict mapping info hashes to row lists.
+        """
+        method = prefix + ".multicall"
+        commands = list(commands)
+        proxy = self.open()
+        result = {}
+        try:
+            if viewname:
+                rows = proxy.d.multicall(
+                    viewname, "d.hash=", method + "=," + ",".join(commands)
+                )
+                hashes = set(item._fields["hash"] for item in items)
+                result.update(i for i in rows if i[0] in hashes)
+            else:
+                for idx in range(0, len(items), chunk_size):
+                    chunk = items[idx : idx + chunk_size]
+                    calls = [
+                        dict(
+                            methodName=method,
+                            params=[i._fields["hash"], 0] + commands,
                         )
+                        for i in chunk
+                    ]
+                    result.update(
+                        (item._fields["hash"], rows[0])
+                        for item, rows in zip(chunk, proxy.system.multicall(calls))
+                        if not isinstance(rows, dict)
                     )
+        except xmlrpc.ERRORS as exc:
+            raise error.EngineError(
+                "While getting %s for %d items: %s" % (method, len(items), exc)
+            )
+        return result
+
+    def queued_calls(self, size=None):
+        """Return a L{CallQueue}; while it is active, item commands get batched."""
+        return CallQueue(self, size)
+
+    def batch(self, items, viewname=None):
+        """Make the given items an L{ItemBatch}, and return it."""
+        batch = ItemBatch(self, viewname)
+        for item in items:
+            batch.append(item)
+        return batch
+
+    def release(self, item):
+        """Remove an item from its L{ItemBatch}, so fields are fetched just for it."""
+        item._batch = None
+
+    async def open_async(self):
+        """Open a connection for use with asyncio, and return its proxy."""
+        # Only connect once
+        if self._async_rpc is not None:
+            return self._async_rpc
+
+        self.load_config()
+        if not config.scgi_url:
+            raise error.UserError(
+                "You need to configure a XMLRPC connection, read"
+                " https://pyrosimple.readthedocs.io/en/latest/setup.html"
+            )
+
+        rpc = xmlrpc.AsyncRTorrentProxy(config.scgi_url)
+        self.versions, self.version_info = await rpc._set_mappings()
+        self.engine_id = await rpc.session.name()
+        self.engine_software = "rTorrent %s/%s" % self.versions
+        self._async_rpc = rpc
+
+        self.LOG.debug(repr(rpc))
+        return rpc
+
+    async def items_async(self, view=None, prefetch=None, cache=True):
+        """Get list of download items, like L{items} but for use with asyncio.
+
+        Fields not prefetched are still fetched on demand via the blocking
+        connection, so call L{open} too if the items need those.
+        """
+        view = self._items_view(view)
+        if not cache or view.viewname not in self._item_cache:
+            names, method, args = self._items_query(view, prefetch)
+            items = []
+            try:
+                multi_call = getattr(await self.open_async(), method)
+                if method == "system.multicall":
+                    item = [i[0] for i in await multi_call(*args)]
+                    items.append(RtorrentItem(self, zip(names, item)))
                     yield items[-1]
+                else:
+                    async for item in multi_call(*tuple(args), stream=True):
+                        items.append(RtorrentItem(self, zip(names, item)))
+                        yield items[-1]
             except xmlrpc.ERRORS as exc:
                 raise error.EngineError(
                     "While getting download items from %r: %s" % (self, exc)
                 )
 
-            # Everything yielded, store for next iteration
             if cache:
                 self._item_cache[view.viewname] = items
         else:
-            # Yield prefetched results
             for item in self._item_cache[view.viewname]:
                 yield item
 
-    def show(self, items, view=None, append=False, disjoin=False):
-        """Visualize a set of items (search result), and return the view name."""
+    def show(self, items, view=None, append=False, disjoin=False, source=None):
+        """Visualize a set of items (search result), and return the view name.
+
+        The item commands are sent in batches. When C{source} is the
+        L{engine.TorrentView} the items came from, and they're all the
+        items its query returned, the view gets changed server-side by
+        repeating that query with the commands instead.
+
+        That repeated query also changes items that entered the source
+        view after it was fetched, or changed to match it meanwhile. So it
+        is only done when the query's results came in no more than
+        L{SHOW_QUERY_AGE} seconds ago, which narrows that window but
+        can't close it; callers needing an exact item set must not pass
+        C{source}.
+        """
         proxy = self.open()
         view = self._resolve_viewname(view or "rtcontrol")
 
@@ -929,14 +1652,35 @@ class RtorrentEngine(engine.TorrentEngine):
         proxy.ui.current_view.set(view)
 
         # Add items
-        # TODO: should be a "system.multicall"
-        for item in items:
-            if disjoin:
-                proxy.d.views.remove(item.hash, view)
-                proxy.view.set_not_visible(item.hash, view)
-            else:
-                proxy.d.views.push_back_unique(item.hash, view)
-                proxy.view.set_visible(item.hash, view)
+        if disjoin:
+            commands = ["d.views.remove", "view.set_not_visible"]
+        else:
+            commands = ["d.views.push_back_unique", "view.set_visible"]
+
+        query = source and source._query
+        if (
+            query
+            and source._items is not None
+            and time.time() - source._query_time <= self.SHOW_QUERY_AGE
+            and len(items) == len(source._items)
+        ):
+            if set(i.hash for i in items) == set(i.hash for i in source._items):
+                method, args = query
+                self.LOG.debug(
+                    "Changing view %r server-side via %s%r" % (view, method, args)
+                )
+                try:
+                    getattr(proxy, method)(*(args + [i + "=" + view for i in commands]))
+                except xmlrpc.ERRORS as exc:
+                    raise error.EngineError(
+                        "While changing view %r: %s" % (view, exc)
+                    )
+                return view
+
+        with self.queued_calls() as queue:
+            for item in items:
+                for command in commands:
+                    queue.add(item, "changing view of", command, (item.hash, view))
 
         return view
 
@@ -18,6 +18,7 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 import re
+import math
 import time
 import shlex
 import fnmatch
@@ -50,6 +51,14 @@ FALSE = set(
 )
 
 
+# Estimated relative costs of evaluating a filter on one item
+COST_PREFETCHED = 1  # value was fetched with the item list
+COST_TEMPLATE = 10  # a template is rendered
+COST_ONDEMAND = 100  # value is fetched via XMLRPC
+COST_FILESYSTEM = 200  # local filesystem is accessed
+COST_FILES = 500  # file list is fetched via XMLRPC
+
+
 def truth(val, context):
     """Convert truth value in "val" to a boolean."""
     try:
@@ -89,6 +98,11 @@ def unquote_pre_filter(pre_filter, _regex=re.compile(r"[\\]+")):
     return pre_filter
 
 
+def quote_pre_filter(pre_filter):
+    """Quote a pre-filter condition, so it can be nested in another one."""
+    return '"%s"' % pre_filter.replace("\\", "\\\\").replace('"', '\\"')
+
+
 class FilterError(error.UserError):
     """(Syntax) error in filter."""
 
@@ -100,10 +114,66 @@ class Filter(object):
         """Return rTorrent condition to speed up data transfer."""
         return ""
 
+    def pre_filter_exact(self):  # pylint: disable=no-self-use
+        """Return whether L{pre_filter} selects exactly the matching items.
+
+        Usually, the pre-filter selects a superset of them, which is
+        fine since items get filtered again client-side. Only exact
+        conditions can be negated though.
+        """
+        return False
+
     def match(self, item):
         """Return True if filter matches item."""
         raise NotImplementedError()
 
+    def field_names(self):  # pylint: disable=no-self-use
+        """Return the set of item fields this filter looks at."""
+        return set()
+
+    def first_fields(self):  # pylint: disable=no-self-use
+        """Return the set of item fields always looked at, i.e. before any short-cut."""
+        return set()
+
+    def cost(self, field_cost):  # pylint: disable=no-self-use,unused-argument
+        """Return the estimated cost of evaluating this filter.
+
+        @param field_cost: Callable returning the cost of getting a field's value.
+        """
+        return COST_PREFETCHED
+
+    def reorder(self, field_cost):
+        """Reorder nested terms so cheaper ones are evaluated first, and return C{self}.
+
+        @param field_cost: Callable returning the cost of getting a field's value.
+        """
+        return self
+
+    def compile(self):
+        """Return a L{CompiledFilter} doing the same as this filter, but faster."""
+        return CompiledFilter(self)
+
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}.
+
+        The default just calls L{match}, filters with a simple enough
+        logic generate inline code instead.
+        """
+        return "%s(item)" % compiler.const(self.match)
+
+    def mask(self, columns, where=None):
+        """Return a boolean array of the matching items in C{columns}.
+
+        @param columns: L{ColumnarItems<pyrosimple.torrent.columns.ColumnarItems>}
+            holding the items.
+        @param where: Optional boolean array; only the items it selects
+            are evaluated, all others do not match.
+
+        The default calls L{match} item by item, filters on numbers
+        work on whole columns instead.
+        """
+        return columns.apply(self.match, where)
+
     def __call__(self, item):
         return self.match(item)
 
@@ -111,6 +181,32 @@ class Filter(object):
 class CompoundFilterBase(Filter, list):
     """List of filters."""
 
+    def field_names(self):
+        """Return the set of item fields this filter looks at."""
+        return set().union(*(i.field_names() for i in self))
+
+    def first_fields(self):
+        """Return the set of item fields always looked at, i.e. before any short-cut."""
+        return self[0].first_fields() if self else set()
+
+    def cost(self, field_cost):
+        """Return the estimated cost of evaluating this filter (the worst case)."""
+        return sum(i.cost(field_cost) for i in self)
+
+    def reorder(self, field_cost):
+        """Reorder nested terms so cheaper ones are evaluated first, and return C{self}.
+
+        The result of AND and OR does not depend on the order of terms,
+        but which terms get evaluated does. So getting some values can
+        have side effects that change with the order, e.g. an item's
+        C{alias} is memoized in the client via C{custom.set} when it is
+        first computed. Terms of equal cost keep their given order.
+        """
+        for term in self:
+            term.reorder(field_cost)
+        self.sort(key=lambda term: term.cost(field_cost))
+        return self
+
 
 class CompoundFilterAll(CompoundFilterBase):
     """List of filters that must all match (AND)."""
@@ -118,27 +214,56 @@ class CompoundFilterAll(CompoundFilterBase):
     def __str__(self):
         return u" ".join(str(i) for i in self)
 
+    def _pre_filter_terms(self):
+        """Return the pre-filter conditions of the terms used in L{pre_filter}."""
+        if int(config.fast_query) == 1:
+            # using just one simple expression is safer
+            result = [
+                x.pre_filter() for x in self if not isinstance(x, CompoundFilterBase)
+            ]
+            return [x for x in result if x][:1]
+        return [x for x in (x.pre_filter() for x in self) if x]
+
     def pre_filter(self):
         """Return rTorrent condition to speed up data transfer."""
         if len(self) == 1:
             return self[0].pre_filter()
-        else:
-            result = [
-                x.pre_filter() for x in self if not isinstance(x, CompoundFilterBase)
-            ]
-            result = [x for x in result if x]
-            if result:
-                if int(config.fast_query) == 1:
-                    return result[0]  # using just one simple expression is safer
-                else:
-                    # TODO: make this purely value-based (is.nz=…)
-                    return "and={%s}" % ",".join(result)
-        return ""
+        result = self._pre_filter_terms()
+        if len(result) > 1:
+            # TODO: make this purely value-based (is.nz=…)
+            return quote_pre_filter("and={%s}" % ",".join(result))
+        return result[0] if result else ""
+
+    def pre_filter_exact(self):
+        """Return whether L{pre_filter} selects exactly the matching items."""
+        if len(self) == 1:
+            return self[0].pre_filter_exact()
+        return all(x.pre_filter_exact() for x in self) and len(
+            self._pre_filter_terms()
+        ) == len(self)
 
     def match(self, item):
         """Return True if filter matches item."""
         return all(i.match(item) for i in self)
 
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        if not self:
+            return "True"
+        return "(%s)" % " and ".join(i._compile(compiler) for i in self)
+
+    def mask(self, columns, where=None):
+        """Return a boolean array of the matching items in C{columns}.
+
+        Each term only looks at the items all former terms matched.
+        """
+        result = columns.all(where)
+        for term in self:
+            if not result.any():
+                break
+            result = term.mask(columns, result)
+        return result
+
 
 class CompoundFilterAny(CompoundFilterBase):
     """List of filters where at least one must match (OR)."""
@@ -153,16 +278,46 @@ class CompoundFilterAny(CompoundFilterBase):
             return "[ %s ]" % " OR ".join(str(i) for i in self)
 
     def pre_filter(self):
-        """Return rTorrent condition to speed up data transfer."""
+        """Return rTorrent condition to speed up data transfer.
+
+        Any term without a condition could match all items, so then
+        there's no condition for the whole group either.
+        """
         if len(self) == 1:
             return self[0].pre_filter()
-        # TODO: Find a safe way to do 'or' expressions
-        return ""
+        result = [x.pre_filter() for x in self]
+        if not all(result):
+            return ""
+        return quote_pre_filter("or={%s}" % ",".join(result))
+
+    def pre_filter_exact(self):
+        """Return whether L{pre_filter} selects exactly the matching items."""
+        return all(x.pre_filter_exact() for x in self)
 
     def match(self, item):
         """Return True if filter matches item."""
         return any(i.match(item) for i in self)
 
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        if not self:
+            return "False"
+        return "(%s)" % " or ".join(i._compile(compiler) for i in self)
+
+    def mask(self, columns, where=None):
+        """Return a boolean array of the matching items in C{columns}.
+
+        Each term only looks at the items no former term matched.
+        """
+        candidates = columns.all(where)
+        result = candidates & False
+        for term in self:
+            remaining = candidates & ~result
+            if not remaining.any():
+                break
+            result |= term.mask(columns, remaining)
+        return result
+
 
 class NegateFilter(Filter):
     """Negate result of another filter (NOT)."""
@@ -179,23 +334,58 @@ class NegateFilter(Filter):
             return u"[ NOT %s ]" % str(self._inner)
 
     def pre_filter(self):
-        """Return rTorrent condition to speed up data transfer."""
+        """Return rTorrent condition to speed up data transfer.
+
+        Negating a condition that selects a superset of the items would
+        lose some, so only exact ones are negated.
+        """
+        if isinstance(self._inner, NegateFilter):
+            return self._inner._inner.pre_filter()  # double negation
         inner = self._inner.pre_filter()
-        if inner:
-            if inner.startswith('"not=$') and inner.endswith('"') and "\\" not in inner:
-                return inner[6:-1]  # double negation, return inner command
-            elif inner.startswith('"'):
-                inner = '"$' + inner[1:]
-            else:
-                inner = "$" + inner
-            return "not=" + inner
-        else:
+        if not inner or not self._inner.pre_filter_exact():
             return ""
+        if inner.startswith('"'):
+            inner = '"$' + inner[1:]
+        else:
+            inner = "$" + inner
+        return quote_pre_filter("not=" + inner)
+
+    def pre_filter_exact(self):
+        """Return whether L{pre_filter} selects exactly the matching items."""
+        if isinstance(self._inner, NegateFilter):
+            return self._inner._inner.pre_filter_exact()
+        return bool(self.pre_filter())
 
     def match(self, item):
         """Return True if filter matches item."""
         return not self._inner.match(item)
 
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        return "(not %s)" % self._inner._compile(compiler)
+
+    def mask(self, columns, where=None):
+        """Return a boolean array of the matching items in C{columns}."""
+        where = columns.all(where)
+        return where & ~self._inner.mask(columns, where)
+
+    def field_names(self):
+        """Return the set of item fields this filter looks at."""
+        return self._inner.field_names()
+
+    def first_fields(self):
+        """Return the set of item fields always looked at, i.e. before any short-cut."""
+        return self._inner.first_fields()
+
+    def cost(self, field_cost):
+        """Return the estimated cost of evaluating this filter."""
+        return self._inner.cost(field_cost)
+
+    def reorder(self, field_cost):
+        """Reorder nested terms by their cost, and return C{self}."""
+        self._inner.reorder(field_cost)
+        return self
+
 
 class FieldFilter(Filter):
     """Base class for all field filters."""
@@ -217,7 +407,7 @@ class FieldFilter(Filter):
         is_open="d.is_open=",
         # done="=",
         down="d.down.rate=",
-        # fno="=",
+        fno="d.size_files=",
         prio="d.priority=",
         ratio="d.ratio=",
         size="d.size_bytes=",
@@ -258,6 +448,18 @@ class FieldFilter(Filter):
     def validate(self):
         """Validate filter condition (template method)."""
 
+    def field_names(self):
+        """Return the set of item fields this filter looks at."""
+        return set([self._name])
+
+    def first_fields(self):
+        """Return the set of item fields always looked at, i.e. before any short-cut."""
+        return set([self._name])
+
+    def cost(self, field_cost):
+        """Return the estimated cost of evaluating this filter."""
+        return field_cost(self._name)
+
 
 class EqualsFilter(FieldFilter):
     """Filter fields equal to the given value."""
@@ -269,6 +471,10 @@ class EqualsFilter(FieldFilter):
         #    result, getattr(item, self._name), self._value, self._name, item))
         return result
 
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        return "(%s == %s)" % (compiler.const(self._value), compiler.field(self._name))
+
 
 class PatternFilter(FieldFilter):
     """Case-insensitive pattern filter, either a glob or a /regex/ pattern."""
@@ -302,6 +508,10 @@ class PatternFilter(FieldFilter):
         else:
             self._matcher = lambda val, _: fnmatch.fnmatchcase(val, self._value)
 
+    def pre_filter_exact(self):
+        """Return whether L{pre_filter} selects exactly the matching items."""
+        return bool(self.pre_filter()) and not self._value
+
     def pre_filter(self):
         """Return rTorrent condition to speed up data transfer."""
         if self._name not in self.PRE_FILTER_FIELDS or self._template:
@@ -330,6 +540,38 @@ class PatternFilter(FieldFilter):
 
         return ""
 
+    def cost(self, field_cost):
+        """Return the estimated cost of evaluating this filter."""
+        from pyrosimple.torrent import formatting
+
+        result = super(PatternFilter, self).cost(field_cost)
+        if self._template:
+            result += COST_TEMPLATE + sum(
+                field_cost(i) for i in formatting.format_fields(self._template)
+            )
+        return result
+
+    def field_names(self):
+        """Return the set of item fields this filter looks at."""
+        from pyrosimple.torrent import formatting
+
+        result = super(PatternFilter, self).field_names()
+        if self._template:
+            result.update(formatting.format_fields(self._template))
+        return result
+
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        val = "(%s or '').lower()" % compiler.field(self._name)
+        if self._is_regex:
+            return "%s(%s)" % (compiler.const(self._matcher), val)
+        if self._template:
+            return "%s(%s, item)" % (compiler.const(self._matcher), val)
+        if not any(i in self._value for i in "*?["):
+            return "(%s == %s)" % (val, compiler.const(self._value))
+        glob_match = re.compile(fnmatch.translate(self._value)).match
+        return "(%s(%s) is not None)" % (compiler.const(glob_match), val)
+
     def match(self, item):
         """Return True if filter matches item."""
         val = (getattr(item, self._name) or "").lower()
@@ -345,6 +587,8 @@ class PatternFilter(FieldFilter):
 class FilesFilter(PatternFilter):
     """Case-insensitive pattern filter on filenames in a torrent."""
 
+    _compile = Filter._compile
+
     def match(self, item):
         """Return True if filter matches item."""
         val = getattr(item, self._name)
@@ -391,6 +635,13 @@ class TaggedAsFilter(FieldFilter):
             # Empty tag means empty set, not set of one empty string
             self._value = set((self._value,)) if self._value else set()
 
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        tags = "(%s or ())" % compiler.field(self._name)
+        if self._exact:
+            return "(%s == set(%s))" % (compiler.const(self._value), tags)
+        return "(%s in %s)" % (compiler.const(self._value), tags)
+
     def match(self, item):
         """Return True if filter matches item."""
         tags = getattr(item, self._name) or []
@@ -413,6 +664,10 @@ class BoolFilter(FieldFilter):
             )
         return ""
 
+    def pre_filter_exact(self):
+        """Return whether L{pre_filter} selects exactly the matching items."""
+        return bool(self.pre_filter())
+
     def validate(self):
         """Validate filter condition (template method)."""
         super(BoolFilter, self).validate()
@@ -425,6 +680,18 @@ class BoolFilter(FieldFilter):
         val = getattr(item, self._name) or False
         return bool(val) is self._value
 
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        negate = "not " if self._value else ""
+        return "(%snot %s)" % (negate, compiler.field(self._name))
+
+    def mask(self, columns, where=None):
+        """Return a boolean array of the matching items in C{columns}."""
+        values = columns.column(self._name)
+        if values is None:
+            return super(BoolFilter, self).mask(columns, where)
+        return columns.all(where) & ((values != 0) == self._value)
+
 
 class NumericFilterBase(FieldFilter):
     """Base class for numerical value filters."""
@@ -467,6 +734,47 @@ class NumericFilterBase(FieldFilter):
         else:
             return self._cmp(float(val), self._value)
 
+    def _pre_filter_value(self, value):
+        """Return C{value} as an integer comparing like it for integral values.
+
+        Returns C{None} if there is no such integer.
+        """
+        value = round(value, 6)  # ignore float noise from scaling
+        if self._rt_cmp == "greater":
+            return int(math.floor(value))
+        if self._rt_cmp == "less":
+            return int(math.ceil(value))
+        return int(value) if value == int(value) else None
+
+    # Python operators for the comparison functions
+    CMP_OPERATORS = {operator.gt: ">", operator.lt: "<", operator.eq: "=="}
+
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        if self._cmp not in self.CMP_OPERATORS or (
+            # Unset values would match, so the null check is needed
+            self.not_null
+            and self._value
+            and self._cmp(0.0, self._value)
+        ):
+            return super(NumericFilterBase, self)._compile(compiler)
+        return "(float(%s or 0) %s %s)" % (
+            compiler.field(self._name),
+            self.CMP_OPERATORS[self._cmp],
+            compiler.const(self._value),
+        )
+
+    def mask(self, columns, where=None):
+        """Return a boolean array of the matching items in C{columns}."""
+        values = columns.column(self._name)
+        if values is None:
+            return super(NumericFilterBase, self).mask(columns, where)
+
+        result = columns.all(where) & self._cmp(values, self._value)
+        if self.not_null and self._value:
+            result &= values != 0
+        return result
+
 
 class FloatFilter(NumericFilterBase):
     """Filter float values."""
@@ -478,12 +786,19 @@ class FloatFilter(NumericFilterBase):
     def pre_filter(self):
         """Return rTorrent condition to speed up data transfer."""
         if self._name in self.PRE_FILTER_FIELDS:
-            val = int(self._value * self.FIELD_SCALE.get(self._name, 1))
-            return '"{}=value=${},value={}"'.format(
-                self._rt_cmp, self.PRE_FILTER_FIELDS[self._name], val
+            val = self._pre_filter_value(
+                self._value * self.FIELD_SCALE.get(self._name, 1)
             )
+            if val is not None:
+                return '"{}=value=${},value={}"'.format(
+                    self._rt_cmp, self.PRE_FILTER_FIELDS[self._name], val
+                )
         return ""
 
+    def pre_filter_exact(self):
+        """Return whether L{pre_filter} selects exactly the matching items."""
+        return bool(self.pre_filter())
+
     def validate(self):
         """Validate filter condition (template method)."""
         super(FloatFilter, self).validate()
@@ -514,8 +829,23 @@ class TimeFilter(NumericFilterBase):
         % "".join(r"(?:(?P<%s>\d+)[%s%s])?" % (i, i, i.upper()) for i in "ymwdhis")
     )
 
+    # Seconds of fuzz for clock differences between us and rTorrent
+    ELAPSED_FUZZ = 300
+
     def pre_filter(self):
         """Return rTorrent condition to speed up data transfer."""
+        if self._name in self.PRE_FILTER_FIELDS and self.not_null and self._delta:
+            # Relative to rTorrent's clock; unset values don't match anyway
+            if self._rt_cmp == "less":  # older
+                return '"elapsed.greater=${},{}"'.format(
+                    self.PRE_FILTER_FIELDS[self._name],
+                    max(0, int(self._delta) - self.ELAPSED_FUZZ),
+                )
+            elif self._rt_cmp == "greater":  # younger
+                return '"elapsed.less=${},{}"'.format(
+                    self.PRE_FILTER_FIELDS[self._name],
+                    int(self._delta) + self.ELAPSED_FUZZ,
+                )
         if self._name in self.PRE_FILTER_FIELDS:
             # Adding a day of fuzz to avoid any possible timezone problems
             timestamp = self._value + (
@@ -534,6 +864,7 @@ class TimeFilter(NumericFilterBase):
         """Validate filter condition (template method) for timestamps and durations."""
         super(TimeFilter, self).validate()
         timestamp = now = time.time()
+        self._delta = None
 
         if str(self._value).isdigit():
             # Literal UNIX timestamp
@@ -557,6 +888,7 @@ class TimeFilter(NumericFilterBase):
                 if duration:
                     timestamp = now - timestamp
                 else:
+                    self._delta = now - timestamp
                     # Invert logic for time deltas (+ = older; - = within the delta range)
                     if self._cmp == operator.lt:
                         self._cmp = operator.gt
@@ -626,6 +958,20 @@ class DurationFilter(TimeFilter):
         else:
             return super(DurationFilter, self).match(item)
 
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        return Filter._compile(self, compiler)
+
+    def mask(self, columns, where=None):
+        """Return a boolean array of the matching items in C{columns}."""
+        result = super(DurationFilter, self).mask(columns, where)
+        nulls = columns.nulls(self._name)
+        if nulls is not None:
+            result &= ~nulls
+            if not self._value and self._cmp(-1, 0):
+                result |= nulls & columns.all(where)
+        return result
+
 
 class ByteSizeFilter(NumericFilterBase):
     """Filter size and bandwidth values."""
@@ -635,11 +981,17 @@ class ByteSizeFilter(NumericFilterBase):
     def pre_filter(self):
         """Return rTorrent condition to speed up data transfer."""
         if self._name in self.PRE_FILTER_FIELDS:
-            return '"{}={},value={}"'.format(
-                self._rt_cmp, self.PRE_FILTER_FIELDS[self._name], int(self._value)
-            )
+            val = self._pre_filter_value(self._value)
+            if val is not None:
+                return '"{}={},value={}"'.format(
+                    self._rt_cmp, self.PRE_FILTER_FIELDS[self._name], val
+                )
         return ""
 
+    def pre_filter_exact(self):
+        """Return whether L{pre_filter} selects exactly the matching items."""
+        return bool(self.pre_filter())
+
     def validate(self):
         """Validate filter condition (template method)."""
         super(ByteSizeFilter, self).validate()
@@ -694,6 +1046,117 @@ class MagicFilter(FieldFilter):
         """Return True if filter matches item."""
         return self._inner.match(item)
 
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        return self._inner._compile(compiler)
+
+    def mask(self, columns, where=None):
+        """Return a boolean array of the matching items in C{columns}."""
+        return self._inner.mask(columns, where)
+
+    def cost(self, field_cost):
+        """Return the estimated cost of evaluating this filter."""
+        return self._inner.cost(field_cost)
+
+
+class FilterCompiler(object):
+    """Generate the source of a function evaluating a filter tree.
+
+    Comparison values and helpers become default arguments of the
+    generated function, i.e. fast locals. Fields always looked at are
+    read once at the start, since doing that has no side effects that
+    the interpreted tree would avoid.
+    """
+
+    IDENT_RE = re.compile(r"^[_A-Za-z][_A-Za-z0-9]*$")
+
+    def __init__(self, bound_fields=()):
+        """Prepare compilation, with C{bound_fields} to get just once."""
+        self.consts = {}
+        self.bound = dict(
+            (name, "_f%d" % idx)
+            for idx, name in enumerate(sorted(bound_fields))
+            if self.IDENT_RE.match(name)
+        )
+
+    def const(self, value):
+        """Return the name of an argument holding C{value}."""
+        name = "_c%d" % len(self.consts)
+        self.consts[name] = value
+        return name
+
+    def field(self, name):
+        """Return an expression getting field C{name} of C{item}."""
+        if name in self.bound:
+            return self.bound[name]
+        if self.IDENT_RE.match(name):
+            return "item." + name
+        return "getattr(item, %s)" % self.const(name)
+
+    def source(self, expression):
+        """Return the source of a function named C{match}, evaluating C{expression}."""
+        lines = [
+            "def match(item%s):"
+            % "".join(", %s=%s" % (i, i) for i in sorted(self.consts)),
+        ]
+        lines.extend(
+            "    %s = item.%s" % (local, name)
+            for name, local in sorted(self.bound.items())
+        )
+        lines.append("    return %s" % expression)
+        return "\n".join(lines) + "\n"
+
+
+class CompiledFilter(Filter):
+    """A filter tree compiled into a single Python function.
+
+    It otherwise behaves like the tree it was made from.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        compiler = FilterCompiler(tree.first_fields())
+        expression = tree._compile(compiler)
+        self.source = compiler.source(expression)
+        namespace = dict(compiler.consts)
+        exec(compile(self.source, "<filter %s>" % tree, "exec"), namespace)
+        self.match = namespace["match"]
+
+    def __str__(self):
+        return str(self.tree)
+
+    def pre_filter(self):
+        """Return rTorrent condition to speed up data transfer."""
+        return self.tree.pre_filter()
+
+    def pre_filter_exact(self):
+        """Return whether L{pre_filter} selects exactly the matching items."""
+        return self.tree.pre_filter_exact()
+
+    def field_names(self):
+        """Return the set of item fields this filter looks at."""
+        return self.tree.field_names()
+
+    def first_fields(self):
+        """Return the set of item fields always looked at, i.e. before any short-cut."""
+        return self.tree.first_fields()
+
+    def cost(self, field_cost):
+        """Return the estimated cost of evaluating this filter."""
+        return self.tree.cost(field_cost)
+
+    def compile(self):
+        """Return this filter, it's compiled already."""
+        return self
+
+    def _compile(self, compiler):
+        """Return a Python expression evaluating this filter for C{item}."""
+        return self.tree._compile(compiler)
+
+    def mask(self, columns, where=None):
+        """Return a boolean array of the matching items in C{columns}."""
+        return self.tree.mask(columns, where)
+
 
 class ConditionParser(object):
     """Filter condition parser."""
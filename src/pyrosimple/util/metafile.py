@@ -20,14 +20,22 @@
 
 import re
 import sys
+import copy
 import time
 import stat
+import json
 import math
+import mmap
 import errno
+import bisect
+import random
 import pprint
 import fnmatch
 import hashlib
 import urllib
+import itertools
+import collections
+import concurrent.futures
 
 import bencode
 
@@ -52,6 +60,15 @@ PASSKEY_OK = (
     "TrackerServlet",
 )
 
+# Size of the work units handed to hashing threads (at least one piece)
+HASH_UNIT_SIZE = 16 * 1024 ** 2
+
+# Size of single reads when hashing a piece
+HASH_READ_SIZE = 1024 ** 2
+
+# Seconds between saving checkpoints while checking data
+CHECKPOINT_INTERVAL = 10.0
+
 # List of all standard keys in a metafile
 METAFILE_STD_KEYS = [
     _i.split(".")
@@ -383,6 +400,208 @@ def data_size(metadata):
     return total_size
 
 
+def piece_spans(files, piece_size):
+    """Generate the file spans that make up each piece of the concatenated files.
+
+    @param files: A sequence of C{(filename, size)} tuples, in torrent order.
+    @param piece_size: The piece length of the torrent.
+    @return: A list of C{(filename, offset, length)} tuples for each piece,
+        where pieces that cross file boundaries have several spans.
+    """
+    spans = []
+    done = 0
+    for filename, filesize in files:
+        fileoffset = 0
+        while fileoffset < filesize:
+            length = min(filesize - fileoffset, piece_size - done)
+            spans.append((filename, fileoffset, length))
+            fileoffset += length
+            done += length
+
+            if done == piece_size:
+                yield spans
+                spans = []
+                done = 0
+
+    # Partial last piece
+    if spans:
+        yield spans
+
+
+def piece_spans_at(files, piece_size, indices):
+    """Generate the file spans of the given pieces, like L{piece_spans} does.
+
+    Only the requested pieces are located (by their offset), so this is
+    quick even for a few pieces of huge torrents.
+    """
+    ends = list(itertools.accumulate(filesize for _, filesize in files))
+    totalsize = ends[-1] if ends else 0
+    for index in indices:
+        offset = index * piece_size
+        end = min(offset + piece_size, totalsize)
+        spans = []
+        pos = bisect.bisect_right(ends, offset)
+        while offset < end:
+            filename, filesize = files[pos]
+            fileoffset = offset - (ends[pos] - filesize)
+            length = min(filesize - fileoffset, end - offset)
+            if length > 0:
+                spans.append((filename, fileoffset, length))
+                offset += length
+            pos += 1
+        yield spans
+
+
+def sample_pieces(files, piece_size, count, rng=None):
+    """Return a sorted list of C{count} random piece numbers.
+
+    If C{count} is large enough, each file gets one piece checked. All
+    other samples are spread evenly over the data, one in each of
+    C{count} equal parts, so large files get more of them.
+    """
+    rng = rng or random
+    totalsize = sum(filesize for _, filesize in files)
+    pieces = (totalsize + piece_size - 1) // piece_size
+    if count >= pieces:
+        return list(range(pieces))
+
+    # Pieces of each file
+    selected = set()
+    ranges = []
+    offset = 0
+    for _, filesize in files:
+        if filesize:
+            ranges.append((offset // piece_size, (offset + filesize - 1) // piece_size))
+        offset += filesize
+    if count >= len(ranges):
+        selected.update(rng.randint(first, last) for first, last in ranges)
+
+    # Spread the rest, and fill up for pieces selected twice
+    remaining = count - len(selected)
+    for idx in range(remaining):
+        selected.add(
+            rng.randrange(pieces * idx // remaining, pieces * (idx + 1) // remaining)
+        )
+    while len(selected) < count:
+        selected.add(rng.randrange(pieces))
+
+    return sorted(selected)
+
+
+def detection_confidence(pieces, sampled, damage):
+    """Return the probability that checking a random sample finds bad pieces.
+
+    This assumes that at least a C{damage} fraction of all pieces (and at
+    least one piece) is bad, and C{sampled} different pieces are checked.
+    """
+    bad = max(1, int(math.ceil(damage * pieces)))
+    missed = 1.0
+    for idx in range(sampled):
+        if pieces - bad - idx <= 0:
+            return 1.0
+        missed *= (pieces - bad - idx) / float(pieces - idx)
+    return 1.0 - missed
+
+
+class SpanReader(object):
+    """Feeds spans of data files into hashes, keeping the last file open.
+
+    With C{use_mmap}, regular files are memory-mapped, and C{memoryview}
+    slices of the mapping are hashed, without copying them. Other files
+    are read into one buffer that is reused for all reads.
+    """
+
+    def __init__(self, use_mmap=False):
+        """Initialize reader."""
+        self.use_mmap = use_mmap
+        self.handle = None
+        self.mappable = False
+        self.position = 0
+        self.buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Close the current file."""
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def _open(self, filename):
+        """Return an open handle for C{filename}, reusing the current one."""
+        if self.handle is None or self.handle.name != filename:
+            self.close()
+            self.handle = open(filename, "rb", buffering=0)
+            self.mappable = self.use_mmap and stat.S_ISREG(
+                os.fstat(self.handle.fileno()).st_mode
+            )
+            self.position = 0
+        return self.handle
+
+    def update(self, sha1sum, filename, fileoffset, length):
+        """Hash C{length} bytes at C{fileoffset} of the given file."""
+        handle = self._open(filename)
+        if self.mappable:
+            # Mappings must start at a multiple of the allocation granularity
+            start = fileoffset - fileoffset % mmap.ALLOCATIONGRANULARITY
+            try:
+                data = mmap.mmap(
+                    handle.fileno(),
+                    fileoffset + length - start,
+                    access=mmap.ACCESS_READ,
+                    offset=start,
+                )
+            except ValueError:
+                raise OSError(errno.EIO, "File got shorter while hashing", filename)
+            try:
+                with memoryview(data) as view, view[fileoffset - start :] as span:
+                    sha1sum.update(span)
+            finally:
+                data.close()
+            return
+
+        if self.buffer is None:
+            self.buffer = memoryview(bytearray(HASH_READ_SIZE))
+        if self.position != fileoffset:
+            handle.seek(fileoffset)
+        while length:
+            count = handle.readinto(self.buffer[: min(length, HASH_READ_SIZE)])
+            if not count:
+                raise OSError(errno.EIO, "File got shorter while hashing", filename)
+            sha1sum.update(self.buffer[:count])
+            length -= count
+            fileoffset += count
+        self.position = fileoffset
+
+
+def hash_pieces(pieces, use_mmap=False, strict=True):
+    """Return the SHA1 digests of the given pieces, as produced by L{piece_spans}.
+
+    Unless C{strict}, the digest of a piece that can't be read is C{None},
+    instead of raising an error.
+    """
+    digests = []
+    with SpanReader(use_mmap) as reader:
+        for spans in pieces:
+            sha1sum = hashlib.sha1()
+            try:
+                for span in spans:
+                    reader.update(sha1sum, *span)
+            except EnvironmentError:
+                if strict:
+                    raise
+                reader.close()
+                digests.append(None)
+            else:
+                digests.append(sha1sum.digest())
+
+    return digests
+
+
 def checked_open(filename, log=None, quiet=False):
     """Open and validate the given metafile.
     Optionally provide diagnostics on the passed logger, for
@@ -430,6 +649,8 @@ class Metafile(object):
         """Initialize metafile."""
         self.filename = filename
         self.progress = None
+        self.hash_workers = None
+        self.hash_mmap = None
         self.datapath = datapath
         self.ignore = self.IGNORE_GLOB[:]
         self.LOG = pymagic.get_class_logger(self)
@@ -501,15 +722,24 @@ class Metafile(object):
         """Get total size of "self.datapath"."""
         return sum(os.path.getsize(filename) for filename in self.walk())
 
-    def _make_info(self, piece_size, progress, walker, piece_callback=None):
-        """Create info dict."""
-        # These collect the file descriptions and piece hashes
-        file_list = []
-        pieces = []
+    def _hash_workers(self):
+        """Return the number of threads used for hashing."""
+        workers = int(
+            config.hash_workers if self.hash_workers is None else self.hash_workers
+        )
+        return workers if workers > 0 else os.cpu_count() or 1
 
-        # Initialize progress state
-        hashing_secs = time.time()
-        totalsize = -1 if self._fifo else self._calc_size()
+    def _hash_mmap(self):
+        """Return whether data files are memory-mapped for hashing."""
+        return bool(
+            int(config.hash_mmap if self.hash_mmap is None else self.hash_mmap)
+        )
+
+    def _hash_serial(
+        self, files, piece_size, totalsize, progress, piece_callback, use_mmap
+    ):
+        """Hash files by reading them in sequence, one piece after the other."""
+        pieces = []
         totalhashed = 0
 
         # Start a new piece
@@ -518,36 +748,18 @@ class Metafile(object):
         filename = None
 
         # Hash all files
-        for filename in walker:
-            # Assemble file info
-            filesize = os.path.getsize(filename)
-            filepath = filename[
-                len(os.path.dirname(self.datapath) if self._fifo else self.datapath) :
-            ].lstrip(os.sep)
-            file_list.append(
-                {
-                    "length": filesize,
-                    "path": [
-                        x
-                        for x in fmt.to_unicode(filepath)
-                        .replace(os.sep, "/")
-                        .split("/")
-                    ],
-                }
-            )
-            self.LOG.debug("Hashing %r, size %d..." % (filename, filesize))
+        with SpanReader(use_mmap) as reader:
+            for filename, filesize in files:
+                self.LOG.debug("Hashing %r, size %d..." % (filename, filesize))
 
-            # Open file and hash it
-            fileoffset = 0
-            handle = open(filename, "rb")
-            try:
+                fileoffset = 0
                 while fileoffset < filesize:
-                    # Read rest of piece or file, whatever is smaller
-                    chunk = handle.read(min(filesize - fileoffset, piece_size - done))
-                    sha1sum.update(chunk)  # bogus pylint: disable=E1101
-                    done += len(chunk)
-                    fileoffset += len(chunk)
-                    totalhashed += len(chunk)
+                    # Hash rest of piece or file, whatever is smaller
+                    length = min(filesize - fileoffset, piece_size - done)
+                    reader.update(sha1sum, filename, fileoffset, length)
+                    done += length
+                    fileoffset += length
+                    totalhashed += length
 
                     # Piece is done
                     if done == piece_size:
@@ -562,8 +774,6 @@ class Metafile(object):
                     # Report progress
                     if progress:
                         progress(totalhashed, totalsize)
-            finally:
-                handle.close()
 
         # Add hash of partial last piece
         if done > 0:
@@ -571,6 +781,122 @@ class Metafile(object):
             if piece_callback:
                 piece_callback(filename, pieces[-1])
 
+        return pieces, totalhashed
+
+    def _hashed(self, pieces, piece_size, use_mmap, workers, strict=True):
+        """Generate C{(spans, digest)} for the given pieces, in order.
+
+        Pieces are hashed in units of several pieces, using a pool of threads
+        if there is more than one worker. See L{hash_pieces} for C{strict}.
+        """
+
+        def units():
+            "Group pieces into work units."
+            unit = []
+            for spans in pieces:
+                unit.append(spans)
+                if len(unit) * piece_size >= HASH_UNIT_SIZE:
+                    yield unit
+                    unit = []
+            if unit:
+                yield unit
+
+        if workers < 2:
+            for unit in units():
+                yield from zip(unit, hash_pieces(unit, use_mmap, strict))
+            return
+
+        # Keep a limited number of units in flight, so memory use stays bounded
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            try:
+                for unit in units():
+                    pending.append(
+                        (unit, executor.submit(hash_pieces, unit, use_mmap, strict))
+                    )
+                    if len(pending) >= 2 * workers:
+                        unit, digests = pending.popleft()
+                        yield from zip(unit, digests.result())
+                while pending:
+                    unit, digests = pending.popleft()
+                    yield from zip(unit, digests.result())
+            finally:
+                for _, digests in pending:
+                    digests.cancel()
+
+    def _hash_parallel(
+        self, files, piece_size, totalsize, progress, piece_callback, use_mmap, workers
+    ):
+        """Hash files in units of several pieces, using a pool of threads.
+
+        Digests, progress, and callbacks are handed on in piece order,
+        exactly like L{_hash_serial} does.
+        """
+        pieces = []
+        totalhashed = 0
+        last_filename = files[-1][0] if files else None
+        self.LOG.debug(
+            "Hashing %d file(s), size %d, using %d threads..."
+            % (len(files), totalsize, workers)
+        )
+
+        for spans, digest in self._hashed(
+            piece_spans(files, piece_size), piece_size, use_mmap, workers
+        ):
+            length = sum(i[2] for i in spans)
+            totalhashed += length
+            pieces.append(digest)
+
+            # A partial last piece ends in the last file, which might be empty
+            if piece_callback:
+                piece_callback(
+                    spans[-1][0] if length == piece_size else last_filename, digest
+                )
+            if progress:
+                progress(totalhashed, totalsize)
+
+        return pieces, totalhashed
+
+    def _make_info(self, piece_size, progress, walker, piece_callback=None):
+        """Create info dict."""
+        # This collects the file descriptions
+        file_list = []
+
+        # Initialize progress state
+        hashing_secs = time.time()
+        totalsize = -1 if self._fifo else self._calc_size()
+
+        rootlen = len(os.path.dirname(self.datapath) if self._fifo else self.datapath)
+
+        def files():
+            "Assemble file info, and generate names and sizes of all files."
+            for filename in walker:
+                filesize = os.path.getsize(filename)
+                filepath = filename[rootlen:].lstrip(os.sep)
+                file_list.append(
+                    {
+                        "length": filesize,
+                        "path": [
+                            x
+                            for x in fmt.to_unicode(filepath)
+                            .replace(os.sep, "/")
+                            .split("/")
+                        ],
+                    }
+                )
+                yield filename, filesize
+
+        # Hash all files (paths from a FIFO are read while hashing, with buffered reads)
+        workers = self._hash_workers()
+        use_mmap = not self._fifo and self._hash_mmap()
+        hash_args = (piece_size, totalsize, progress, piece_callback, use_mmap)
+        if self._fifo or workers < 2:
+            pieces, totalhashed = self._hash_serial(files(), *hash_args)
+        else:
+            pieces, totalhashed = self._hash_parallel(
+                list(files()), *hash_args, workers
+            )
+
         # Build the meta dict
         metainfo = {
             "pieces": b"".join(pieces),
@@ -597,9 +923,8 @@ class Metafile(object):
         # Return validated info dict
         return check_info(metainfo), totalhashed
 
-    def _make_meta(self, tracker_url, root_name, private, progress):
-        """Create torrent dict."""
-        # Calculate piece size
+    def _piece_size(self):
+        """Calculate piece size for the data."""
         if self._fifo:
             # TODO we need to add a (command line) param, probably for total data size
             # for now, always 1MB
@@ -612,12 +937,11 @@ class Metafile(object):
                 piece_size_exp = 0
 
         piece_size_exp = min(max(15, piece_size_exp), 24)
-        piece_size = 2 ** piece_size_exp
+        return 2 ** piece_size_exp
 
-        # Build info hash
-        info, totalhashed = self._make_info(
-            piece_size, progress, self.walk() if self._fifo else sorted(self.walk())
-        )
+    def _make_meta(self, tracker_url, root_name, private, info):
+        """Create torrent dict, using a copy of the given info dict."""
+        info = copy.deepcopy(info)
 
         # Enforce unique hash per tracker
         info["x_cross_seed"] = hashlib.md5(tracker_url.encode("utf-8")).hexdigest()
@@ -639,33 +963,17 @@ class Metafile(object):
         # XXX meta["encoding"] = "UTF-8"
 
         # Return validated meta dict
-        return check_meta(meta), totalhashed
-
-    def create(
-        self,
-        datapath,
-        tracker_urls,
-        comment=None,
-        root_name=None,
-        created_by=None,
-        private=False,
-        no_date=False,
-        progress=None,
-        callback=None,
-    ):
-        """Create a metafile with the path given on object creation.
-        Returns the last metafile dict that was written (as an object, not bencoded).
-        """
-        if datapath:
-            self.datapath = datapath
+        return check_meta(meta)
 
+    def _resolve_trackers(self, tracker_urls):
+        """Return announce URLs and metafile names for the given URLs or aliases."""
         try:
             tracker_urls = ["" + tracker_urls]
         except TypeError:
             tracker_urls = list(tracker_urls)
         multi_mode = len(tracker_urls) > 1
 
-        # TODO add optimization so the hashing happens only once for multiple URLs!
+        result = []
         for tracker_url in tracker_urls:
             # Lookup announce URLs from config file
             try:
@@ -700,67 +1008,323 @@ class Metafile(object):
                     continue
                 output_name = "".join(output_name)
 
-            # Hash the data
-            self.LOG.info(
-                "Creating %r for %s %r..."
-                % (
-                    output_name,
-                    "filenames read from" if self._fifo else "data in",
-                    self.datapath,
-                )
-            )
-            meta, _ = self._make_meta(tracker_url, root_name, private, progress)
-
-            # Add optional fields
-            if comment:
-                meta["comment"] = comment
-            if created_by:
-                meta["created by"] = created_by
-            if not no_date:
-                meta["creation date"] = int(time.time())
-            if callback:
-                callback(meta)
-
-            # Write metafile to disk
-            self.LOG.debug("Writing %r..." % (output_name,))
-            with open(output_name, "wb") as fh:
-                fh.write(bencode.encode(meta))
-
-        return meta
-
-    def check(self, metainfo, datapath, progress=None):
-        """Check piece hashes of a metafile against the given datapath."""
+            result.append((tracker_url, output_name))
+
+        return result
+
+    def _write(self, output_name, meta):
+        """Write metafile to disk."""
+        self.LOG.debug("Writing %r..." % (output_name,))
+        with open(output_name, "wb") as fh:
+            fh.write(bencode.encode(meta))
+
+    def create_all(
+        self,
+        datapath,
+        tracker_urls,
+        comment=None,
+        root_name=None,
+        created_by=None,
+        private=False,
+        no_date=False,
+        progress=None,
+        callback=None,
+    ):
+        """Create a metafile for each of the given announce URLs or aliases.
+
+        The data is hashed once, and all metafiles share the same pieces,
+        they only differ in their announce URL and C{x_cross_seed} key.
+        Metafiles are written concurrently, after C{callback} got them.
+
+        @return: A list of C{(filename, meta)} tuples for the written metafiles.
+        """
         if datapath:
             self.datapath = datapath
+        trackers = self._resolve_trackers(tracker_urls)
+        if not trackers:
+            return []
 
-        def check_piece(filename, piece):
-            "Callback for new piece"
-            if (
-                piece
-                != metainfo["info"]["pieces"][
-                    check_piece.piece_index : check_piece.piece_index + 20
-                ]
-            ):
-                self.LOG.warn(
+        # Hash the data
+        self.LOG.info(
+            "Creating %s for %s %r..."
+            % (
+                "%r" % (trackers[0][1],)
+                if len(trackers) == 1
+                else "%d metafiles" % len(trackers),
+                "filenames read from" if self._fifo else "data in",
+                self.datapath,
+            )
+        )
+        info, _ = self._make_info(
+            self._piece_size(),
+            progress,
+            self.walk() if self._fifo else sorted(self.walk()),
+        )
+
+        result = []
+        with concurrent.futures.ThreadPoolExecutor(
+            min(len(trackers), self._hash_workers())
+        ) as executor:
+            writes = []
+            for tracker_url, output_name in trackers:
+                meta = self._make_meta(tracker_url, root_name, private, info)
+
+                # Add optional fields
+                if comment:
+                    meta["comment"] = comment
+                if created_by:
+                    meta["created by"] = created_by
+                if not no_date:
+                    meta["creation date"] = int(time.time())
+                if callback:
+                    callback(meta)
+
+                writes.append(executor.submit(self._write, output_name, meta))
+                result.append((output_name, meta))
+
+            # Raise any write errors
+            for write in writes:
+                write.result()
+
+        return result
+
+    def create(
+        self,
+        datapath,
+        tracker_urls,
+        comment=None,
+        root_name=None,
+        created_by=None,
+        private=False,
+        no_date=False,
+        progress=None,
+        callback=None,
+    ):
+        """Create a metafile with the path given on object creation.
+        Returns the last metafile dict that was written (as an object, not bencoded).
+        See L{create_all} for creating several metafiles.
+        """
+        written = self.create_all(
+            datapath,
+            tracker_urls,
+            comment=comment,
+            root_name=root_name,
+            created_by=created_by,
+            private=private,
+            no_date=no_date,
+            progress=progress,
+            callback=callback,
+        )
+        return written[-1][1] if written else None
+
+    def _load_checkpoint(self, checkpoint, infohash):
+        """Return next piece and bad pieces saved in a checkpoint file."""
+        try:
+            with open(checkpoint, "r") as handle:
+                state = json.load(handle)
+        except FileNotFoundError:
+            return 0, []
+        except (EnvironmentError, ValueError) as exc:
+            self.LOG.warning("Ignoring bad checkpoint %r (%s)" % (checkpoint, exc))
+            return 0, []
+
+        if state.get("info_hash") != infohash:
+            self.LOG.warning(
+                "Ignoring checkpoint %r made for another metafile" % (checkpoint,)
+            )
+            return 0, []
+
+        self.LOG.info(
+            "Resuming check at piece #%d from %r" % (state["piece"], checkpoint)
+        )
+        return int(state["piece"]), [int(i) for i in state["bad"]]
+
+    def _save_checkpoint(self, checkpoint, infohash, piece, bad):
+        """Save next piece and bad pieces to a checkpoint file."""
+        tempname = checkpoint + ".tmp"
+        with open(tempname, "w") as handle:
+            json.dump(dict(info_hash=infohash, piece=piece, bad=bad), handle)
+        os.replace(tempname, checkpoint)
+
+    def _data_files(self, metainfo, datapath):
+        """Return paths and sizes of the data files of a metafile, in torrent order.
+
+        Also returns a dict of their relative paths, used in reports.
+        """
+        datapath = (datapath or self.datapath).rstrip(os.sep)
+        info = metainfo["info"]
+        if "length" in info:
+            paths = [[info["name"]]]
+            files = [(datapath, int(info["length"]))]
+        else:
+            paths = [i["path"] for i in info["files"]]
+            files = [
+                (os.path.join(*([datapath] + i["path"])), int(i["length"]))
+                for i in info["files"]
+            ]
+        relpaths = dict(
+            (filename, "/".join(path)) for (filename, _), path in zip(files, paths)
+        )
+        return files, relpaths
+
+    def _new_report(self, metainfo, files, relpaths):
+        """Return an empty data check report, listing files with a wrong size."""
+        report = Bunch(
+            pieces=len(metainfo["info"]["pieces"]) // 20,
+            checked=0,
+            bad=[],
+            files={},
+            bad_size=[],
+            complete=False,
+            ok=False,
+        )
+        for filename, filesize in files:
+            try:
+                if os.path.getsize(filename) != filesize:
+                    report.bad_size.append(relpaths[filename])
+            except EnvironmentError:
+                report.bad_size.append(relpaths[filename])
+
+        return report
+
+    def _map_bad_pieces(self, report, files, relpaths, piece_size):
+        """Add the files the bad pieces are in to a report."""
+        for index in report.bad:
+            start, end = index * piece_size, (index + 1) * piece_size
+            offset = 0
+            for filename, filesize in files:
+                if filesize and offset < end and start < offset + filesize:
+                    report.files.setdefault(relpaths[filename], []).append(index)
+                offset += filesize
+
+    def verify(self, metainfo, datapath, progress=None, max_bad=0, checkpoint=None):
+        """Check piece hashes of a metafile against the given datapath.
+
+        Pieces that can't be read (e.g. due to missing files) count as bad.
+
+        @param max_bad: Stop after this many bad pieces (0 checks all of them).
+        @param checkpoint: Optional file where progress is saved, so that an
+            interrupted (or stopped) check resumes where it left off.
+            It's removed when all pieces are checked.
+        @return: A bunch with the number of C{pieces}, how many were C{checked},
+            a list of C{bad} piece numbers, the affected C{files} and the bad
+            pieces in them, files with a C{bad_size}, whether the check is
+            C{complete}, and whether all is C{ok}.
+        """
+        info = metainfo["info"]
+        piece_size = int(info["piece length"])
+        digests = info["pieces"]
+        infohash = info_hash(metainfo)
+        files, relpaths = self._data_files(metainfo, datapath)
+        totalsize = sum(i[1] for i in files)
+        report = self._new_report(metainfo, files, relpaths)
+
+        # Hash the remaining pieces
+        if checkpoint:
+            report.checked, report.bad = self._load_checkpoint(checkpoint, infohash)
+        saved = time.time()
+        pieces = itertools.islice(piece_spans(files, piece_size), report.checked, None)
+        hashed = self._hashed(
+            pieces, piece_size, self._hash_mmap(), self._hash_workers(), strict=False
+        )
+        try:
+            for spans, digest in hashed:
+                index = report.checked
+                report.checked += 1
+                if digest != digests[index * 20 : index * 20 + 20]:
+                    self.LOG.warning(
+                        "Piece #%d: Hashes differ in file %r"
+                        % (index, relpaths[spans[-1][0]])
+                    )
+                    report.bad.append(index)
+                    if max_bad and len(report.bad) >= max_bad:
+                        break
+
+                if progress:
+                    progress(min(report.checked * piece_size, totalsize), totalsize)
+                if checkpoint and time.time() - saved >= CHECKPOINT_INTERVAL:
+                    self._save_checkpoint(
+                        checkpoint, infohash, report.checked, report.bad
+                    )
+                    saved = time.time()
+        finally:
+            hashed.close()
+            report.complete = report.checked >= report.pieces
+            if checkpoint:
+                if report.complete:
+                    if os.path.exists(checkpoint):
+                        os.remove(checkpoint)
+                else:
+                    self._save_checkpoint(
+                        checkpoint, infohash, report.checked, report.bad
+                    )
+
+        self._map_bad_pieces(report, files, relpaths, piece_size)
+        report.ok = report.complete and not report.bad and not report.bad_size
+        return report
+
+    def sample(
+        self, metainfo, datapath, fraction=None, count=None, damage=0.01, rng=None
+    ):
+        """Check piece hashes of randomly chosen pieces against the given datapath.
+
+        Pieces are chosen as described in L{sample_pieces}, and read directly
+        at their offsets in the data files.
+
+        @param fraction: The fraction of all pieces to check.
+        @param count: The number of pieces to check (used if C{fraction} isn't given).
+        @param damage: The fraction of bad pieces the C{confidence} refers to.
+        @param rng: Optional C{random.Random} instance.
+        @return: A report like L{verify} returns, with the C{sampled} piece
+            numbers, and the C{confidence} of finding bad pieces if there are
+            at least a C{damage} fraction of them.
+        """
+        if fraction is None and count is None:
+            raise error.UserError("Give a fraction or count of pieces to check")
+
+        info = metainfo["info"]
+        piece_size = int(info["piece length"])
+        digests = info["pieces"]
+        files, relpaths = self._data_files(metainfo, datapath)
+        report = self._new_report(metainfo, files, relpaths)
+        if fraction is not None:
+            count = int(math.ceil(float(fraction) * report.pieces))
+        report.sampled = sample_pieces(files, piece_size, int(count), rng)
+        report.damage = damage
+
+        hashed = self._hashed(
+            piece_spans_at(files, piece_size, report.sampled),
+            piece_size,
+            self._hash_mmap(),
+            self._hash_workers(),
+            strict=False,
+        )
+        for (spans, digest), index in zip(hashed, report.sampled):
+            report.checked += 1
+            if digest != digests[index * 20 : index * 20 + 20]:
+                self.LOG.warning(
                     "Piece #%d: Hashes differ in file %r"
-                    % (check_piece.piece_index // 20, filename)
+                    % (index, relpaths[spans[-1][0]])
                 )
-            check_piece.piece_index += 20
+                report.bad.append(index)
+
+        self._map_bad_pieces(report, files, relpaths, piece_size)
+        report.complete = report.checked >= report.pieces
+        report.ok = not report.bad and not report.bad_size
+        report.confidence = (
+            1.0
+            if report.bad
+            else detection_confidence(report.pieces, report.checked, damage)
+        )
+        return report
 
-        check_piece.piece_index = 0
+    def check(self, metainfo, datapath, progress=None, max_bad=0, checkpoint=None):
+        """Check piece hashes of a metafile against the given datapath.
 
-        datameta, _ = self._make_info(
-            int(metainfo["info"]["piece length"]),
-            progress,
-            [datapath]
-            if "length" in metainfo["info"]
-            else (
-                os.path.join(*([datapath] + i["path"]))
-                for i in metainfo["info"]["files"]
-            ),
-            piece_callback=check_piece,
-        )
-        return datameta["pieces"] == metainfo["info"]["pieces"]
+        Returns C{True} if all data is present and correct, see
+        L{verify} for the parameters, and for a detailed report.
+        """
+        return self.verify(metainfo, datapath, progress, max_bad, checkpoint).ok
 
     def listing(self, masked=True):
         """List torrent info & contents. Returns a list of formatted lines."""
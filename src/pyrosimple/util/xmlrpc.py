@@ -18,15 +18,20 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import re
 import sys
 import time
+import base64
 import socket
+from collections import deque
+from xml.parsers import expat
 
 from xmlrpc import client as xmlrpclib
 from pyrosimple.io import xmlrpc2scgi
 
 from pyrosimple import config, error
 from pyrosimple.util import os, fmt, pymagic
+from pyrosimple.util.parts import Bunch
 
 
 NOHASH = (
@@ -59,6 +64,380 @@ class HashNotFound(XmlRpcError):
 ERRORS = (XmlRpcError,) + xmlrpc2scgi.ERRORS
 
 
+class ResponseParser(object):
+    """Incremental XMLRPC response parser.
+
+    Data is fed as it arrives from the transport. With C{streaming} set,
+    the items of a result list can be taken from C{rows()} as soon as
+    they're complete, instead of collecting them for C{close()}.
+    """
+
+    # Conversions of scalar value types
+    SCALARS = {
+        "string": str,
+        "i4": int,
+        "i8": int,
+        "int": int,
+        "boolean": lambda text: bool(int(text)),
+        "double": float,
+        "nil": lambda _: None,
+        "base64": lambda text: xmlrpclib.Binary(base64.decodebytes(text.encode("ascii"))),
+        "dateTime.iso8601": xmlrpclib.DateTime,
+    }
+
+    def __init__(self, streaming=False):
+        self.streaming = streaming
+        self._parser = expat.ParserCreate()
+        self._parser.buffer_text = True
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._char_data
+        self._stack = []  # open arrays and structs
+        self._names = []  # member names of open structs
+        self._data = []
+        self._value = None
+        self._typed = False
+        self._fault = False
+        self._rows = deque()
+        self._result = None
+
+    def _start(self, tag, _):
+        """Handle an opening tag."""
+        if tag == "value":
+            self._data = []
+            self._typed = False
+        elif tag == "array":
+            self._stack.append([])
+        elif tag == "struct":
+            self._stack.append({})
+        elif tag == "fault":
+            self._fault = True
+        else:
+            self._data = []
+
+    def _char_data(self, text):
+        """Collect text content."""
+        self._data.append(text)
+
+    def _end(self, tag):
+        """Handle a closing tag."""
+        convert = self.SCALARS.get(tag)
+        if convert:
+            self._value = convert("".join(self._data))
+            self._typed = True
+        elif tag == "value":
+            if not self._typed:
+                self._value = "".join(self._data)
+            self._add(self._value)
+            self._typed = True
+        elif tag in ("array", "struct"):
+            self._value = self._stack.pop()
+            self._typed = True
+        elif tag == "name":
+            self._names.append("".join(self._data))
+
+    def _add(self, value):
+        """Add a completed value to its container."""
+        if not self._stack:
+            self._result = value
+        elif isinstance(self._stack[-1], list):
+            if self.streaming and len(self._stack) == 1:
+                self._rows.append(value)
+            else:
+                self._stack[-1].append(value)
+        else:
+            self._stack[-1][self._names.pop()] = value
+
+    def feed(self, data):
+        """Parse the next chunk of the response."""
+        try:
+            self._parser.Parse(data, False)
+        except (expat.ExpatError, ValueError, TypeError, IndexError) as exc:
+            raise xmlrpclib.ResponseError("Broken XMLRPC response (%s)" % exc)
+
+    def rows(self):
+        """Yield the completed result list items that were not taken yet."""
+        while self._rows:
+            yield self._rows.popleft()
+
+    def close(self):
+        """Finish parsing, and return the result or raise a received fault."""
+        self.feed(b"")
+        self._parser.Parse(b"", True)
+        if self._fault:
+            raise xmlrpclib.Fault(**self._result)
+        return self._result
+
+
+# Errors caused by the content of a response
+PARSE_ERRORS = (xmlrpclib.Fault, xmlrpclib.ResponseError)
+
+# Building blocks of the fast path in L{MulticallParser}
+_CELL = (
+    r"<value>(?:<(?:i4|i8|int)>{}[-+]?\d+{}</(?:i4|i8|int)>"
+    r"|<string>{}[^<]*{}</string>|<string/>|{}[^<]*{})</value>"
+)
+_CELL_VALUES = re.compile(_CELL.format(*"()" * 3))
+_CELL_ANY = _CELL.format(*[""] * 6)
+_ROW_OR_SCALAR = re.compile(
+    r"\s*(?:<value>\s*<array>\s*<data>((?:\s*{0})*)\s*</data>\s*</array>\s*</value>"
+    r"|({0}))".format(_CELL_ANY)
+)
+_RESPONSE_HEAD = re.compile(
+    r"\s*(?:<\?xml[^>]*\?>)?\s*<methodResponse>\s*<params>\s*<param>"
+    r"\s*<value>\s*<array>\s*<data>"
+)
+_RESPONSE_TAIL = re.compile(
+    r"\s*</data>\s*</array>\s*</value>\s*</param>\s*</params>\s*</methodResponse>\s*\Z"
+)
+_ROW_PENDING = re.compile(
+    r"\s*(?:\Z|</data>|<value>\s*<array>\s*<data>(?:(?!</?array>|<struct>).)*\Z)",
+    re.S,
+)
+_LIST_HEAD = b"<methodResponse><params><param><value><array><data>"
+_CELL_TAGS = re.compile(r"<value><(string|i4|i8|int)>")
+_ENTITY = re.compile(r"&(?:#(\d+)|#x([0-9a-fA-F]+)|(amp|lt|gt|quot|apos));")
+_ENTITIES = dict(amp="&", lt="<", gt=">", quot='"', apos="'")
+
+
+def _unescape(text):
+    """Replace XML character references and predefined entities."""
+    if "&#" not in text:
+        return (
+            text.replace("&lt;", "<")
+            .replace("&gt;", ">")
+            .replace("&quot;", '"')
+            .replace("&apos;", "'")
+            .replace("&amp;", "&")
+        )
+    return _ENTITY.sub(
+        lambda match: chr(int(match.group(1)))
+        if match.group(1)
+        else chr(int(match.group(2), 16))
+        if match.group(2)
+        else _ENTITIES[match.group(3)],
+        text,
+    )
+
+
+class MulticallParser(object):
+    """Fast incremental parser for XMLRPC responses that are a list of rows.
+
+    Results of C{d.multicall}, C{f.multicall}, C{t.multicall} and the like
+    are lists of flat rows containing just strings and integers. These are
+    decoded with a few regular expressions, typically several times faster
+    than an XML parser calling back into Python for every tag.
+
+    Anything else (faults, structs, doubles, nested lists, …) is handed over
+    to the generic L{ResponseParser}, so this can be used for any response.
+    The interface is the same as the one of L{ResponseParser}.
+    """
+
+    # Row patterns by the value types they contain
+    _typed_rows = {}
+
+    def __init__(self, streaming=False):
+        self.streaming = streaming
+        self._pending = b""  # data not decoded yet
+        self._text = ""  # decoded data not parsed yet
+        self._head = False
+        self._rows = deque()
+        self._typed = None  # row pattern and integer columns
+        self._fallback = None
+
+    def _switch(self, data=b""):
+        """Continue with the generic parser, on the data not parsed yet.
+
+        Rows parsed so far are kept, and the generic parser continues
+        the result list where they end.
+        """
+        self._fallback = ResponseParser(streaming=self.streaming)
+        if self._head:
+            self._fallback.feed(_LIST_HEAD)
+        self._fallback.feed(self._text.encode("utf-8") + data + self._pending)
+        self._pending = self._text = None
+
+    @classmethod
+    def _typed_row(cls, body):
+        """Return a pattern that matches rows of the same shape as the given one."""
+        tags = tuple(_CELL_TAGS.findall(body))
+        if len(tags) != body.count("<value>"):
+            return None  # some values are empty or untyped
+        try:
+            return cls._typed_rows[tags]
+        except KeyError:
+            pattern = r"\s*".join(
+                r"<value><{0}>({1})</{0}></value>".format(
+                    tag, r"[^<]*" if tag == "string" else r"[-+]?\d+"
+                )
+                for tag in tags
+            )
+            cls._typed_rows[tags] = (
+                re.compile(
+                    r"\s*<value>\s*<array>\s*<data>\s*"
+                    + pattern
+                    + r"\s*</data>\s*</array>\s*</value>"
+                ),
+                [idx for idx, tag in enumerate(tags) if tag != "string"],
+            )
+            return cls._typed_rows[tags]
+
+    @staticmethod
+    def _cells(body):
+        """Convert the values of one row."""
+        if "&" in body:
+            return [
+                int(num) if num else _unescape(text or untyped)
+                for num, text, untyped in _CELL_VALUES.findall(body)
+            ]
+        return [
+            int(num) if num else text or untyped
+            for num, text, untyped in _CELL_VALUES.findall(body)
+        ]
+
+    def _parse(self, data):
+        """Decode and parse complete rows in the given data."""
+        try:
+            text = self._text + data.decode("utf-8")
+        except UnicodeDecodeError:
+            self._switch(data)
+            return
+
+        pos = 0
+        if not self._head:
+            match = _RESPONSE_HEAD.match(text)
+            if not match:
+                self._text = text
+                self._switch()
+                return
+            self._head = True
+            pos = match.end()
+
+        typed = self._typed
+        while True:
+            match = typed and typed[0].match(text, pos)
+            if match:
+                # Same shape as the row before, so skip checking each value's type
+                row = list(match.groups())
+                for idx in typed[1]:
+                    row[idx] = int(row[idx])
+                if "&" in match.group(0):
+                    row = [
+                        _unescape(i) if type(i) is str and "&" in i else i for i in row
+                    ]
+            else:
+                match = _ROW_OR_SCALAR.match(text, pos)
+                if not match:
+                    if _ROW_PENDING.match(text, pos):
+                        break  # end of list, or the row is not complete yet
+                    # Not a flat row, so don't wait for more data
+                    self._text = text[pos:]
+                    self._switch()
+                    return
+                row, scalar = match.groups()
+                if scalar is None:
+                    self._typed = typed = self._typed_row(row) or typed
+                    row = self._cells(row)
+                else:
+                    row = self._cells(scalar)[0]
+            pos = match.end()
+            self._rows.append(row)
+        self._text = text[pos:]
+
+    def feed(self, data):
+        """Parse the next chunk of the response."""
+        if self._fallback:
+            self._fallback.feed(data)
+            return
+
+        self._pending += data
+        # Only complete values are parsed, which also keeps multi-byte characters intact
+        cut = self._pending.rfind(b"</value>")
+        if cut >= 0:
+            cut += len(b"</value>")
+            data, self._pending = self._pending[:cut], self._pending[cut:]
+            self._parse(data)
+
+    def rows(self):
+        """Yield the completed result list items that were not taken yet."""
+        if self.streaming:
+            while self._rows:
+                yield self._rows.popleft()
+        if self._fallback:
+            yield from self._fallback.rows()
+
+    def close(self):
+        """Finish parsing, and return the result or raise a received fault."""
+        if not self._fallback:
+            self._parse(self._pending)
+        if not self._fallback:
+            if _RESPONSE_TAIL.match(self._text):
+                return [] if self.streaming else list(self._rows)
+            self._switch()
+
+        result = self._fallback.close()
+        if self._head and not self.streaming:
+            result[:0] = self._rows
+        return result
+
+
+def _escape(text):
+    """Escape XML special characters."""
+    if "&" in text or "<" in text or ">" in text:
+        text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return text
+
+
+def _dump_value(value, out):
+    """Encode a single value, raise C{TypeError} for anything not handled here."""
+    kind = type(value)
+    if kind is str:
+        out += ("<value><string>", _escape(value), "</string></value>\n")
+    elif kind is int:
+        kind = "i4" if -(2 ** 31) <= value < 2 ** 31 else "i8"
+        out.append("<value><%s>%d</%s></value>\n" % (kind, value, kind))
+    elif kind is bool:
+        out.append("<value><boolean>%d</boolean></value>\n" % value)
+    elif kind is list or kind is tuple:
+        out.append("<value><array><data>\n")
+        for item in value:
+            _dump_value(item, out)
+        out.append("</data></array></value>\n")
+    elif kind is dict:
+        out.append("<value><struct>\n")
+        for key, val in value.items():
+            if type(key) is not str:
+                raise TypeError("Dictionary keys must be strings")
+            out += ("<member>\n<name>", _escape(key), "</name>\n")
+            _dump_value(val, out)
+            out.append("</member>\n")
+        out.append("</struct></value>\n")
+    else:
+        raise TypeError("Cannot quickly marshal %r objects" % kind)
+
+
+def dumps(params, methodname):
+    """Encode a method call, like C{xmlrpclib.dumps} does.
+
+    The types used in rTorrent calls are handled directly (which is a lot
+    faster), anything else is delegated to C{xmlrpclib}. In contrast to it,
+    integers beyond 32 bits are passed as C{i8} instead of failing.
+    """
+    out = [
+        "<?xml version='1.0'?>\n<methodCall>\n<methodName>%s</methodName>\n<params>\n"
+        % methodname
+    ]
+    try:
+        for param in params:
+            out.append("<param>\n")
+            _dump_value(param, out)
+            out.append("</param>\n")
+    except TypeError:
+        return xmlrpclib.dumps(params, methodname)
+    out.append("</params>\n</methodCall>\n")
+    return "".join(out)
+
+
 class RTorrentMethod(object):
     """Collect attribute accesses to build the final method name."""
 
@@ -70,6 +449,9 @@ class RTorrentMethod(object):
         )
     )
 
+    # Parser used for responses
+    PARSER = MulticallParser
+
     def __init__(self, proxy, method_name):
         self._proxy = proxy
         self._method_name = method_name
@@ -88,11 +470,148 @@ class RTorrentMethod(object):
             self._latency * 1000.0,
         )
 
+    def _prepare(self, args):
+        """Map the call arguments, and return them together with the encoded request."""
+        # Map multicall arguments
+        if not self._proxy._use_deprecated:
+            if self._method_name.endswith(".multicall") or self._method_name.endswith(
+                ".multicall.filtered"
+            ):
+                if self._method_name in ("d.multicall", "d.multicall.filtered"):
+                    args = (0,) + args
+                if config.debug:
+                    self._proxy.LOG.debug("BEFORE MAPPING: %r" % (args,))
+                if self._method_name == "system.multicall":
+                    for call in args[0]:
+                        call["methodName"] = self._proxy._map_call(call["methodName"])
+                else:
+                    args = args[0:2] + tuple(self._proxy._map_call(i) for i in args[2:])
+                if config.debug:
+                    self._proxy.LOG.debug("AFTER MAPPING: %r" % (args,))
+            elif self._method_name in self.NEEDS_FAKE_TARGET:
+                args = (0,) + args
+
+        # Prepare request
+        xmlreq = dumps(args, self._proxy._map_call(self._method_name)).encode()
+        ##xmlreq = xmlreq.replace('\n', '')
+        self._outbound = len(xmlreq)
+        self._proxy._outbound += self._outbound
+        self._proxy._outbound_max = max(self._proxy._outbound_max, self._outbound)
+
+        if config.debug:
+            self._proxy.LOG.debug("XMLRPC raw request: %r" % xmlreq)
+
+        return args, xmlreq
+
+    def _received(self, scgi_req):
+        """Update statistics after a response was received."""
+        self._proxy._inbound += self._inbound
+        self._proxy._inbound_max = max(self._proxy._inbound_max, self._inbound)
+        self._net_latency = scgi_req.latency
+        self._proxy._net_latency += self._net_latency
+
+    def _parse_failed(self, args, xmlreq, chunks, fail_silently):
+        """Handle a fault or broken response, always re-raises the current exception."""
+        exc_type, exc = sys.exc_info()[:2]
+        if (
+            exc_type is xmlrpclib.Fault
+            and exc.faultCode == -501
+            and exc.faultString == "Could not find info-hash."
+        ):
+            raise HashNotFound(
+                "Unknown hash for {}({}) @ {}",
+                self._method_name,
+                args[0] if args else "",
+                self._proxy._url,
+            )
+
+        if not fail_silently:
+            # Dump the bad packet, then re-raise
+            filename = "/tmp/xmlrpc2scgi-%s.xml" % os.getuid()
+            handle = open(filename, "wb")
+            try:
+                handle.write(b"REQUEST\n")
+                handle.write(xmlreq)
+                handle.write(b"\nRESPONSE\n")
+                handle.writelines(chunks or [b"(streamed)"])
+                print(
+                    "INFO: Bad data packets written to %r" % filename,
+                    file=sys.stderr,
+                )
+            finally:
+                handle.close()
+        raise  # pylint: disable=misplaced-bare-raise
+
+    def _stream(self, args, fail_silently):
+        """Execute the method call, and yield the result list's items as they arrive."""
+        start = time.time()
+        try:
+            args, xmlreq = self._prepare(args)
+            scgi_req = xmlrpc2scgi.SCGIRequest(self._proxy._transport)
+            parser = self.PARSER(streaming=True)
+            self._inbound = 0
+            try:
+                for chunk in scgi_req.stream(xmlreq):
+                    self._inbound += len(chunk)
+                    parser.feed(chunk)
+                    for row in parser.rows():
+                        yield row
+                parser.close()
+            except PARSE_ERRORS:
+                self._parse_failed(args, xmlreq, None, fail_silently)
+            finally:
+                self._received(scgi_req)
+
+            for row in parser.rows():
+                yield row
+        finally:
+            self._finished(start, args, "streamed in")
+
+    def _finished(self, start, args, verb):
+        """Update the latency statistics of a call started at C{start}."""
+        self._latency = time.time() - start
+        self._proxy._latency += self._latency
+
+        if config.debug:
+            self._proxy.LOG.debug(
+                "%s(%s) %s %.3f secs"
+                % (
+                    self._method_name,
+                    ", ".join(repr(i) for i in args),
+                    verb,
+                    self._latency,
+                )
+            )
+
+    @staticmethod
+    def _result(result, flatten):
+        """Return a parsed C{result}, flattened if requested.
+
+        A fault in a multicall result that cannot be flattened is raised
+        as L{error.LoggableError}.
+        """
+        try:
+            return sum(result, []) if flatten else result
+        except TypeError:
+            if (
+                result
+                and isinstance(result, list)
+                and isinstance(result[0], dict)
+                and "faultCode" in result[0]
+            ):
+                raise error.LoggableError(
+                    "XMLRPC error in multicall: " + repr(result[0])
+                )
+            else:
+                raise
+
     def __call__(self, *args, **kwargs):
         """Execute the method call.
 
         `raw_xml=True` returns the unparsed XML-RPC response.
         `flatten=True` removes one nesting level in a result list (useful for multicalls).
+        `stream=True` returns an iterator over the items of a result list,
+        yielding them while the response is still coming in.
         """
         self._proxy._requests += 1
         start = time.time()
@@ -100,125 +619,41 @@ class RTorrentMethod(object):
         flatten = kwargs.get("flatten", False)
         fail_silently = kwargs.get("fail_silently", False)
 
-        try:
-            # Map multicall arguments
-            if not self._proxy._use_deprecated:
-                if self._method_name.endswith(
-                    ".multicall"
-                ) or self._method_name.endswith(".multicall.filtered"):
-                    if self._method_name in ("d.multicall", "d.multicall.filtered"):
-                        args = (0,) + args
-                    if config.debug:
-                        self._proxy.LOG.debug("BEFORE MAPPING: %r" % (args,))
-                    if self._method_name == "system.multicall":
-                        for call in args[0]:
-                            call["methodName"] = self._proxy._map_call(
-                                call["methodName"]
-                            )
-                    else:
-                        args = args[0:2] + tuple(
-                            self._proxy._map_call(i) for i in args[2:]
-                        )
-                    if config.debug:
-                        self._proxy.LOG.debug("AFTER MAPPING: %r" % (args,))
-                elif self._method_name in self.NEEDS_FAKE_TARGET:
-                    args = (0,) + args
+        if kwargs.get("stream", False):
+            return self._stream(args, fail_silently)
 
-            # Prepare request
-            xmlreq = xmlrpclib.dumps(
-                args, self._proxy._map_call(self._method_name)
-            ).encode()
-            ##xmlreq = xmlreq.replace('\n', '')
-            self._outbound = len(xmlreq)
-            self._proxy._outbound += self._outbound
-            self._proxy._outbound_max = max(self._proxy._outbound_max, self._outbound)
-
-            if config.debug:
-                self._proxy.LOG.debug("XMLRPC raw request: %r" % xmlreq)
+        try:
+            args, xmlreq = self._prepare(args)
 
             # Send it
             scgi_req = xmlrpc2scgi.SCGIRequest(self._proxy._transport)
-            xmlresp = scgi_req.send(xmlreq)
-            self._inbound = len(xmlresp)
-            self._proxy._inbound += self._inbound
-            self._proxy._inbound_max = max(self._proxy._inbound_max, self._inbound)
-            self._net_latency = scgi_req.latency
-            self._proxy._net_latency += self._net_latency
-
-            xmlresp = xmlresp.decode("utf-8")
+
             # Return raw XML response?
             if raw_xml:
-                return xmlresp
-
-            # This fixes a bug with the Python xmlrpclib module
-            # (has no handler for <i8> in some versions)
-            xmlresp = xmlresp.replace("<i8>", "<i4>").replace("</i8>", "</i4>")
-
+                xmlresp = scgi_req.send(xmlreq)
+                self._inbound = len(xmlresp)
+                self._received(scgi_req)
+                return xmlresp.decode("utf-8")
+
+            # Deserialize data while it comes in
+            parser = self.PARSER()
+            chunks = []
+            self._inbound = 0
             try:
-                # Deserialize data
-                result = xmlrpclib.loads(xmlresp.encode("utf-8"))[0][0]
-            except (KeyboardInterrupt, SystemExit):
-                # Don't catch these
-                raise
-            except:
-                exc_type, exc = sys.exc_info()[:2]
-                if (
-                    exc_type is xmlrpclib.Fault
-                    and exc.faultCode == -501
-                    and exc.faultString == "Could not find info-hash."
-                ):
-                    raise HashNotFound(
-                        "Unknown hash for {}({}) @ {}",
-                        self._method_name,
-                        args[0] if args else "",
-                        self._proxy._url,
-                    )
-
-                if not fail_silently:
-                    # Dump the bad packet, then re-raise
-                    filename = "/tmp/xmlrpc2scgi-%s.xml" % os.getuid()
-                    handle = open(filename, "wb")
-                    try:
-                        handle.write(b"REQUEST\n")
-                        handle.write(xmlreq)
-                        handle.write(b"\nRESPONSE\n")
-                        handle.write(xmlresp.encode("utf-8"))
-                        print(
-                            "INFO: Bad data packets written to %r" % filename,
-                            file=sys.stderr,
-                        )
-                    finally:
-                        handle.close()
-                raise
-            else:
                 try:
-                    return sum(result, []) if flatten else result
-                except TypeError:
-                    if (
-                        result
-                        and isinstance(result, list)
-                        and isinstance(result[0], dict)
-                        and "faultCode" in result[0]
-                    ):
-                        raise error.LoggableError(
-                            "XMLRPC error in multicall: " + repr(result[0])
-                        )
-                    else:
-                        raise
+                    for chunk in scgi_req.stream(xmlreq):
+                        chunks.append(chunk)
+                        self._inbound += len(chunk)
+                        parser.feed(chunk)
+                finally:
+                    self._received(scgi_req)
+                result = parser.close()
+            except PARSE_ERRORS:
+                self._parse_failed(args, xmlreq, chunks, fail_silently)
+            else:
+                return self._result(result, flatten)
         finally:
-            # Calculate latency
-            self._latency = time.time() - start
-            self._proxy._latency += self._latency
-
-            if config.debug:
-                self._proxy.LOG.debug(
-                    "%s(%s) took %.3f secs"
-                    % (
-                        self._method_name,
-                        ", ".join(repr(i) for i in args),
-                        self._latency,
-                    )
-                )
+            self._finished(start, args, "took")
 
 
 class RTorrentProxy(object):
@@ -228,11 +663,19 @@ class RTorrentProxy(object):
     something like C{proxy.system.client_version()}.
     """
 
+    # Transport classes by URL scheme
+    TRANSPORTS = xmlrpc2scgi.TRANSPORTS
+
     def __init__(self, url, mapping=None):
         self.LOG = pymagic.get_class_logger(self)
         self._url = os.path.expandvars(url)
         try:
-            self._transport = xmlrpc2scgi.transport_from_url(self._url)
+            self._transport = xmlrpc2scgi.transport_from_url(
+                self._url,
+                self.TRANSPORTS,
+                pool_size=config.scgi_pool_size,
+                idle_timeout=config.scgi_pool_idle,
+            )
         except socket.gaierror as exc:
             raise XmlRpcError("Bad XMLRPC URL {0}: {1}", self._url, exc)
         self._versions = ("", "")
@@ -250,9 +693,19 @@ class RTorrentProxy(object):
         self._latency = 0.0
         self._net_latency = 0.0
 
+    def stats(self):
+        """Return a snapshot of the statistics, as a bunch."""
+        return Bunch(
+            requests=self._requests,
+            outbound=self._outbound,
+            inbound=self._inbound,
+            latency=self._latency,
+            net_latency=self._net_latency,
+        )
+
     def __str__(self):
         """Return statistics."""
-        return "%d req, out %s [%s max], in %s [%s max], %.3fms/%.3fms avg latency" % (
+        result = "%d req, out %s [%s max], in %s [%s max], %.3fms/%.3fms avg latency" % (
             self._requests,
             fmt.human_size(self._outbound).strip(),
             fmt.human_size(self._outbound_max).strip(),
@@ -261,31 +714,41 @@ class RTorrentProxy(object):
             self._net_latency * 1000.0 / self._requests,
             self._latency * 1000.0 / self._requests,
         )
+        pool = getattr(self._transport, "pool", None)
+        if pool is not None:
+            result += ", " + str(pool)
+        return result
 
     def _set_mappings(self):
         """Set command mappings according to rTorrent version."""
         try:
-            self._versions = (
-                self.system.client_version(),
-                self.system.library_version(),
+            return self._merge_mappings(
+                (
+                    self.system.client_version(),
+                    self.system.library_version(),
+                )
             )
-            self._version_info = tuple(int(i) for i in self._versions[0].split("."))
-            self._use_deprecated = self._version_info < (0, 8, 7)
-
-            # Merge mappings for this version
-            self._mapping = self._mapping.copy()
-            for key, val in sorted(
-                i for i in vars(config).items() if i[0].startswith("xmlrpc_")
-            ):
-                map_version = tuple(int(i) for i in key.split("_")[1:])
-                if map_version <= self._version_info:
-                    if config.debug:
-                        self.LOG.debug("MAPPING for %r added: %r" % (map_version, val))
-                    self._mapping.update(val)
-            self._fix_mappings()
         except ERRORS as exc:
             raise error.LoggableError("Can't connect to %s (%s)" % (self._url, exc))
 
+    def _merge_mappings(self, versions):
+        """Set command mappings for the given client and library versions."""
+        self._versions = versions
+        self._version_info = tuple(int(i) for i in self._versions[0].split("."))
+        self._use_deprecated = self._version_info < (0, 8, 7)
+
+        # Merge mappings for this version
+        self._mapping = self._mapping.copy()
+        for key, val in sorted(
+            i for i in vars(config).items() if i[0].startswith("xmlrpc_")
+        ):
+            map_version = tuple(int(i) for i in key.split("_")[1:])
+            if map_version <= self._version_info:
+                if config.debug:
+                    self.LOG.debug("MAPPING for %r added: %r" % (map_version, val))
+                self._mapping.update(val)
+        self._fix_mappings()
+
         return self._versions, self._version_info
 
     def _fix_mappings(self):
@@ -320,3 +783,105 @@ class RTorrentProxy(object):
     def __repr__(self):
         """Return info & statistics."""
         return "%s(%r) [%s]" % (self.__class__.__name__, self._url, self)
+
+
+class AsyncRTorrentMethod(RTorrentMethod):
+    """Method calls of an L{AsyncRTorrentProxy}, which must be awaited."""
+
+    async def _stream(self, args, fail_silently):
+        """Execute the method call, and yield the result list's items as they arrive."""
+        start = time.time()
+        try:
+            args, xmlreq = self._prepare(args)
+            scgi_req = xmlrpc2scgi.SCGIRequest(self._proxy._transport)
+            parser = self.PARSER(streaming=True)
+            self._inbound = 0
+            try:
+                async for chunk in scgi_req.stream_async(xmlreq):
+                    self._inbound += len(chunk)
+                    parser.feed(chunk)
+                    for row in parser.rows():
+                        yield row
+                parser.close()
+            except PARSE_ERRORS:
+                self._parse_failed(args, xmlreq, None, fail_silently)
+            finally:
+                self._received(scgi_req)
+
+            for row in parser.rows():
+                yield row
+        finally:
+            self._finished(start, args, "streamed in")
+
+    async def _call(self, args, raw_xml, flatten, fail_silently):
+        """Execute the method call."""
+        start = time.time()
+        try:
+            args, xmlreq = self._prepare(args)
+            scgi_req = xmlrpc2scgi.SCGIRequest(self._proxy._transport)
+            parser = self.PARSER()
+            chunks = []
+            self._inbound = 0
+            try:
+                try:
+                    async for chunk in scgi_req.stream_async(xmlreq):
+                        chunks.append(chunk)
+                        self._inbound += len(chunk)
+                        if not raw_xml:
+                            parser.feed(chunk)
+                finally:
+                    self._received(scgi_req)
+                if raw_xml:
+                    return b"".join(chunks).decode("utf-8")
+                result = parser.close()
+            except PARSE_ERRORS:
+                self._parse_failed(args, xmlreq, chunks, fail_silently)
+            else:
+                return self._result(result, flatten)
+        finally:
+            self._finished(start, args, "took")
+
+    def __call__(self, *args, **kwargs):
+        """Return an awaitable for the method call.
+
+        Takes the same keyword arguments as L{RTorrentMethod}; with
+        `stream=True`, an async iterator is returned instead.
+        """
+        self._proxy._requests += 1
+        fail_silently = kwargs.get("fail_silently", False)
+        if kwargs.get("stream", False):
+            return self._stream(args, fail_silently)
+
+        return self._call(
+            args,
+            kwargs.get("raw_xml", False),
+            kwargs.get("flatten", False),
+            fail_silently,
+        )
+
+
+class AsyncRTorrentProxy(RTorrentProxy):
+    """Proxy to rTorrent's XMLRPC interface, for use with asyncio.
+
+    Method calls return awaitables, e.g. C{await proxy.system.client_version()}.
+    Each call uses its own connection, so any number of calls to one or
+    several rTorrent instances can be in flight at the same time.
+    """
+
+    TRANSPORTS = xmlrpc2scgi.ASYNC_TRANSPORTS
+
+    async def _set_mappings(self):
+        """Set command mappings according to rTorrent version."""
+        try:
+            return self._merge_mappings(
+                (
+                    await self.system.client_version(),
+                    await self.system.library_version(),
+                )
+            )
+        except ERRORS as exc:
+            raise error.LoggableError("Can't connect to %s (%s)" % (self._url, exc))
+
+    def __getattr__(self, attr):
+        """Return a method object for accesses to virtual attributes."""
+        return AsyncRTorrentMethod(self, attr)
@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Benchmark columnar filtering and statistics against item-by-item processing.
+
+    Usage: python3 src/scripts/benchmark-columns.py [ITEMS]
+"""
+import sys
+import time
+import random
+
+from pyrosimple.util import matching
+from pyrosimple.torrent import columns, engine, rtorrent
+
+
+CONDITIONS = [
+    "size>1g",
+    "is_complete=1 ratio>1.5 [ up>0 OR loaded>2d ]",
+    "prio=+0 size<700m completed<2h",
+]
+FIELDS = ["size", "ratio", "up", "loaded"]
+
+
+def timed(title, func, *args):
+    """Call C{func} and report the time it took."""
+    start = time.perf_counter()
+    result = func(*args)
+    print("%-32s %8.3f secs" % (title, time.perf_counter() - start))
+    return result
+
+
+def per_item(match, items):
+    """Filter and summarize item by item."""
+    matches = [item for item in items if match(item)]
+    return [sum(getattr(item, name) or 0 for item in matches) for name in FIELDS]
+
+
+def columnar(matcher, result):
+    """Filter and summarize using arrays."""
+    matches = result.filter(matcher)
+    return [matches.stats(name).sum for name in FIELDS]
+
+
+def build(items, names):
+    """Build the columns for the given field names."""
+    result = columns.ColumnarItems(items)
+    for name in names:
+        result.column(name)
+    return result
+
+
+def main():
+    """Benchmark entry point."""
+    if columns.numpy is None:
+        sys.exit("NumPy is not installed")
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rnd = random.Random(42)
+    now = int(time.time())
+    items = [
+        rtorrent.RtorrentItem(
+            None,
+            dict(
+                hash="%040X" % rnd.getrandbits(160),
+                name="Some.Item.%d" % i,
+                size=rnd.randrange(2 ** 32),
+                ratio=rnd.randrange(3000),
+                up=rnd.randrange(2) * rnd.randrange(2 ** 20),
+                prio=rnd.randrange(4),
+                is_complete=rnd.randrange(2),
+                custom_tm_loaded=str(now - rnd.randrange(86400 * 30)),
+                custom_tm_completed=rnd.choice(["", str(now - rnd.randrange(86400))]),
+            ),
+        )
+        for i in range(size)
+    ]
+    print("%d items" % len(items))
+
+    parser = matching.ConditionParser(engine.FieldDefinition.lookup, "name")
+    trees = [parser.parse(condition) for condition in CONDITIONS]
+    names = set(FIELDS).union(*(tree.field_names() for tree in trees))
+    result = timed("build %d columns" % len(names), build, items, names)
+
+    for condition, tree in zip(CONDITIONS, trees):
+        print("\n%s" % condition)
+        expected = timed("per item (compiled)", per_item, tree.compile().match, items)
+        sums = timed("columnar", columnar, tree, result)
+        assert all(abs(a - b) <= 1e-6 * abs(a) for a, b in zip(expected, sums)), (
+            expected,
+            sums,
+        )
+
+if __name__ == "__main__":
+    main()
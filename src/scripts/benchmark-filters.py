@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Benchmark compiled filters against the interpreted filter tree.
+
+    Usage: python3 src/scripts/benchmark-filters.py [ITEMS]
+"""
+import sys
+import time
+import random
+
+from pyrosimple.util import matching
+from pyrosimple.torrent import engine, rtorrent
+
+
+CONDITIONS = [
+    "is_complete=1",
+    "name=*x264* size>1g",
+    "is_open=0 is_complete=1 ratio>1.5 [ up>0 OR loaded>2d ]",
+    "[ NOT name=/sample/ ] tagged=foo,bar prio=+0 size<700m",
+]
+
+
+def timed(title, func, *args):
+    """Call C{func} and report the time it took."""
+    start = time.perf_counter()
+    result = func(*args)
+    print("%-32s %8.3f secs" % (title, time.perf_counter() - start))
+    return result
+
+
+def count(match, items):
+    """Return the number of matching items."""
+    return sum(1 for item in items if match(item))
+
+
+def main():
+    """Benchmark entry point."""
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rnd = random.Random(42)
+    now = int(time.time())
+    items = [
+        rtorrent.RtorrentItem(
+            None,
+            dict(
+                hash="%040X" % rnd.getrandbits(160),
+                name="Some.Item.%d.%s" % (i, "x264" if i % 3 else "Sample"),
+                size=rnd.randrange(2 ** 32),
+                ratio=rnd.randrange(3000),
+                up=rnd.randrange(2) * rnd.randrange(2 ** 20),
+                prio=rnd.randrange(4),
+                is_open=rnd.randrange(2),
+                is_complete=rnd.randrange(2),
+                custom_tm_loaded=str(now - rnd.randrange(86400 * 30)),
+                custom_tags=rnd.choice(["", "foo", "bar baz", "foo bar"]),
+            ),
+        )
+        for i in range(size)
+    ]
+    print("%d items" % len(items))
+
+    parser = matching.ConditionParser(engine.FieldDefinition.lookup, "name")
+    for condition in CONDITIONS:
+        tree = parser.parse(condition)
+        print("\n%s" % condition)
+        expected = timed("interpreted", count, tree.match, items)
+        compiled = timed("compile", tree.compile)
+        result = timed("compiled", count, compiled.match, items)
+        assert result == expected, (result, expected)
+
+
+if __name__ == "__main__":
+    main()
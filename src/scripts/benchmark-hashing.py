@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Benchmark memory use and throughput of buffered vs. memory-mapped hashing.
+
+    Each run happens in a fresh process, on sparse files (so the disk is not
+    the bottleneck), and reports the peak RSS of that process.
+
+    Usage: python3 src/scripts/benchmark-hashing.py [GIB [WORKERS]]
+"""
+import os
+import sys
+import time
+import shutil
+import resource
+import tempfile
+import subprocess
+
+import bencode
+
+from pyrosimple.util import metafile
+
+
+TRACKER = "http://tracker.example.com/announce"
+
+
+def run(action, datapath, use_mmap, workers):
+    """Create a metafile for, or check, C{datapath}, in this process."""
+    torrent = metafile.Metafile(datapath + ".torrent")
+    torrent.hash_mmap = int(use_mmap)
+    torrent.hash_workers = int(workers)
+
+    start = time.perf_counter()
+    if action == "mktor":
+        torrent.create(datapath, TRACKER, no_date=True)
+    else:
+        with open(torrent.filename, "rb") as handle:
+            meta = bencode.decode(handle.read())
+        assert torrent.check(meta, datapath)
+    elapsed = time.perf_counter() - start
+
+    print("%f %d" % (elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def measured(action, datapath, size, use_mmap, workers):
+    """Run and report one action in a child process."""
+    output = subprocess.check_output(
+        [sys.executable, __file__, "--run", action, datapath, str(use_mmap), workers]
+    )
+    elapsed, maxrss = output.split()
+    print(
+        "%-6s %-9s %2s worker(s) %8.3f secs %8.1f MiB/s %8.1f MiB peak RSS"
+        % (
+            action,
+            "mmap" if use_mmap else "buffered",
+            workers,
+            float(elapsed),
+            size / 1024.0 ** 2 / float(elapsed),
+            int(maxrss) / 1024.0,
+        )
+    )
+
+
+def main():
+    """Benchmark entry point."""
+    if sys.argv[1:2] == ["--run"]:
+        return run(*sys.argv[2:])
+
+    size = int(float(sys.argv[1] if len(sys.argv) > 1 else 4) * 1024 ** 3)
+    workers = sys.argv[2] if len(sys.argv) > 2 else str(os.cpu_count())
+    tempdir = tempfile.mkdtemp(prefix="pyro-bench-")
+    try:
+        datapath = os.path.join(tempdir, "data")
+        os.mkdir(datapath)
+        for idx in range(4):
+            with open(os.path.join(datapath, "file%d.bin" % idx), "wb") as handle:
+                handle.truncate(size // 4 + idx * 12345)
+        size = metafile.Metafile(None, datapath)._calc_size()
+        print("%d sparse files, %.1f GiB" % (4, size / 1024.0 ** 3))
+
+        # Fill the page cache, so the first run is not at a disadvantage
+        subprocess.check_output(
+            [sys.executable, __file__, "--run", "mktor", datapath, "0", "1"]
+        )
+
+        for action in ("mktor", "check"):
+            for use_mmap in (0, 1):
+                for count in sorted({"1", workers}, key=int):
+                    measured(action, datapath, size, use_mmap, count)
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == "__main__":
+    main()
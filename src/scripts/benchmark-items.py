@@ -0,0 +1,101 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Benchmark memory use and construction time of download items.
+
+    Usage: python3 src/scripts/benchmark-items.py [ITEMS]
+"""
+import gc
+import sys
+import time
+import random
+import tracemalloc
+
+from pyrosimple.torrent import engine, rtorrent
+
+
+NAMES = [
+    "hash",
+    "name",
+    "size",
+    "ratio",
+    "up",
+    "down",
+    "prio",
+    "is_open",
+    "is_complete",
+    "custom_tm_loaded",
+    "custom_tags",
+]
+
+
+class DictItem(rtorrent.RtorrentItem):
+    """Item with an instance dict, and its fields in a dict (the former layout)."""
+
+
+def rows(size):
+    """Generate multicall rows, as they come from the XMLRPC parser."""
+    rnd = random.Random(42)
+    now = int(time.time())
+    for i in range(size):
+        yield [
+            "%040X" % rnd.getrandbits(160),
+            "Some.Item.%d" % i,
+            rnd.randrange(2 ** 32),
+            rnd.randrange(3000),
+            rnd.randrange(2 ** 20),
+            rnd.randrange(2 ** 20),
+            rnd.randrange(4),
+            rnd.randrange(2),
+            rnd.randrange(2),
+            str(now - rnd.randrange(86400 * 30)),
+            rnd.choice(["", "foo", "bar baz"]),
+        ]
+
+
+def as_dicts(data):
+    """Build items with their fields in a dict."""
+    return [DictItem(None, zip(NAMES, row)) for row in data]
+
+
+def as_records(data):
+    """Build items with their fields in a L{FieldRecord}."""
+    index = engine.FieldRecord.make_index(NAMES)
+    return [rtorrent.RtorrentItem(None, engine.FieldRecord(index, row)) for row in data]
+
+
+def measured(title, build, size):
+    """Report the time C{build} takes, and the memory its items keep."""
+    data = list(rows(size))
+    gc.collect()
+    start = time.perf_counter()
+    build(data)
+    elapsed = time.perf_counter() - start
+
+    # Measure again with tracing on, with the row data included, since items keep it
+    gc.collect()
+    tracemalloc.start()
+    data = list(rows(size))
+    items = build(data)
+    del data
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        "%-16s %8.3f secs %8.1f MiB %6d bytes/item"
+        % (title, elapsed, used / 1024.0 ** 2, used // size)
+    )
+    return items
+
+
+def main():
+    """Benchmark entry point."""
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print("%d items with %d fields" % (size, len(NAMES)))
+
+    measured("rows only", list, size)
+    measured("dict", as_dicts, size)
+    items = measured("compact", as_records, size)
+    assert items[-1].name == "Some.Item.%d" % (size - 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Benchmark the XMLRPC codecs on a synthetic multicall response.
+
+    Usage: python3 src/scripts/benchmark-xmlrpc.py [ROWS]
+"""
+import sys
+import time
+import random
+from xmlrpc import client as xmlrpclib
+
+from pyrosimple.util import xmlrpc
+
+
+def timed(title, func, *args):
+    """Call C{func} and report the time it took."""
+    start = time.perf_counter()
+    result = func(*args)
+    print("%-32s %8.3f secs" % (title, time.perf_counter() - start))
+    return result
+
+
+def parse(parser_class, data, chunk_size=65536):
+    """Feed data in chunks to a parser."""
+    parser = parser_class()
+    for pos in range(0, len(data), chunk_size):
+        parser.feed(data[pos : pos + chunk_size])
+    return parser.close()
+
+
+def main():
+    """Benchmark entry point."""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rnd = random.Random(42)
+    data = [
+        [
+            "%040X" % rnd.getrandbits(160),
+            "Some.Item.Name.%d.%s" % (i, "<x264>&more" if i % 20 == 0 else "x264"),
+            rnd.randrange(2 ** 31),
+            rnd.randrange(2),
+            rnd.randrange(2),
+            "/var/torrent/data/%d" % i,
+            rnd.randrange(1600000000, 1700000000),
+            "Tracker: [Tried all trackers.]" if i % 10 == 0 else "",
+        ]
+        for i in range(rows)
+    ]
+    response = xmlrpclib.dumps((data,), methodresponse=True).replace("int>", "i8>")
+    response = response.encode("utf-8")
+    print("%d rows, %.1f MiB response" % (rows, len(response) / 1024.0 ** 2))
+
+    expected = timed("xmlrpclib.loads", xmlrpclib.loads, response)[0][0]
+    for parser_class in (xmlrpc.ResponseParser, xmlrpc.MulticallParser):
+        result = timed(parser_class.__name__, parse, parser_class, response)
+        assert result == expected, parser_class
+
+    calls = [
+        dict(methodName="d.custom.set", params=[row[0], "tag", row[1]]) for row in data
+    ]
+    expected = timed("xmlrpclib.dumps", xmlrpclib.dumps, (calls,), "system.multicall")
+    result = timed("xmlrpc.dumps", xmlrpc.dumps, (calls,), "system.multicall")
+    assert xmlrpclib.loads(result) == xmlrpclib.loads(expected)
+
+
+if __name__ == "__main__":
+    main()
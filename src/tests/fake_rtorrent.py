@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=
+""" Fake rTorrent XMLRPC server for tests.
+
+    Copyright (c) 2011 The PyroScope Project <pyroscope.project@gmail.com>
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to the Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+import contextlib
+import socketserver
+
+from xmlrpc import client as xmlrpclib
+
+from pyrosimple import config
+from pyrosimple.torrent import rtorrent
+
+
+def download_methods(items, default=0):
+    """Return methods serving the given items to C{d.multicall} calls.
+
+    Each item maps command names like C{d.name} to values, C{default}
+    is returned for any others. Single-item getters like C{d.name(hash)}
+    work too. Sub-multicalls like C{f.multicall} return the rows stored
+    under that name, also when nested in a C{d.multicall}.
+    """
+    tempdir = tempfile.gettempdir()
+
+    def find(infohash):
+        for item in items:
+            if item["d.hash"] == infohash:
+                return item
+        raise xmlrpclib.Fault(-501, "Could not find info-hash.")
+
+    def getter(method, infohash, *args):
+        if method.endswith(".multicall"):
+            return find(infohash).get(method, [])
+        return find(infohash).get("=".join((method,) + args), default)
+
+    def value(item, cmd):
+        if ".multicall=" in cmd:
+            return item.get(cmd.split("=", 1)[0], [])
+        return item.get(cmd.rstrip("="), default)
+
+    def multicall(_, viewname, *commands):
+        return [
+            [value(item, cmd) for cmd in commands]
+            for item in items
+            if viewname in item.get("d.views", [viewname])
+        ]
+
+    return {
+        "*": getter,
+        "session.name": lambda *_: "fake",
+        "session.path": lambda *_: tempdir,
+        "directory.default": lambda *_: tempdir,
+        "system.time_usec": lambda *_: 2 ** 31 - 1,
+        "view.size": lambda _, viewname: len(multicall(_, viewname)),
+        "d.multicall": multicall,
+        "d.multicall.filtered": lambda _, view, __, *cmds: multicall(_, view, *cmds),
+    }
+
+
+class FakeRtorrent(object):
+    """A SCGI server on a UNIX domain socket that answers XMLRPC calls.
+
+    C{methods} maps method names to callables getting the call parameters,
+    a handler for the name C{*} gets calls of any other method, with the
+    method name prepended to the parameters.
+    """
+
+    def __init__(self, methods=None, keep_alive=False):
+        self.methods = dict(
+            {
+                "system.client_version": lambda *_: "0.9.8",
+                "system.library_version": lambda *_: "0.13.8",
+            }
+        )
+        self.methods.update(methods or {})
+        self.keep_alive = keep_alive
+        self.calls = []
+        self.connections = 0
+        self.tempdir = tempfile.mkdtemp(prefix="fake-rtorrent-")
+        self.path = os.path.join(self.tempdir, "scgi.socket")
+        self.url = "scgi://" + self.path
+        self.server = None
+
+    def __enter__(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            "Handle one SCGI connection."
+
+            def handle(self):
+                fake.connections += 1
+                while True:
+                    size = b""
+                    while not size.endswith(b":"):
+                        char = self.rfile.read(1)
+                        if not char:
+                            return
+                        size += char
+                    headers = self.rfile.read(int(size[:-1]) + 1)[:-1].split(b"\0")
+                    headers = dict(zip(headers[::2], headers[1::2]))
+                    body = self.rfile.read(int(headers[b"CONTENT_LENGTH"]))
+                    payload = fake.dispatch(body)
+                    self.wfile.write(
+                        b"Status: 200 OK\r\nContent-Type: text/xml\r\n"
+                        + (b"Connection: keep-alive\r\n" if fake.keep_alive else b"")
+                        + b"Content-Length: %d\r\n\r\n" % len(payload)
+                        + payload
+                    )
+                    self.wfile.flush()
+                    if not fake.keep_alive:
+                        return
+
+        self.server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self.server.daemon_threads = True
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        return self
+
+    def __exit__(self, *_):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def call(self, method, params):
+        """Call a single method."""
+        self.calls.append(method)
+        if method == "system.multicall":
+            result = []
+            for call in params[0]:
+                try:
+                    result.append([self.call(call["methodName"], call["params"])])
+                except xmlrpclib.Fault as exc:
+                    result.append(
+                        dict(faultCode=exc.faultCode, faultString=exc.faultString)
+                    )
+            return result
+        try:
+            handler = self.methods[method]
+        except KeyError:
+            if "*" not in self.methods:
+                raise xmlrpclib.Fault(-506, "Method '%s' not defined" % method)
+            handler = self.methods["*"]
+            params = (method,) + tuple(params)
+        return handler(*params)
+
+    def dispatch(self, body):
+        """Answer an XMLRPC request."""
+        params, method = xmlrpclib.loads(body)
+        try:
+            response = xmlrpclib.dumps((self.call(method, params),), methodresponse=True)
+        except xmlrpclib.Fault as exc:
+            response = xmlrpclib.dumps(exc, methodresponse=True)
+        return response.encode("utf-8")
+
+
+class FakeEngineTest(unittest.TestCase):
+    """Base class for tests of an L{RtorrentEngine<rtorrent.RtorrentEngine>}
+    connected to a L{FakeRtorrent}.
+
+    The config values tests change are restored after each test.
+    """
+
+    # Download items served by L{fake_engine}, see L{download_methods}
+    ITEMS = []
+
+    # Names of the config values restored after each test
+    CONFIG_NAMES = ("scgi_url", "fast_query", "metafile_cache")
+
+    def setUp(self):
+        self.saved_config = dict((i, getattr(config, i)) for i in self.CONFIG_NAMES)
+
+    def tearDown(self):
+        for name, value in self.saved_config.items():
+            setattr(config, name, value)
+
+    @contextlib.contextmanager
+    def fake_engine(self, methods=None):
+        """Start a fake rTorrent, and yield it together with an engine using it.
+
+        @param methods: The methods of the fake, those serving L{ITEMS}
+            by default.
+        """
+        if methods is None:
+            methods = download_methods(self.ITEMS)
+        with FakeRtorrent(methods) as fake:
+            config.scgi_url = fake.url
+            yield fake, rtorrent.RtorrentEngine()
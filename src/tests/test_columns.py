@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=
+""" Columnar result set tests.
+
+    Copyright (c) 2011 The PyroScope Project <pyroscope.project@gmail.com>
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to the Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+import logging
+import unittest
+
+from pyrosimple.util import matching
+from pyrosimple.util.parts import Bunch
+from pyrosimple.torrent import columns, engine
+
+log = logging.getLogger(__name__)
+log.trace("module loaded")
+
+
+@unittest.skipUnless(columns.numpy, "needs NumPy")
+class ColumnarItemsTest(unittest.TestCase):
+    DATA = [
+        Bunch(name="a", size=1024, ratio=0.5, leechtime=None, kind="mkv"),
+        Bunch(name="b", size=2 ** 40, ratio=2.0, leechtime=3600, kind="avi"),
+        Bunch(name="c", size=0, ratio=0.0, leechtime=60, kind="mkv"),
+    ]
+    CASES = [
+        "size>1k",
+        "size=0",
+        "ratio>1 OR name=a",
+        "size>0 kind=mkv",
+        "[ NOT ratio=0 ] size<1g",
+        "leechtime>30m",
+        "leechtime=-0",
+        "leechtime=-2h",
+    ]
+
+    def setUp(self):
+        self.items = columns.ColumnarItems(self.DATA)
+        self.parser = matching.ConditionParser(engine.FieldDefinition.lookup, "name")
+
+    def test_columns(self):
+        self.assertEqual("i", self.items.column("size").dtype.kind)
+        self.assertEqual([0, 3600, 60], list(self.items.column("leechtime")))
+        self.assertEqual([True, False, False], list(self.items.nulls("leechtime")))
+        self.assertIsNone(self.items.column("kind"))
+
+    def test_mask(self):
+        for cond in self.CASES:
+            matcher = self.parser.parse(cond)
+            expected = [i.name for i in self.DATA if matcher.match(i)]
+            result = [i.name for i in self.items.filter(matcher)]
+            self.assertEqual(expected, result, cond)
+
+    def test_lazy_terms(self):
+        seen = []
+        matcher = self.parser.parse("size>1k kind=avi")
+        matcher[1].match = lambda item: seen.append(item.name) or True
+        self.assertEqual(["b"], [i.name for i in self.items.filter(matcher)])
+        self.assertEqual(["b"], seen)
+
+    def test_stats(self):
+        stats = self.items.stats("leechtime")
+        self.assertEqual((2, 1), (stats.count, stats.nulls))
+        self.assertEqual(
+            (3660, 60, 1830.0, 3600), (stats.sum, stats.min, stats.avg, stats.max)
+        )
+
+        selected = self.items.select(self.items.column("size") > 0)
+        self.assertEqual(["a", "b"], [i.name for i in selected])
+        self.assertEqual(2.5, selected.stats("ratio").sum)
+        self.assertIsNone(selected.stats("kind"))
+
+
+if __name__ == "__main__":
+    unittest.main()
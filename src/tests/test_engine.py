@@ -42,6 +42,32 @@ class IntervalTest(unittest.TestCase):
                 self.assertEqual(expected, result, "for interval=%r kw=%r" % (interval, kwargs))
 
 
+class FieldRecordTest(unittest.TestCase):
+
+    def test_record(self):
+        index = engine.FieldRecord.make_index(["hash", "name", "size"])
+        row = ["ABC", "foo", 42]
+        fields = engine.FieldRecord(index, row)
+        self.assertEqual("foo", fields["name"])
+        self.assertNotIn("up", fields)
+        self.assertRaises(KeyError, lambda: fields["up"])
+
+        fields["size"] = 43
+        fields.update(dict(up=1))
+        self.assertEqual(["ABC", "foo", 43], row)
+        self.assertEqual(1, fields.get("up"))
+        self.assertEqual(dict(hash="ABC", name="foo", size=43, up=1), fields.copy())
+        self.assertEqual(4, len(fields))
+
+    def test_shared_index(self):
+        index = engine.FieldRecord.make_index(["hash"])
+        first = engine.FieldRecord(index, ["A"])
+        second = engine.FieldRecord(index, ["B"])
+        first["name"] = "foo"
+        self.assertIs(first._index, second._index)
+        self.assertNotIn("name", second)
+
+
 class EngineTest(unittest.TestCase):
 
     def test_engine(self):
@@ -25,7 +25,9 @@ import unittest
 import six
 
 from pyrobase.parts import Bunch
+from pyrosimple import config
 from pyrosimple.util import matching
+from pyrosimple.torrent import columns
 
 log = logging.getLogger(__name__)
 log.trace("module loaded")
@@ -79,6 +81,76 @@ class FilterTest(unittest.TestCase):
             expected = set(expected.split())
             assert result == expected, "Expected %r, but got %r, for '%s' [ %s ]" % (expected, result, cond, keep)
 
+    def test_compiled(self):
+        cases = self.CASES + [
+            ("[ NOT flag=y ] OR num>10", "F0 T11"),
+            ("T* num=-10 tags=!b", ""),
+            ("/1$/ OR tags==", "T1 T11 F0"),
+        ]
+        for cond, expected in cases:
+            keep = matching.ConditionParser(lookup, "name").parse(cond).compile()
+            result = set(i.name for i in self.DATA if keep(i))
+            expected = set(expected.split())
+            assert result == expected, "Expected %r, but got %r, for '%s'\n%s" % (expected, result, cond, keep.source)
+
+
+    @unittest.skipUnless(columns.numpy, "needs NumPy")
+    def test_masked(self):
+        data = columns.ColumnarItems(self.DATA)
+        for cond, expected in self.CASES:
+            mask = matching.ConditionParser(lookup, "name").parse(cond).mask(data)
+            result = set(i.name for i, keep in zip(self.DATA, mask) if keep)
+            expected = set(expected.split())
+            assert result == expected, "Expected %r, but got %r, for '%s'" % (expected, result, cond)
+
+    def test_reorder(self):
+        costs = dict(name=100, num=1, flag=10)
+        matcher = matching.ConditionParser(lookup, "name").parse(
+            "T* [ flag=y OR num=1 ] num=+0")
+        matcher.reorder(costs.get)
+        assert str(matcher) == "num=+0 [ num=1 OR flag=yes ] name=T*", str(matcher)
+        result = set(i.name for i in self.DATA if matcher(i))
+        assert result == set(["T1", "T11"]), result
+
+
+class PreFilterTest(unittest.TestCase):
+    CASES = [
+        ("size>2g", 'greater=d.size_bytes=,value=2147483648'),
+        ("size<0.1k", 'less=d.size_bytes=,value=103'),
+        ("ratio<1.0", 'less=value=$d.ratio=,value=1000'),
+        ("ratio=1.0005", ''),
+        ("loaded>2d", 'elapsed.greater=$d.custom=tm_loaded,172500'),
+        ("loaded<1h", 'elapsed.less=$d.custom=tm_loaded,3900'),
+        ("is_complete=0 OR size>1g",
+         'or={"equal=d.complete=,value=0","greater=d.size_bytes=,value=1073741824"}'),
+        ("is_complete=1 [ NOT size>1g ]",
+         'and={"equal=d.complete=,value=1","not=\\"$greater=d.size_bytes=,value=1073741824\\""}'),
+        ("name=foo OR leechtime>1d", ''),
+        ("name=!foo", ''),
+        ("NOT loaded>2d", ''),
+    ]
+
+    def setUp(self):
+        self.fast_query = config.fast_query
+        config.fast_query = 2
+
+    def tearDown(self):
+        config.fast_query = self.fast_query
+
+    def test_pre_filter(self):
+        matchers = dict(
+            name=matching.PatternFilter,
+            size=matching.ByteSizeFilter,
+            ratio=matching.FloatFilter,
+            loaded=matching.TimeFilterNotNull,
+            leechtime=matching.DurationFilter,
+            is_complete=matching.BoolFilter,
+        )
+        parser = matching.ConditionParser(lambda name: {"matcher": matchers[name]}, "name")
+        for cond, expected in self.CASES:
+            result = matching.unquote_pre_filter(parser.parse(cond).pre_filter())
+            assert result == expected, "%r != %r for '%s'" % (result, expected, cond)
+
 
 class MagicTest(unittest.TestCase):
     CASES = [
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=
+""" Metafile cache tests.
+
+    Copyright (c) 2011 The PyroScope Project <pyroscope.project@gmail.com>
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to the Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+import os
+import shutil
+import logging
+import sqlite3
+import tempfile
+import unittest
+
+from pyrosimple.torrent.metacache import MetafileCache
+
+log = logging.getLogger(__name__)
+log.trace("module loaded")
+
+
+class MetafileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="metacache-")
+        self.path = os.path.join(self.tempdir, "cache.sqlite")
+        self.cache = MetafileCache(self.path)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_update(self):
+        self.cache.update({"ABC": {"name": "foo", "size": 1}})
+        self.cache.update({"ABC": {"custom_kind": "100%_mkv"}, "DEF": {"name": "bar"}})
+        self.assertEqual(
+            {"ABC": {"name": "foo", "size": 1, "custom_kind": "100%_mkv"}},
+            self.cache.get(["ABC", "XYZ"]),
+        )
+        self.assertEqual(2, self.cache.count())
+
+    def test_sync(self):
+        self.cache.update({"ABC": {"name": "foo"}, "DEF": {"name": "bar"}})
+        self.assertEqual({"GHI"}, self.cache.sync(["ABC", "GHI"]))
+        self.assertEqual(1, self.cache.stats().purging)
+
+        # Reappearing items are kept
+        self.cache.sync(["ABC", "DEF"])
+        self.assertEqual(0, self.cache.stats().purging)
+
+        self.cache.PURGE_DELAY = -1
+        self.cache.sync(["ABC"])
+        self.assertEqual(["ABC"], [i.hash for i in self.cache.entries()])
+
+    def test_bytes(self):
+        data = {"name": b"caf\xe9", "files": [[b"\xff.bin", 1]], "tags": {"a"}}
+        self.cache.update({"ABC": data})
+        self.assertEqual(
+            {"name": b"caf\xe9", "files": [[b"\xff.bin", 1]], "tags": ["a"]},
+            self.cache.get(["ABC"])["ABC"],
+        )
+
+    def test_locked(self):
+        self.cache.update({"ABC": {"name": "foo"}})
+        with sqlite3.connect(self.path, timeout=0) as db:
+            db.execute("BEGIN EXCLUSIVE")
+            self.cache.db.close()
+            self.cache.db = sqlite3.connect(self.path, timeout=0)
+            self.cache.update({"DEF": {"name": "bar"}})
+            self.assertEqual({}, self.cache.get(["ABC"]))
+            self.assertEqual({"ABC", "DEF"}, self.cache.sync(["ABC", "DEF"]))
+            db.rollback()
+        self.assertEqual(["ABC"], [i.hash for i in self.cache.entries()])
+
+    def test_version(self):
+        self.cache.update({"ABC": {"name": "foo"}})
+        self.cache.close()
+        with sqlite3.connect(self.path) as db:
+            db.execute("UPDATE meta SET value = '0' WHERE key = 'version'")
+        self.assertEqual(0, MetafileCache(self.path).count())
+
+
+if __name__ == "__main__":
+    unittest.main()
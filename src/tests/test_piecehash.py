@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=
+""" Metafile piece hashing tests.
+
+    Copyright (c) 2009 The PyroScope Project <pyroscope.project@gmail.com>
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License along
+    with this program; if not, write to the Free Software Foundation, Inc.,
+    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+import os
+import random
+import shutil
+import logging
+import tempfile
+import unittest
+from unittest import mock
+
+from pyrosimple.util import metafile
+
+log = logging.getLogger(__name__)
+log.trace("module loaded")
+
+
+class PieceHashTest(unittest.TestCase):
+    PIECE_SIZE = 1000
+
+    # File sizes, crossing piece boundaries, with empty files in between and at the end
+    SIZES = [1500, 0, 500, 2999, 1, 0, 1234, 0]
+
+    def setUp(self):
+        self.datapath = tempfile.mkdtemp(prefix="pyro-test-")
+        rnd = random.Random(42)
+        for idx, size in enumerate(self.SIZES):
+            with open(os.path.join(self.datapath, "%02d.bin" % idx), "wb") as handle:
+                handle.write(bytes(rnd.getrandbits(8) for _ in range(size)))
+
+    def tearDown(self):
+        shutil.rmtree(self.datapath)
+
+    def make_info(self, workers, datapath=None, use_mmap=False):
+        torrent = metafile.Metafile("test.torrent", datapath or self.datapath)
+        torrent.hash_workers = workers
+        torrent.hash_mmap = use_mmap
+        calls, progress = [], []
+        info, totalhashed = torrent._make_info(
+            self.PIECE_SIZE,
+            lambda done, total: progress.append((done, total)),
+            sorted(torrent.walk()),
+            piece_callback=lambda filename, digest: calls.append((filename, digest)),
+        )
+        return info, totalhashed, calls, progress
+
+    def test_piece_spans(self):
+        spans = list(metafile.piece_spans([("a", 1500), ("b", 0), ("c", 600)], 1000))
+        self.assertEqual(
+            [[("a", 0, 1000)], [("a", 1000, 500), ("c", 0, 500)], [("c", 500, 100)]],
+            spans,
+        )
+
+    def test_parallel_is_serial(self):
+        serial = self.make_info(1)
+        self.assertEqual(sum(self.SIZES), serial[1])
+
+        # Use tiny work units, to get many of them
+        with mock.patch.object(metafile, "HASH_UNIT_SIZE", 2 * self.PIECE_SIZE):
+            parallel = self.make_info(4)
+
+        self.assertEqual(serial[0], parallel[0])
+        self.assertEqual(serial[1], parallel[1])
+        self.assertEqual(serial[2], parallel[2])
+        self.assertTrue(parallel[2][-1][0].endswith("07.bin"))
+        self.assertEqual(serial[3][-1], parallel[3][-1])
+        self.assertEqual(sorted(parallel[3]), parallel[3])
+
+    def test_mmap(self):
+        serial = self.make_info(1)
+        for workers in (1, 4):
+            mapped = self.make_info(workers, use_mmap=True)
+            self.assertEqual(serial[:3], mapped[:3])
+
+    def test_short_file(self):
+        reader = metafile.SpanReader()
+        with reader, self.assertRaises(OSError):
+            reader.update(
+                metafile.hashlib.sha1(), os.path.join(self.datapath, "04.bin"), 0, 2
+            )
+
+    def test_single_file(self):
+        datapath = os.path.join(self.datapath, "03.bin")
+        serial = self.make_info(1, datapath)
+        parallel = self.make_info(3, datapath)
+        self.assertEqual(serial[:3], parallel[:3])
+        self.assertEqual(2999, parallel[0]["length"])
+
+    def test_create_all(self):
+        torrent = metafile.Metafile(os.path.join(self.datapath, "test.torrent"))
+        torrent.ignore.append("*.torrent")
+        progress = []
+        urls = ["http://tracker.one.com/announce", "udp://two.example.org:80/a"]
+        written = torrent.create_all(
+            self.datapath,
+            urls,
+            no_date=True,
+            progress=lambda done, total: progress.append(done),
+        )
+
+        # Data was hashed only once
+        self.assertEqual(1, progress.count(sum(self.SIZES)))
+        self.assertEqual(
+            ["test-one.torrent", "test-example.torrent"],
+            [os.path.basename(filename) for filename, _ in written],
+        )
+        for filename, meta in written:
+            with open(filename, "rb") as handle:
+                self.assertEqual(meta, metafile.bencode.decode(handle.read()))
+        self.assertEqual(urls, [meta["announce"] for _, meta in written])
+
+        one, two = [meta["info"] for _, meta in written]
+        self.assertNotEqual(one.pop("x_cross_seed"), two.pop("x_cross_seed"))
+        self.assertEqual(one, two)
+
+    def metainfo(self):
+        torrent = metafile.Metafile("test.torrent", self.datapath)
+        info, _ = torrent._make_info(self.PIECE_SIZE, None, sorted(torrent.walk()))
+        return dict(info=info, announce="http://example.com/announce")
+
+    def corrupt(self, name, offset):
+        with open(os.path.join(self.datapath, name), "r+b") as handle:
+            handle.seek(offset)
+            data = handle.read(1)
+            handle.seek(offset)
+            handle.write(bytes([data[0] ^ 0xFF]))
+
+    def test_verify(self):
+        meta = self.metainfo()
+        torrent = metafile.Metafile("test.torrent")
+        report = torrent.verify(meta, self.datapath)
+        self.assertTrue(report.ok)
+        self.assertEqual((7, 7, []), (report.pieces, report.checked, report.bad))
+
+        # Piece #1 is in 2 files, #3 is in 03.bin only
+        self.corrupt("02.bin", 10)
+        self.corrupt("03.bin", 1500)
+        report = torrent.verify(meta, self.datapath)
+        self.assertFalse(report.ok)
+        self.assertTrue(report.complete)
+        self.assertEqual([1, 3], report.bad)
+        self.assertEqual({"00.bin": [1], "02.bin": [1], "03.bin": [3]}, report.files)
+        self.assertFalse(torrent.check(meta, self.datapath))
+
+        report = torrent.verify(meta, self.datapath, max_bad=1)
+        self.assertEqual((2, [1]), (report.checked, report.bad))
+        self.assertFalse(report.complete)
+
+    def test_verify_resume(self):
+        meta = self.metainfo()
+        checkpoint = os.path.join(self.datapath, "check.json")
+        self.corrupt("02.bin", 10)
+        self.corrupt("03.bin", 1500)
+        torrent = metafile.Metafile("test.torrent")
+
+        report = torrent.verify(meta, self.datapath, max_bad=1, checkpoint=checkpoint)
+        self.assertEqual((2, [1]), (report.checked, report.bad))
+        self.assertTrue(os.path.exists(checkpoint))
+
+        progress = []
+        report = torrent.verify(
+            meta,
+            self.datapath,
+            progress=lambda done, total: progress.append(done),
+            checkpoint=checkpoint,
+        )
+        self.assertEqual((7, [1, 3]), (report.checked, report.bad))
+        self.assertEqual(3000, progress[0])
+        self.assertTrue(report.complete)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_verify_missing(self):
+        meta = self.metainfo()
+        os.remove(os.path.join(self.datapath, "06.bin"))
+        report = metafile.Metafile("test.torrent").verify(meta, self.datapath)
+        self.assertEqual(["06.bin"], report.bad_size)
+        self.assertEqual([5, 6], report.bad)
+        self.assertFalse(report.ok)
+
+    def test_piece_spans_at(self):
+        files = [("a", 1500), ("b", 0), ("c", 600), ("d", 0), ("e", 2000)]
+        spans = list(metafile.piece_spans(files, 1000))
+        self.assertEqual(
+            [spans[4], spans[0], spans[1]],
+            list(metafile.piece_spans_at(files, 1000, [4, 0, 1])),
+        )
+
+    def test_sample_pieces(self):
+        files = [("a", 9000), ("b", 0), ("c", 10), ("d", 90000), ("e", 1000)]
+        rnd = random.Random(42)
+        for _ in range(20):
+            pieces = metafile.sample_pieces(files, 1000, 10, rnd)
+            self.assertEqual(10, len(set(pieces)))
+            self.assertTrue(any(i < 9 for i in pieces))
+            self.assertIn(9, pieces)
+            self.assertTrue(any(i >= 99 for i in pieces))
+        self.assertEqual(101, len(metafile.sample_pieces(files, 1000, 200)))
+
+    def test_detection_confidence(self):
+        self.assertEqual(0.0, metafile.detection_confidence(1000, 0, 0.01))
+        self.assertEqual(1.0, metafile.detection_confidence(1000, 991, 0.01))
+        self.assertAlmostEqual(
+            0.95, metafile.detection_confidence(10000, 298, 0.01), places=2
+        )
+
+    def test_sample(self):
+        meta = self.metainfo()
+        torrent = metafile.Metafile("test.torrent")
+        report = torrent.sample(meta, self.datapath, count=3, rng=random.Random(1))
+        self.assertTrue(report.ok)
+        self.assertEqual(3, report.checked)
+        self.assertEqual(3, len(report.sampled))
+        self.assertTrue(0 < report.confidence < 1)
+
+        self.corrupt("03.bin", 1500)
+        report = torrent.sample(meta, self.datapath, fraction=1.0)
+        self.assertEqual(list(range(7)), report.sampled)
+        self.assertEqual(([3], {"03.bin": [3]}), (report.bad, report.files))
+        self.assertEqual((False, 1.0), (report.ok, report.confidence))
+
+
+if __name__ == "__main__":
+    unittest.main()
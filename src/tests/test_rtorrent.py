@@ -18,10 +18,19 @@
     with this program; if not, write to the Free Software Foundation, Inc.,
     51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 """
+import os
+import shutil
+import asyncio
 import logging
+import tempfile
 import unittest
 
-from pyrosimple.torrent import rtorrent
+import bencode
+
+from pyrosimple import config, error
+from pyrosimple.util import matching
+from pyrosimple.torrent import engine, formatting, rtorrent
+from tests.fake_rtorrent import FakeEngineTest, download_methods
 
 log = logging.getLogger(__name__)
 log.trace("module loaded")
@@ -33,5 +42,444 @@ class RTorrentTest(unittest.TestCase):
         pass
 
 
+class ItemCacheTest(FakeEngineTest):
+
+    def setUp(self):
+        super(ItemCacheTest, self).setUp()
+        self.items = [
+            {"d.hash": "ABC", "d.name": "foo", "d.up.rate": 1},
+            {"d.hash": "DEF", "d.name": "bar", "d.up.rate": 2},
+        ]
+
+    def test_refresh(self):
+        with self.fake_engine(download_methods(self.items)) as (fake, engine):
+            first = list(engine.items(cache=False))
+            self.assertEqual([1, 2], [i.up for i in first])
+            self.assertEqual(0, first[0].prio)  # on demand
+
+            self.items[0].update({"d.name": "changed", "d.up.rate": 10})
+            self.items.append({"d.hash": "GHI", "d.name": "new", "d.up.rate": 3})
+            del self.items[1]
+            fake.calls[:] = []
+            second = list(engine.items(cache=False))
+            self.assertIs(first[0], second[0])
+            self.assertEqual(["foo", "new"], [i.name for i in second])
+            self.assertEqual([10, 3], [i.up for i in second])
+            self.assertNotIn("prio", second[0]._fields)
+            self.assertEqual(["d.multicall", "system.multicall"], fake.calls[:2])
+            self.assertEqual({"ABC", "GHI"}, set(engine._hash_cache))
+
+    def test_filtered_refresh(self):
+        methods = download_methods(self.items)
+        multicall = methods["d.multicall"]
+        methods["d.multicall.filtered"] = lambda _, view, __, *cmds: [
+            row for row in multicall(_, view, *cmds) if "ABC" in row
+        ]
+        with self.fake_engine(methods) as (fake, proxy):
+            config.fast_query = 1
+            list(proxy.items(cache=False))
+
+            matcher = matching.ConditionParser(
+                engine.FieldDefinition.lookup, "name"
+            ).parse(["name=foo"])
+            view = proxy.view("default", matcher, ["name"])
+            self.assertEqual(["foo"], [i.name for i in view.items()])
+            self.assertEqual({"ABC", "DEF"}, set(proxy._hash_cache))
+
+
+class MetafileCacheTest(FakeEngineTest):
+
+    def setUp(self):
+        super(MetafileCacheTest, self).setUp()
+        self.tempdir = tempfile.mkdtemp(prefix="metacache-")
+        config.metafile_cache = os.path.join(self.tempdir, "cache.sqlite")
+        session_file = os.path.join(self.tempdir, "ABC.torrent")
+        bencode.bwrite(
+            {
+                "announce": "http://example.com/announce",
+                "creation date": 1234567890,
+                "info": {"name": "foo", "length": 1, "piece length": 2 ** 18},
+            },
+            session_file,
+        )
+        self.items = [
+            {"d.hash": "ABC", "d.name": "foo", "d.session_file": session_file},
+            {"d.hash": "DEF", "d.name": "bar"},
+        ]
+
+    def tearDown(self):
+        super(MetafileCacheTest, self).tearDown()
+        shutil.rmtree(self.tempdir)
+
+    def test_cached_constants(self):
+        methods = download_methods(self.items, default="")
+        with self.fake_engine(methods) as (fake, first):
+            items = list(first.items("main", prefetch=["name"], cache=False))
+            self.assertEqual(1234567890, items[0].created)
+            self.assertEqual(2 ** 18, items[0].piece_length)
+            first._store_metacache(items)
+
+            # A new engine gets constant fields from the cache, not rTorrent
+            second = rtorrent.RtorrentEngine()
+            second.open()
+            fake.calls[:] = []
+            items = list(second.items("main", prefetch=["name"], cache=False))
+            self.assertEqual(["foo", "bar"], [i.name for i in items])
+            self.assertEqual(1234567890, items[0].created)
+            self.assertEqual(["d.multicall"], fake.calls)
+            self.assertEqual(2, second.metacache.count())
+
+    def test_filtered_sync(self):
+        methods = download_methods(self.items, default="")
+        multicall = methods["d.multicall"]
+        methods["d.multicall.filtered"] = lambda _, view, __, *cmds: [
+            row for row in multicall(_, view, *cmds) if "ABC" in row
+        ]
+        with self.fake_engine(methods) as (fake, proxy):
+            config.fast_query = 1
+            list(proxy.items("default", prefetch=["name"], cache=False))
+            self.assertEqual(2, proxy.metacache.count())
+
+            matcher = matching.ConditionParser(
+                engine.FieldDefinition.lookup, "name"
+            ).parse(["name=foo"])
+            view = proxy.view("default", matcher, ["name"])
+            self.assertEqual(["foo"], [i.name for i in view.items()])
+            self.assertEqual("d.multicall.filtered", view._query[0])
+            self.assertEqual(0, proxy.metacache.stats().purging)
+
+
+class PrefetchTest(FakeEngineTest):
+
+    ITEMS = [
+        {
+            "d.hash": "ABC",
+            "d.name": "foo",
+            "d.up.rate": 1,
+            "d.down.rate": 2,
+            "d.priority": 3,
+            "d.custom=foo": "bar",
+            "d.completed_chunks": 1,
+            "d.size_chunks": 4,
+        },
+    ]
+
+    def test_field_names(self):
+        matcher = matching.ConditionParser(engine.FieldDefinition.lookup, "name").parse(
+            ["foo*", "[", "NOT", "xfer>0", "OR", "custom_foo=bar", "]"]
+        )
+        self.assertEqual({"name", "xfer", "custom_foo"}, matcher.field_names())
+        self.assertEqual(
+            ["prio", "done"], formatting.format_fields("%(prio)s $(done).1f")
+        )
+        self.assertEqual(["size"], formatting.format_fields("{{d.size|sz}} {{x.name}}"))
+        self.assertEqual(["name", "size"], formatting.sort_field_names("name,-size"))
+        self.assertEqual(
+            {
+                "up",
+                "down",
+                "custom_tm_completed",
+                "custom_tm_started",
+                "custom_activations",
+            },
+            engine.FieldDefinition.requirements(["xfer", "leechtime"]),
+        )
+
+    def test_single_multicall(self):
+        with self.fake_engine() as (fake, proxy):
+            proxy.open()
+            fake.calls[:] = []
+
+            matcher = matching.ConditionParser(
+                engine.FieldDefinition.lookup, "name"
+            ).parse(["xfer>0", "custom_foo=bar"])
+            prefetch = matcher.field_names() | set(["prio", "done"])
+            items = list(proxy.view("default", matcher, prefetch).items())
+
+            self.assertEqual(1, len(items))
+            item = items[0]
+            self.assertEqual((3, 3, 25.0), (item.xfer, item.prio, item.done))
+            self.assertEqual(["d.multicall"], fake.calls)
+
+
+class ExplainTest(FakeEngineTest):
+
+    def test_explain(self):
+        items = [{"d.hash": "ABC", "d.name": "foo"}, {"d.hash": "DEF", "d.name": "bar"}]
+        with self.fake_engine(download_methods(items)) as (fake, proxy):
+            config.fast_query = 1
+            matcher = matching.ConditionParser(
+                engine.FieldDefinition.lookup, "name"
+            ).parse(["is_complete=1", "files=*.nfo"])
+            view = proxy.view("default", matcher, matcher.field_names())
+            plan = proxy.explain(view, matcher.field_names())
+            self.assertEqual("d.multicall.filtered", plan.method)
+            self.assertEqual("equal=d.complete=,value=1", plan.pre_filter)
+            self.assertIn("d.get_complete=", plan.commands)
+            self.assertEqual(["files"], plan.separate)
+            self.assertEqual((2, 3), (plan.rows, plan.requests))
+
+            view = proxy.view("#ABC", matcher, matcher.field_names())
+            self.assertEqual(2, proxy.explain(view, matcher.field_names()).requests)
+
+            before = proxy.open().stats()
+            proxy.open().view.size("", "default")
+            self.assertEqual(1, proxy.open().stats().requests - before.requests)
+
+
+class ItemBatchTest(FakeEngineTest):
+
+    ITEMS = [
+        {"d.hash": "%040X" % i, "d.name": "item%d" % i, "d.size_files": i}
+        for i in range(10)
+    ]
+
+    def test_view_batch(self):
+        with self.fake_engine() as (fake, proxy):
+            items = list(proxy.items(cache=False))
+            fake.calls[:] = []
+            self.assertEqual(list(range(10)), [i.fno for i in items])
+            self.assertEqual(["view.size", "d.multicall"], fake.calls)
+
+    def test_filtered_batch(self):
+        with self.fake_engine() as (fake, proxy):
+            matcher = matching.ConditionParser(
+                engine.FieldDefinition.lookup, "name"
+            ).parse(["item[35]"])
+            items = list(proxy.view("default", matcher).items())
+            fake.calls[:] = []
+            self.assertEqual([3, 5], [i.fno for i in items])
+            self.assertEqual(["view.size", "system.multicall"], fake.calls[:2])
+            self.assertEqual(1, fake.calls.count("system.multicall"))
+
+    def test_engine_name(self):
+        with self.fake_engine() as (fake, proxy):
+            items = list(proxy.items(cache=False))
+            fake.calls[:] = []
+            self.assertEqual(1, items[1].fetch("nfiles", "size_files"))
+            self.assertEqual(list(range(10)), [i.fetch("nfiles") for i in items])
+            self.assertEqual(["view.size", "d.multicall"], fake.calls)
+
+    def test_streamed_items(self):
+        with self.fake_engine() as (fake, proxy):
+            prefetch = ["name", "fno"]
+            self.assertEqual([], proxy.separate_fields(prefetch))
+            self.assertEqual(["files"], proxy.separate_fields(prefetch + ["files"]))
+
+            view = proxy.view("default", prefetch=prefetch)
+            items = view.items(stream=True)
+            self.assertEqual("item0", next(items).name)
+            self.assertIsNone(view._items)  # still coming in
+            self.assertEqual(9, len(list(items)))
+            self.assertEqual(10, len(view._items))
+
+
+class BulkFilesTest(FakeEngineTest):
+
+    ITEMS = [
+        {
+            "d.hash": "%040X" % i,
+            "d.name": "item%d" % i,
+            "f.multicall": [["file%d.flac" % i, 1000, 2000000, 1, 1, 0]],
+        }
+        for i in range(10)
+    ]
+
+    def check(self, items, fake, method):
+        fake.calls[:] = []
+        self.assertEqual(
+            ["file%d.flac" % i for i in range(len(items))],
+            [item.files[0].path for item in items],
+        )
+        self.assertEqual(2.0, items[0].files[0].mtime)
+        self.assertEqual(["view.size", method], fake.calls[:2])
+        self.assertEqual(1, fake.calls.count(method))
+
+    def test_view_files(self):
+        with self.fake_engine() as (fake, proxy):
+            self.check(list(proxy.items(cache=False)), fake, "d.multicall")
+
+    def test_chunked_files(self):
+        with self.fake_engine() as (fake, proxy):
+            items = list(proxy.items(cache=False))[:2]
+            proxy.batch(items, "default")
+            self.check(items, fake, "system.multicall")
+
+    def test_unknown_view(self):
+        with self.fake_engine() as (fake, proxy):
+            items = list(proxy.items(cache=False))[:2]
+
+            # Like the first items of a streamed query
+            proxy._view_hashes.clear()
+            proxy.batch(items, "default")
+            self.check(items, fake, "system.multicall")
+
+    def test_cheap_terms_first(self):
+        matcher = matching.ConditionParser(engine.FieldDefinition.lookup, "name").parse(
+            ["files=*.flac", "is_complete=1"]
+        )
+        prefetch = matcher.field_names()
+        matcher.reorder(lambda name: engine.FieldDefinition.cost(name, prefetch))
+        self.assertEqual("is_complete=yes files=*.flac", str(matcher))
+
+        matcher = matching.ConditionParser(engine.FieldDefinition.lookup, "name").parse(
+            ["kind=flac", "is_complete=1"]
+        )
+        prefetch = matcher.field_names()
+        matcher.reorder(lambda name: engine.FieldDefinition.cost(name, prefetch))
+        self.assertEqual("is_complete=yes kind=flac", str(matcher))
+
+    def test_released_items(self):
+        with self.fake_engine() as (fake, proxy):
+            items = list(proxy.items(cache=False))
+            for item in items[2:]:
+                proxy.release(item)
+            fake.calls[:] = []
+            self.assertEqual("file0.flac", items[0].files[0].path)
+            self.assertEqual(2, fake.calls.count("f.multicall"))
+            self.assertNotIn("files", items[2]._fields)
+
+
+class BulkTrackersTest(FakeEngineTest):
+
+    ITEMS = [
+        {
+            "d.hash": "%040X" % i,
+            "d.name": "item%d" % i,
+            "t.multicall": [["http://off.example.com/", 0], ["http://t%d/" % i, 1]],
+        }
+        for i in range(3)
+    ]
+
+    def test_sub_multicall(self):
+        with self.fake_engine() as (fake, proxy):
+            items = list(proxy.items(cache=False))
+            for viewname in ("default", None):
+                rows = proxy.sub_multicall(
+                    "t", ["t.url=", "t.is_enabled="], items[1:], viewname
+                )
+                self.assertEqual(
+                    dict((i["d.hash"], i["t.multicall"]) for i in self.ITEMS[1:]), rows
+                )
+
+    def test_prefetched_trackers(self):
+        with self.fake_engine() as (fake, proxy):
+            proxy.open()
+            fake.calls[:] = []
+            items = list(proxy.items(prefetch=["tracker"], cache=False))
+            trackers = [i.tracker for i in items]
+            self.assertEqual(["http://t%d/" % i for i in range(3)], trackers)
+            self.assertEqual(["d.multicall"], fake.calls)
+
+            item = proxy.item(items[0].hash, prefetch=["tracker"])
+            self.assertEqual("http://t0/", item.tracker)
+
+    def test_batched_trackers(self):
+        with self.fake_engine() as (fake, proxy):
+            items = list(proxy.items(cache=False))
+            fake.calls[:] = []
+            trackers = [i.tracker for i in items]
+            self.assertEqual(["http://t%d/" % i for i in range(3)], trackers)
+            self.assertEqual(["view.size", "d.multicall"], fake.calls)
+
+
+class CallQueueTest(FakeEngineTest):
+
+    ITEMS = [{"d.hash": "%040X" % i, "d.name": "item%d" % i} for i in range(3)]
+
+    def test_queued_calls(self):
+        with self.fake_engine() as (fake, proxy):
+            items = list(proxy.items(cache=False))
+            items.append(rtorrent.RtorrentItem(proxy, dict(hash="GONE", name="gone")))
+            fake.calls[:] = []
+
+            with self.assertRaises(error.EngineError):
+                with proxy.queued_calls(3) as queue:
+                    for item in items:
+                        item.start()
+                    self.assertEqual(2, fake.calls.count("system.multicall"))
+
+            self.assertEqual(3, queue.requests)
+            self.assertEqual(4, fake.calls.count("d.open"))
+            self.assertEqual(4, fake.calls.count("d.start"))
+            self.assertEqual(
+                [("GONE", "starting")] * 2,
+                [(i._fields["hash"], command) for i, command, _ in queue.failed],
+            )
+
+    def test_direct_calls(self):
+        with self.fake_engine() as (fake, proxy):
+            items = list(proxy.items(cache=False))
+            fake.calls[:] = []
+            with proxy.queued_calls(0):
+                items[0].stop()
+            self.assertEqual(["d.stop", "d.close"], fake.calls)
+
+
+class ShowTest(FakeEngineTest):
+
+    ITEMS = [{"d.hash": "%040X" % i, "d.name": "item%d" % i} for i in range(3)]
+
+    def methods(self):
+        methods = download_methods(self.ITEMS)
+        methods.update(
+            {
+                "view.list": lambda *_: ["default"],
+                "view.add": lambda *_: 0,
+                "view.filter": lambda *_: 0,
+                "d.multicall2": lambda *_: [],
+                "ui.current_view.set": lambda *_: 0,
+            }
+        )
+        return methods
+
+    def test_batched(self):
+        with self.fake_engine(self.methods()) as (fake, proxy):
+            items = list(proxy.items(cache=False))
+            fake.calls[:] = []
+            self.assertEqual("test", proxy.show(items[:2], "test"))
+            self.assertEqual(1, fake.calls.count("system.multicall"))
+            self.assertEqual(2, fake.calls.count("d.views.push_back_unique"))
+            self.assertEqual(2, fake.calls.count("view.set_visible"))
+
+    def test_server_side(self):
+        with self.fake_engine(self.methods()) as (fake, proxy):
+            view = proxy.view("default")
+            items = list(view.items())
+            fake.calls[:] = []
+            proxy.show(items, "test", append=True, source=view)
+            self.assertEqual("d.multicall", fake.calls[-1])
+            self.assertNotIn("system.multicall", fake.calls)
+
+            # A subset can't be done that way
+            fake.calls[:] = []
+            proxy.show(items[1:], "test", append=True, source=view)
+            self.assertIn("system.multicall", fake.calls)
+
+            # Neither can a stale query result
+            fake.calls[:] = []
+            view._query_time -= proxy.SHOW_QUERY_AGE + 1
+            proxy.show(items, "test", append=True, source=view)
+            self.assertIn("system.multicall", fake.calls)
+
+
+class AsyncItemsTest(FakeEngineTest):
+
+    ITEMS = [
+        {"d.hash": "ABC", "d.name": "foo", "d.size_bytes": 2 ** 31 - 1},
+        {"d.hash": "DEF", "d.name": "bar", "d.size_bytes": 1},
+    ]
+
+    async def collect(self, engine):
+        return [(i.hash, i.name, i.size) async for i in engine.items_async()]
+
+    def test_items_async(self):
+        with self.fake_engine() as (fake, engine):
+            items = asyncio.run(self.collect(engine))
+            self.assertEqual([("ABC", "foo", 2 ** 31 - 1), ("DEF", "bar", 1)], items)
+            self.assertEqual("fake", engine.engine_id)
+            self.assertEqual(1, fake.calls.count("d.multicall"))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -18,10 +18,16 @@
     with this program; if not, write to the Free Software Foundation, Inc.,
     51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 """
+import os
+import sys
+import asyncio
+import shutil
 import logging
+import tempfile
 import unittest
 
 from pyrosimple.util import xmlrpc
+from tests.fake_rtorrent import FakeRtorrent
 
 log = logging.getLogger(__name__)
 log.trace("module loaded")
@@ -30,7 +36,271 @@ log.trace("module loaded")
 class XmlRpcTest(unittest.TestCase):
 
     def test_xmlrpc(self):
-        pass
+        with FakeRtorrent(dict(echo=lambda *args: list(args))) as fake:
+            proxy = xmlrpc.RTorrentProxy(fake.url)
+            self.assertEqual(["a", 1], proxy.echo("a", 1))
+            self.assertEqual(["b"], proxy.echo("b"))
+            self.assertEqual(2, proxy._requests)
+
+
+class ResponseParserTest(unittest.TestCase):
+
+    RESPONSE = (
+        b"<?xml version='1.0'?><methodResponse><params><param><value><array><data>"
+        b"<value><array><data><value><string>a&amp;b</string></value>"
+        b"<value><i8>8589934592</i8></value></data></array></value>"
+        b"<value><array><data><value>untyped</value><value><boolean>1</boolean></value>"
+        b"<value><struct><member><name>x</name><value><double>1.5</double></value>"
+        b"</member></struct></value></data></array></value>"
+        b"</data></array></value></param></params></methodResponse>"
+    )
+    RESULT = [["a&b", 8589934592], ["untyped", True, dict(x=1.5)]]
+
+    def test_parse(self):
+        parser = xmlrpc.ResponseParser()
+        for i in range(0, len(self.RESPONSE), 7):
+            parser.feed(self.RESPONSE[i : i + 7])
+        self.assertEqual(self.RESULT, parser.close())
+
+    def test_rows(self):
+        parser = xmlrpc.ResponseParser(streaming=True)
+        cut = self.RESPONSE.index(b"<value><array><data><value>untyped")
+        parser.feed(self.RESPONSE[:cut])
+        self.assertEqual(self.RESULT[:1], list(parser.rows()))
+        parser.feed(self.RESPONSE[cut:])
+        parser.close()
+        self.assertEqual(self.RESULT[1:], list(parser.rows()))
+
+    def test_fault(self):
+        parser = xmlrpc.ResponseParser()
+        parser.feed(xmlrpc.xmlrpclib.dumps(xmlrpc.xmlrpclib.Fault(-506, "Oops"),
+                                           methodresponse=True).encode())
+        self.assertRaises(xmlrpc.xmlrpclib.Fault, parser.close)
+
+    def test_broken(self):
+        parser = xmlrpc.ResponseParser()
+        self.assertRaises(xmlrpc.xmlrpclib.ResponseError, parser.feed, b"<a></b>")
+
+    def test_stream(self):
+        with FakeRtorrent(dict(rows=lambda n: [[i, str(i)] for i in range(n)])) as fake:
+            proxy = xmlrpc.RTorrentProxy(fake.url)
+            rows = proxy.rows(3, stream=True)
+            self.assertEqual([[0, "0"], [1, "1"], [2, "2"]], list(rows))
+            self.assertRaises(xmlrpc.ERRORS, list, proxy.missing(stream=True))
+            proxy._transport.close()
+
+
+class MulticallParserTest(unittest.TestCase):
+
+    ROWS = [
+        ["ABCDEF", "name & <more>", 2 ** 31 - 1, 0],
+        ["012345", "", -1, 1],
+        ["6789AB", "\u00e4\u20ac", 2, 3],
+    ]
+
+    def parse(self, data, streaming=False):
+        parser = xmlrpc.MulticallParser(streaming=streaming)
+        rows = []
+        for i in range(0, len(data), 5):
+            parser.feed(data[i : i + 5])
+            rows.extend(parser.rows())
+        result = parser.close()
+        return parser, rows + list(parser.rows()) if streaming else result
+
+    def test_rows(self):
+        data = xmlrpc.xmlrpclib.dumps((self.ROWS,), methodresponse=True)
+        data = data.replace("<string></string>", "<string/>").replace("int>", "i8>")
+        data = data.encode("utf-8")
+        parser, result = self.parse(data)
+        self.assertEqual(self.ROWS, result)
+        self.assertIsNone(parser._fallback)
+        parser, result = self.parse(data, streaming=True)
+        self.assertEqual(self.ROWS, result)
+
+    def test_fallback(self):
+        rows = self.ROWS + [[1.5, dict(a=[1])]]
+        data = xmlrpc.xmlrpclib.dumps((rows,), methodresponse=True).encode("utf-8")
+        for streaming in (False, True):
+            parser, result = self.parse(data, streaming=streaming)
+            self.assertEqual(rows, result)
+            self.assertIsNotNone(parser._fallback)
+
+        data = xmlrpc.xmlrpclib.dumps(("scalar",), methodresponse=True).encode("utf-8")
+        self.assertEqual("scalar", self.parse(data)[1])
+
+    def test_nested_rows(self):
+        rows = [["hash%d" % i, [["path", i]]] for i in range(50)]
+        data = xmlrpc.xmlrpclib.dumps((rows,), methodresponse=True).encode("utf-8")
+        parser = xmlrpc.MulticallParser(streaming=True)
+        half = len(data) // 2
+        parser.feed(data[:half])
+        early = list(parser.rows())
+        self.assertIsNotNone(parser._fallback)
+        self.assertTrue(early)
+        parser.feed(data[half:])
+        parser.close()
+        self.assertEqual(rows, early + list(parser.rows()))
+
+    def test_fault(self):
+        parser = xmlrpc.MulticallParser()
+        parser.feed(xmlrpc.xmlrpclib.dumps(xmlrpc.xmlrpclib.Fault(-506, "Oops"),
+                                           methodresponse=True).encode())
+        self.assertRaises(xmlrpc.xmlrpclib.Fault, parser.close)
+
+    def test_dumps(self):
+        params = ("hash", ["a & <b>", 1, 2 ** 40, True], dict(methodName="x", params=[]))
+        data = xmlrpc.dumps(params, "system.multicall")
+        self.assertEqual((params, "system.multicall"), xmlrpc.xmlrpclib.loads(data))
+        self.assertIn("<i8>", data)
+        self.assertEqual(xmlrpc.xmlrpclib.dumps((1.5,), "x"), xmlrpc.dumps((1.5,), "x"))
+
+
+class AsyncProxyTest(unittest.TestCase):
+
+    async def calls(self, *proxies):
+        await asyncio.gather(*[i._set_mappings() for i in proxies])
+        results = await asyncio.gather(*[i.echo(n) for n in range(3) for i in proxies])
+        rows = [row async for row in proxies[0].echo(1, 2, stream=True)]
+        return results, rows
+
+    def test_async_proxy(self):
+        echo = dict(echo=lambda *args: list(args))
+        with FakeRtorrent(echo) as fake1, FakeRtorrent(echo) as fake2:
+            proxies = [xmlrpc.AsyncRTorrentProxy(i.url) for i in (fake1, fake2)]
+            results, rows = asyncio.run(self.calls(*proxies))
+            self.assertEqual([[0], [0], [1], [1], [2], [2]], results)
+            self.assertEqual([1, 2], rows)
+            self.assertEqual((0, 9, 8), proxies[1]._version_info)
+            self.assertEqual(3, fake2.calls.count("echo"))
+
+    def test_async_fault(self):
+        with FakeRtorrent() as fake:
+            proxy = xmlrpc.AsyncRTorrentProxy(fake.url)
+            with self.assertRaises(xmlrpc.ERRORS):
+                asyncio.run(proxy.missing(fail_silently=True))
+
+
+class SocketPoolTest(unittest.TestCase):
+
+    def test_warm_connections(self):
+        with FakeRtorrent(dict(echo=lambda *args: list(args))) as fake:
+            proxy = xmlrpc.RTorrentProxy(fake.url)
+            for i in range(5):
+                self.assertEqual([i], proxy.echo(i))
+            pool = proxy._transport.pool
+            self.assertEqual(4, pool.hits)
+            self.assertEqual(0, pool.reused)
+            self.assertIn("4 hits", str(proxy))
+            proxy._transport.close()
+
+    def test_keep_alive(self):
+        with FakeRtorrent(dict(echo=lambda *args: list(args)), keep_alive=True) as fake:
+            proxy = xmlrpc.RTorrentProxy(fake.url)
+            for i in range(5):
+                self.assertEqual([i], proxy.echo(i))
+            proxy._transport.close()
+            self.assertEqual(5, proxy._transport.pool.reused)
+            self.assertEqual(2, fake.connections)
+
+    def test_idle_eviction(self):
+        with FakeRtorrent(dict(echo=lambda *args: list(args))) as fake:
+            proxy = xmlrpc.RTorrentProxy(fake.url)
+            proxy._transport.pool.idle_timeout = 0
+            self.assertEqual([1], proxy.echo(1))
+            self.assertEqual([2], proxy.echo(2))
+            self.assertEqual(1, proxy._transport.pool.evicted)
+            proxy._transport.close()
+
+    def test_no_pool(self):
+        with FakeRtorrent(dict(echo=lambda *args: list(args))) as fake:
+            proxy = xmlrpc.RTorrentProxy(fake.url)
+            proxy._transport.pool.size = 0
+            self.assertEqual([1], proxy.echo(1))
+            self.assertEqual([2], proxy.echo(2))
+            self.assertEqual(0, proxy._transport.pool.hits)
+            self.assertEqual(2, fake.connections)
+
+
+class SSHSessionTest(unittest.TestCase):
+
+    # Stand-ins that run the remote command locally
+    FAKE_SSH = '#!/bin/sh\nfor last; do :; done\nexec sh -c "$last"\n'
+    FAKE_SOCAT = "\n".join([
+        "#!%s" % sys.executable,
+        "import sys, socket",
+        "sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)",
+        "sock.connect(sys.argv[-1].split(':', 1)[1])",
+        "sock.sendall(sys.stdin.buffer.read())",
+        "while True:",
+        "    chunk = sock.recv(4096)",
+        "    if not chunk: break",
+        "    sys.stdout.buffer.write(chunk)",
+    ])
+
+    def setUp(self):
+        self.bindir = tempfile.mkdtemp(prefix="fake-ssh-")
+        for name, script in (("ssh", self.FAKE_SSH), ("socat", self.FAKE_SOCAT)):
+            with open(os.path.join(self.bindir, name), "w") as handle:
+                handle.write(script)
+            os.chmod(os.path.join(self.bindir, name), 0o755)
+        self.path = os.environ["PATH"]
+        os.environ["PATH"] = self.bindir + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ["PATH"] = self.path
+        shutil.rmtree(self.bindir)
+
+    def test_session(self):
+        with FakeRtorrent(dict(echo=lambda *args: list(args))) as fake:
+            proxy = xmlrpc.RTorrentProxy("scgi+ssh://localhost" + fake.path)
+            transport = proxy._transport
+            for i in range(5):
+                self.assertEqual(["x" * i], proxy.echo("x" * i))
+            self.assertEqual(1, transport.sessions)
+
+            # Reconnect after the session went away
+            transport.proc.kill()
+            transport.proc.wait()
+            self.assertEqual([42], proxy.echo(42))
+            self.assertEqual(2, transport.sessions)
+
+            # Calls while a streamed response is consumed
+            rows = proxy.echo(1, 2, stream=True)
+            self.assertEqual(1, next(rows))
+            self.assertEqual([3], proxy.echo(3))
+            self.assertEqual([2], list(rows))
+
+            transport.close()
+            self.assertIsNone(transport.proc)
+
+    def test_noisy_session(self):
+        # More stderr output than fits into a pipe buffer
+        with open(os.path.join(self.bindir, "ssh"), "w") as handle:
+            handle.write(
+                self.FAKE_SSH.replace("exec", "head -c 200000 /dev/zero >&2\nexec")
+            )
+        with FakeRtorrent(dict(echo=lambda *args: list(args))) as fake:
+            proxy = xmlrpc.RTorrentProxy("scgi+ssh://localhost" + fake.path)
+            self.assertEqual([1], proxy.echo(1))
+            proxy._transport.close()
+
+    def test_failed_session(self):
+        with open(os.path.join(self.bindir, "ssh"), "w") as handle:
+            handle.write("#!/bin/sh\necho 'Host key verification failed.' >&2\n")
+        proxy = xmlrpc.RTorrentProxy("scgi+ssh://localhost/tmp/socket")
+        with self.assertRaises(xmlrpc.ERRORS) as ctx:
+            proxy.echo(1)
+        self.assertIn("Host key verification failed.", str(ctx.exception))
+
+    def test_quoted_path(self):
+        transport = xmlrpc.RTorrentProxy("scgi+ssh://localhost/tmp/a b;c")._transport
+        self.assertIn("'UNIX-CONNECT:/tmp/a b;c'", transport.cmd[-1])
+
+    def test_socket_error(self):
+        proxy = xmlrpc.RTorrentProxy("scgi+ssh://localhost/nonexistent/socket")
+        self.assertRaises(xmlrpc.ERRORS, proxy.echo, 1)
+        self.assertEqual(1, proxy._transport.sessions)
+        proxy._transport.close()
 
 
 if __name__ == "__main__":